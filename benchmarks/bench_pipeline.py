@@ -0,0 +1,254 @@
+"""
+End-to-end benchmark of the pipeline on synthetic PIT workbooks.
+
+Generates workbooks shaped like the HUD "Counts by State" file at several scales
+and times every stage of the pipeline on each one: workbook load, cleaning,
+deduplication, CoC roll-up, population join, rate computation, ranking and
+figure rendering. Scale 1 matches the real workbook (18 year sheets, one row per
+jurisdiction); larger scales add earlier years and split every state into CoC
+rows, e.g. scale 10 is 36 years x 5 CoCs per state. Duplicate CoC rows are mixed
+in so deduplication has work to do.
+
+Every stage is timed `--repeats` times and reported as the median. Peak memory
+is measured in one extra run per scale with tracemalloc (Python and NumPy
+allocations in this process; worker processes started by the loader are not
+included). Results are written as JSON for comparison across commits. Nothing
+is downloaded: the workbooks are generated locally and the maps use the GeoJSON
+in data/geojson, with the simplified geometry cached under the work directory.
+
+The synthetic workbooks are .xlsx files read with openpyxl, while the real
+workbook is an .xlsb file read with pyxlsb, so the 'load' timings compare
+commits with each other but not with loading the production file. The JSON
+report records this under 'workbook_format'.
+
+    python benchmarks/bench_pipeline.py [--scales 1 10 100] [--repeats 3] [--json results.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(BENCH_DIR, '..', 'src')
+sys.path.insert(0, SRC_DIR)
+
+from diagnostics import QUIET, set_verbosity  # noqa: E402
+from pit_loader import (PIT_COLUMNS, apply_schema, deduplicate_yearly_homeless, load_pit_workbook,  # noqa: E402
+                        normalize_yearly_homeless)
+from population import load_population, population_lookup, rate_per_100k  # noqa: E402
+from ranking import Ranking, top_k_indices  # noqa: E402
+from rates import StateYearMatrix  # noqa: E402
+from states import JURISDICTION_CODES  # noqa: E402
+
+GEOJSON_PATH = os.path.join(BENCH_DIR, '..', 'data', 'geojson', 'us_states.geojson')
+# Format of the synthetic workbooks; the real one is .xlsb, read with pyxlsb
+WORKBOOK_FORMAT = '.xlsx (openpyxl)'
+LATEST_YEAR = 2024
+BASE_YEARS = 18
+# Scale -> (year factor, CoC rows per jurisdiction); their product is the scale
+SCALES = {1: (1, 1), 10: (2, 5), 100: (4, 25)}
+DUPLICATE_FRACTION = 0.02
+# Columns the loader has to skip, like the age and household breakdowns of the real file
+EXTRA_COLUMNS = [f'Overall Homeless - Breakdown {i}' for i in range(8)]
+STAGES = ('load', 'clean', 'dedup', 'rollup', 'population_join', 'rate', 'ranking', 'render')
+
+
+def synthetic_workbook(path, scale, seed=0):
+    """Write a PIT-shaped .xlsx with one sheet per year (newest first) at `scale`."""
+    from openpyxl import Workbook
+
+    year_factor, cocs = SCALES[scale]
+    rng = np.random.default_rng(seed)
+    header = ['State', 'CoC Number'] + PIT_COLUMNS[1:] + EXTRA_COLUMNS
+    wb = Workbook(write_only=True)
+    for year in range(LATEST_YEAR, LATEST_YEAR - BASE_YEARS * year_factor, -1):
+        ws = wb.create_sheet(str(year))
+        ws.append(header)
+        n = len(JURISDICTION_CODES) * cocs
+        overall = rng.integers(20, 200_000 // cocs, n)
+        sheltered = rng.binomial(overall, rng.uniform(0.05, 0.95, n))
+        extra = rng.integers(0, 1000, (n, len(EXTRA_COLUMNS)))
+        rows = [[state, f'{state}-{i % cocs + 500}', int(o), int(s), int(o - s), *map(int, e)]
+                for i, (state, o, s, e) in enumerate(zip(np.repeat(JURISDICTION_CODES, cocs),
+                                                         overall, sheltered, extra))]
+        duplicates = rng.choice(n, int(n * DUPLICATE_FRACTION), replace=False)
+        rows.extend(rows[i] for i in sorted(duplicates))
+        for row in rows:
+            ws.append(row)
+        ws.append(['Total', None, int(overall.sum()), int(sheltered.sum()), int((overall - sheltered).sum())])
+        ws.append(['Note: synthetic benchmark data'])
+    wb.save(path)
+    return path
+
+
+def rollup_to_states(df_coc):
+    """Sum CoC rows into one row per state and year."""
+    df_state = (df_coc.groupby(['State', 'Year'], observed=True)[PIT_COLUMNS[1:]]
+                .sum(min_count=1).reset_index())
+    return apply_schema(df_state)
+
+
+def run_stages(path, population, out_dir, cache_dir, render=True):
+    """Run every stage once; yields (stage, seconds, rows in, rows out)."""
+    def timed(stage, func, rows_in):
+        start = time.perf_counter()
+        result = func()
+        return result, (stage, time.perf_counter() - start, rows_in)
+
+    columns = PIT_COLUMNS + ['CoC Number']
+    df_raw, record = timed('load', lambda: load_pit_workbook(path, columns=columns), 0)
+    yield record + (len(df_raw),)
+    df_norm, record = timed('clean', lambda: normalize_yearly_homeless(df_raw), len(df_raw))
+    yield record + (len(df_norm),)
+    df_coc, record = timed('dedup', lambda: deduplicate_yearly_homeless(df_norm, ('State', 'Year', 'CoC Number')),
+                           len(df_norm))
+    yield record + (len(df_coc),)
+    df_state, record = timed('rollup', lambda: rollup_to_states(df_coc), len(df_coc))
+    yield record + (len(df_state),)
+
+    def join():
+        df = df_state.copy()
+        df['Population'] = population_lookup(population, df['State'], df['Year'])
+        return df
+    df_joined, record = timed('population_join', join, len(df_state))
+    yield record + (len(df_joined),)
+
+    def rate():
+        df_joined['Homeless Per 100K'] = rate_per_100k(df_joined['Overall Homeless'], df_joined['Population'])
+        matrix = StateYearMatrix.from_long(df_joined, population)
+        return matrix, matrix.rates(), matrix.yoy_pct(), matrix.cagr()
+    (matrix, rates, _, _), record = timed('rate', rate, len(df_joined))
+    yield record + (rates.size,)
+
+    def rank():
+        ranking = Ranking(df_joined)
+        for year in np.unique(df_joined['Year']):
+            ranking.top('Overall Homeless', 10, year=year)
+            ranking.bottom('Homeless Per 100K', 10, year=year)
+        return matrix.ranks(rates), top_k_indices(rates, 10)
+    (ranks, _), record = timed('ranking', rank, len(df_joined))
+    yield record + (ranks.size,)
+
+    if render:
+        from batch_render import render_all
+        from geometry import load_geometry
+        from pipeline import figure_inputs
+
+        def draw():
+            inputs = figure_inputs(df_state, population, geojson=load_geometry(GEOJSON_PATH, cache_dir=cache_dir).to_geojson())
+            return render_all(inputs, out_dir, max_workers=1)
+        results, record = timed('render', draw, len(df_state))
+        yield record + (len(results),)
+
+
+def measure_peak_memory(path, population, out_dir, cache_dir, render=True):
+    """Peak traced allocation in bytes of every stage, from one extra run."""
+    peaks = {}
+    tracemalloc.start()
+    try:
+        stages = run_stages(path, population, out_dir, cache_dir, render)
+        while True:
+            tracemalloc.reset_peak()
+            try:
+                stage = next(stages)[0]
+            except StopIteration:
+                break
+            peaks[stage] = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return peaks
+
+
+def benchmark_scale(scale, workdir, repeats, render=True):
+    path = os.path.join(workdir, f'pit_synthetic_x{scale}.xlsx')
+    if not os.path.exists(path):
+        synthetic_workbook(path, scale)
+    out_dir = os.path.join(workdir, f'figures_x{scale}')
+    cache_dir = os.path.join(workdir, 'cache')
+    population = load_population()
+
+    runs = {}
+    for _ in range(repeats):
+        for stage, seconds, rows_in, rows_out in run_stages(path, population, out_dir, cache_dir, render):
+            runs.setdefault(stage, {'seconds': [], 'rows_in': rows_in, 'rows_out': rows_out})
+            runs[stage]['seconds'].append(seconds)
+    peaks = measure_peak_memory(path, population, out_dir, cache_dir, render)
+
+    return [{'scale': scale, 'stage': stage, 'median_seconds': statistics.median(run['seconds']),
+             'seconds': run['seconds'], 'rows_in': run['rows_in'], 'rows_out': run['rows_out'],
+             'peak_bytes': peaks.get(stage), 'workbook_bytes': os.path.getsize(path)}
+            for stage, run in runs.items()]
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR, check=True,
+                              capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(results):
+    print(f"{'scale':>5}  {'stage':<16} {'median':>9}  {'peak MiB':>9}  {'rows in':>9}  {'rows out':>9}")
+    for row in results:
+        peak = '' if row['peak_bytes'] is None else f"{row['peak_bytes'] / 2 ** 20:9.1f}"
+        print(f"{row['scale']:>5}  {row['stage']:<16} {row['median_seconds']:8.3f}s  {peak:>9}  "
+              f"{row['rows_in']:>9,}  {row['rows_out']:>9,}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time every pipeline stage on synthetic PIT workbooks.")
+    parser.add_argument('--scales', type=int, nargs='+', default=list(SCALES), choices=list(SCALES),
+                        help="Workbook sizes relative to the real state-level file (default: 1 10 100)")
+    parser.add_argument('--repeats', type=int, default=3, help="Timed runs per scale (default: 3)")
+    parser.add_argument('--workdir', default=None,
+                        help="Where to keep the generated workbooks and figures (default: a temporary directory)")
+    parser.add_argument('--no-render', action='store_true', help="Skip the figure rendering stage")
+    parser.add_argument('--json', default=None, help="Write the results to this JSON file ('-' for stdout)")
+    args = parser.parse_args(argv)
+
+    # No display: the figure builders import matplotlib lazily and pick this up
+    os.environ['MPLBACKEND'] = 'Agg'
+    set_verbosity(QUIET)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        workdir = args.workdir or tmp_dir
+        os.makedirs(workdir, exist_ok=True)
+        results = []
+        for scale in args.scales:
+            results.extend(benchmark_scale(scale, workdir, args.repeats, render=not args.no_render))
+
+    report = {
+        'benchmark': 'pipeline',
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'repeats': args.repeats,
+        'workbook_format': WORKBOOK_FORMAT,
+        'stages': list(STAGES),
+        'results': results,
+    }
+    if args.json == '-':
+        json.dump(report, sys.stdout, indent=1)
+        print()
+    else:
+        print_table(results)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(report, f, indent=1)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""
+Startup-time benchmark for the data pipeline.
+
+Imports the data-side modules (pipeline and everything it pulls in) and the
+command-line tools built on them (stages, export, query_service, regions) in
+fresh interpreters, reports the median import time of each next to the
+plotting modules for comparison, and fails if importing any of them loads a
+plotting library or takes longer than the time budget.
+
+    python benchmarks/bench_startup.py [--runs 5] [--budget 2.0]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+PLOTTING_MODULES = ('matplotlib', 'seaborn', 'plotly')
+
+# Label -> modules imported together; each must stay clear of plotting imports and within the budget
+GUARDED = {
+    'pipeline': ['pipeline', 'rates', 'figures'],
+    'stages': ['stages'],
+    'export': ['export'],
+    'query_service': ['query_service'],
+    'regions': ['regions'],
+}
+
+# Imported in a fresh interpreter; prints the import time and the plotting modules it loaded
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import {modules}
+elapsed = time.perf_counter() - start
+loaded = sorted({{name.split('.')[0] for name in sys.modules}} & set({plotting!r}))
+print(json.dumps({{'seconds': elapsed, 'plotting': loaded}}))
+'''
+
+
+def time_import(modules, runs):
+    """Median import time of `modules` over `runs` fresh interpreters, and the plotting modules loaded."""
+    code = PROBE.format(modules=', '.join(modules), plotting=PLOTTING_MODULES)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [SRC_DIR, os.environ.get('PYTHONPATH')])))
+    samples, plotting = [], []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', code], env=env, check=True,
+                             capture_output=True, text=True).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        samples.append(result['seconds'])
+        plotting = result['plotting']
+    return statistics.median(samples), plotting
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Guard the import time of the data pipeline.")
+    parser.add_argument('--runs', type=int, default=5, help="Fresh interpreters per measurement (default: 5)")
+    parser.add_argument('--budget', type=float, default=2.0,
+                        help="Maximum median import time of each guarded module in seconds (default: 2.0)")
+    args = parser.parse_args(argv)
+
+    cases = list(GUARDED.items()) + [('plotting stack', ['matplotlib.pyplot', 'seaborn', 'plotly.express'])]
+    results = {}
+    for label, modules in cases:
+        results[label] = time_import(modules, args.runs)
+        seconds, plotting = results[label]
+        print(f"{label:<15} {seconds:6.3f}s  plotting modules loaded: {', '.join(plotting) or 'none'}")
+
+    failures = []
+    for label in GUARDED:
+        seconds, plotting = results[label]
+        if plotting:
+            failures.append(f"importing {label} loaded {', '.join(plotting)}")
+        if seconds > args.budget:
+            failures.append(f"{label} import took {seconds:.3f}s (budget {args.budget:.3f}s)")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -66,15 +66,29 @@
 
 import pandas as pd
 import matplotlib.pyplot as plt
-import seaborn as sns
-import json
-import plotly.express as px
+
+from anomalies import anomaly_insight, detect_state_anomalies, mark_anomalies
+from diagnostics import DETAIL, show, show_describe, show_dtypes, show_head, show_info, show_tail
+from figures import (map_animated, map_overall, map_rate, plot_bottom_rate, plot_sheltered_unsheltered,
+                     plot_top_homeless, plot_top_population, plot_top_rate, plot_yearly_trend, set_style)
+from geometry import load_geometry
+from instrument import summary_table
+from pipeline import (add_rate_per_100k, attach_population, population_column, select_states_with_counts,
+                      split_latest_year, state_year_frame, yearly_trend)
+from pit_cache import DEFAULT_CACHE_DIR, load_yearly_table
+from pit_loader import memory_report
+from population import load_population, population_lookup, rate_per_100k
+from ranking import Ranking
+from rates import StateYearMatrix
+from regions import rollup
+from shelter import ShelterBreakdown, shelter_insight
+from states import STATE_NAMES, states_only
 
 # Uncomment if the package is already installed
 # pip install pyxlsb plotly
 
-# for better aesthetics
-sns.set_theme(style="whitegrid")
+# for better aesthetics (every chart is built by a function in figures.py)
+set_style()
 
 print("Imports successful! Plotting style set.")
 
@@ -86,6 +100,7 @@ print("Imports successful! Plotting style set.")
 
 xlsb_file_path = '---' # Insert your path to the file
 us_states_geojson_path = '---' # insert your path to the file
+cache_dir = DEFAULT_CACHE_DIR # Where the cleaned table and simplified geometry are cached (data/cache)
 
 
 # In[3]:
@@ -95,13 +110,17 @@ us_states_geojson_path = '---' # insert your path to the file
 # SECTION 2: DATA LOADING AND INITIAL INSPECTION (HUD PIT Data)
 # =============================================================================
 
-# Loading the homelessness data from the Excel Binary file
+# Loading the homelessness data from the Excel Binary file.
+# The workbook is opened once and every year sheet is read and cleaned into one
+# long-format table (with a 'Year' column) that the 2024 sections and the historical
+# trends share. The cleaned table is cached under cache_dir keyed by the workbook's
+# checksum, so reruns on an unchanged HUD file skip parsing the workbook entirely.
 
 print("\nLoading homelessness data...")
 try:
-    df = pd.read_excel(xlsb_file_path)
-    print("Excel file loaded successfully!")
-    print(f"Initial dataset shape: {df.shape}")
+    df_pit = load_yearly_table(xlsb_file_path, cache_dir)
+    print("Homelessness data loaded successfully!")
+    print(f"Loaded years: {sorted(df_pit['Year'].unique().tolist())}")
 except FileNotFoundError:
     print(f"Error: The file '{xlsb_file_path}' was not found. Please check the path and ensure the file is in the specified location.")
     exit() 
@@ -109,41 +128,45 @@ except Exception as e:
     print(f"An error occurred while loading the Excel file: {e}")
     exit() 
 
+# The cleaned table uses a compact schema (categorical State, int16 Year, nullable
+# Int32 counts) fixed at load time; compare it with the object/int64/float64 layout
+show("\n--- Memory use of the long-format table ---", lambda: memory_report(df_pit), DETAIL)
+
+# The most recent year (2024) is the focus of sections 2-5
+latest_year, df = split_latest_year(df_pit)
+print(f"Initial dataset shape: {df.shape}")
+
 
 # In[4]:
 
 
-# Exploring basic information about the DataFrame
-print("\n--- DataFrame Info ---")
-df.info()
+# Exploring basic information about the DataFrame. These dumps are only computed when
+# the verbosity asks for them (PIT_VERBOSITY=detail); see diagnostics.py
+show_info(df, "\n--- DataFrame Info ---")
 
 
 # In[5]:
 
 
-print("\n--- First 5 rows ---")
-print(df.head())
+show_head(df, "\n--- First 5 rows ---")
 
 
 # In[6]:
 
 
-print("\n--- Last 5 rows (checking for totals/footnotes) ---")
-print(df.tail())
+show_tail(df, "\n--- Last 5 rows (checking for totals/footnotes) ---")
 
 
 # In[7]:
 
 
-print("\n--- Basic Statistics ---")
-print(df.describe())
+show_describe(df, "\n--- Basic Statistics ---")
 
 
 # In[8]:
 
 
-print("\n--- Data Types ---")
-print(df.dtypes)
+show_dtypes(df, "\n--- Data Types ---")
 
 
 # In[9]:
@@ -155,46 +178,18 @@ print(df.dtypes)
 
 print("\n--- Cleaning and Preparing Homelessness Data ---")
 
-# Converting nessesary columns to numeric.
-# Errors are coerced to NaN, allowing us to drop non-numeric rows later.
-
-columns_to_convert = ['Overall Homeless', 'Sheltered Total Homeless', 'Unsheltered Homeless']
-for col in columns_to_convert:
-    df[col] = pd.to_numeric(df[col], errors='coerce')
-
-
-# In[10]:
-
-
-# Filtering out rows where 'Overall Homeless' is NaN 
-df_filtered = df[df['Overall Homeless'].notna()].copy()
-
-
-# In[11]:
+# Counts were already converted to numeric when the workbook was cleaned in Section 2.
+# Keeping the 50 states and DC with a valid 'Overall Homeless' count, and only the
+# relevant columns for the most recent year (see pipeline.select_states_with_counts).
 
-
-# Removing the 'Total' row and rows that are not standard state abbreviations (e.g., footnotes)
-
-non_state_entries = ['Total', 'AS', 'GU', 'PR', 'VI', 'MP'] # Add other non-state entries as needed
-df_no_total = df_filtered[~df_filtered['State'].isin(non_state_entries)].copy()
+df_2024_homeless = select_states_with_counts(df)
 
 
 # In[12]:
 
 
-print(f"Shape after filtering non-numeric and 'Total' rows: {df_no_total.shape}")
-print("\nFirst 5 rows of cleaned data:")
-print(df_no_total.head())
-
-
-# In[13]:
-
-
-# Selecting only the relevant columns for analysis for the most recent year (2024)
-
-df_2024_homeless = df_no_total[['State', 'Overall Homeless', 'Sheltered Total Homeless', 'Unsheltered Homeless']].copy()
-print("\nSelected 2024 homelessness data columns:")
-print(df_2024_homeless.head())
+print(f"Shape after filtering non-numeric and 'Total' rows: {df_2024_homeless.shape}")
+show_head(df_2024_homeless, "\nSelected 2024 homelessness data columns:")
 
 
 # In[14]:
@@ -210,35 +205,13 @@ print("\n--- Preparing US Population Data (2024) ---")
 # In[15]:
 
 
-# Manually creating a DataFrame for 2024 US state populations (US Census Bureau)
-
-us_population_2024_data = {
-    'State': [
-        'AL', 'AK', 'AZ', 'AR', 'CA', 'CO', 'CT', 'DE', 'DC', 'FL', 'GA', 'GU',
-        'HI', 'ID', 'IL', 'IN', 'IA', 'KS', 'KY', 'LA', 'ME', 'MD', 'MA', 'MI',
-        'MN', 'MS', 'MO', 'MP', 'MT', 'NE', 'NV', 'NH', 'NJ', 'NM', 'NY', 'NC',
-        'ND', 'OH', 'OK', 'OR', 'PA', 'PR', 'RI', 'SC', 'SD', 'TN', 'TX', 'UT',
-        'VA', 'VI', 'VT', 'WA', 'WV', 'WI', 'WY', 'AS' # Included AS if you find a source for it, otherwise it will be NaN
-    ],
-    'Population 2024': [
-        5157699, 740133, 7582384, 3088354, 39431263, 5957493, 3675069, 1051917,
-        702250, 23372215, 11180878, 172951, # Guam 2024 est
-        1446146, 2001619, 12710158, 6924275, 3241488, 2970606, 4588372, 4597740,
-        1405012, 6263220, 7136171, 10140459, 5793151, 2943045, 6245466, 47326, # Northern Mariana Islands 2024 est
-        1137233, 2005465, 3267467, 1409032, 9500851, 2130256, 19867248, 11046024,
-        796568, 11883304, 4095393, 4272371, 13078751, 3203295, # Puerto Rico 2024 est
-        1112308, 5478831, 924669, 7227750, 31290831, 3503613, 8811195, 98774, # U.S. Virgin Islands 2024 est
-        648493, 7958180, 1769979, 5960975, 587618, 44293 # American Samoa 2024 est (from recent estimate)
-    ]
-}
-
+# Loading the US Census Bureau population estimates from the versioned reference
+# table in data/reference. It is indexed by (State, Year), so population can be
+# looked up for any year without building or merging a separate DataFrame.
 
-# In[16]:
-
-
-df_population = pd.DataFrame(us_population_2024_data)
-print("Population data created.")
-print(df_population.head())
+population = load_population()
+print("Population data loaded.")
+show_head(population, "Population reference table:")
 
 
 # In[17]:
@@ -246,32 +219,23 @@ print(df_population.head())
 
 print("\n--- Merging Homelessness and Population Data ---")
 
-df_final = pd.merge(df_2024_homeless, df_population, on='State', how='left')
+# The population lookup returns one value per row, aligned with the homeless counts,
+# so no merge is needed. States without an estimate in the reference table are dropped.
+df_final = attach_population(df_2024_homeless, population, latest_year)
 
 
 # In[18]:
 
 
-# Check for states that might not have merged (NaN in Population 2024)
-print("\nStates with missing population data after merge (e.g., territories not in Census data):")
-print(df_final[df_final['Population 2024'].isna()])
-
-
-# In[19]:
-
-
-# Droping rows where population data is missing (US territories not in our population dataset)
-df_final.dropna(subset=['Population 2024'], inplace=True)
-df_final['Population 2024'] = df_final['Population 2024'].astype(int) 
+print("\nStates with missing population data (not in the population reference table):")
+print(sorted(set(df_2024_homeless['State']) - set(df_final['State'])))
 
 
 # In[20]:
 
 
-print("\nFinal merged DataFrame head:")
-print(df_final.head())
-print("\nFinal merged DataFrame info:")
-df_final.info()
+show_head(df_final, "\nFinal merged DataFrame head:")
+show_info(df_final, "\nFinal merged DataFrame info:")
 
 
 # In[21]:
@@ -291,31 +255,32 @@ print("\n--- Beginning Analysis and Visualizations for 2024 Data ---")
 
 print("\n--- 5.1: Top 10 States by Overall Homeless Population (2024) ---")
 
-df_top_homeless = df_final.sort_values('Overall Homeless', ascending=False).head(10)
+# Rankings over df_final are cached per metric and k (see ranking.py), so the
+# sheltered vs. unsheltered section below reuses this same top 10.
+ranking_2024 = Ranking(df_final)
+df_top_homeless = ranking_2024.top('Overall Homeless', 10)
 
 
 # In[23]:
 
 
-plt.figure(figsize=(16, 8))
-ax = sns.barplot(
-    x='State',
-    y='Overall Homeless',
-    data=df_top_homeless,
-    palette='viridis'
-)
-plt.title('Top 10 States by Overall Homeless Population in 2024', fontsize=16)
-plt.xlabel('State', fontsize=12)
-plt.ylabel('Overall Homeless Count', fontsize=12)
-plt.xticks(rotation=45, ha='right', fontsize=10) # Rotate x-axis labels for readability
+fig = plot_top_homeless(df_top_homeless, latest_year)
+plt.show()
+# National, Census region and division totals for every year from one grouped reduction (see regions.py)
+df_regions = rollup(df_pit, population)
+df_regions_latest = df_regions[df_regions['Year'] == latest_year]
+national_total = int(df_regions_latest.loc[df_regions_latest['Grouping'] == 'national', 'Overall Homeless'].iloc[0])
+(state_a, count_a), (state_b, count_b) = df_top_homeless[['State', 'Overall Homeless']].head(2).itertuples(index=False)
+name_a, name_b = STATE_NAMES[str(state_a)], STATE_NAMES[str(state_b)]
+print(f"Insight: In {latest_year}, {name_a} and {name_b} have a significantly larger overall homeless population, totaling {count_a + count_b:,} individuals ({count_a:,} in {name_a} and {count_b:,} in {name_b}). This combined figure represents approximately {(count_a + count_b) / national_total * 100:.1f}% of the homeless population of the 50 states and DC ({national_total:,}).")
 
-# Add value labels on top of the bars
-for container in ax.containers:
-    ax.bar_label(container, fmt='%.0f', label_type='edge', fontsize=9, padding=3)
 
-plt.tight_layout() # Adjust layout to prevent labels from overlapping
-plt.show()
-print(f"Insight: In 2024, California and New York have a significantly larger overall homeless population, totaling 345,103 individuals (187,084 in California and 158,019 in New York). This combined figure represents approximately 44.7% of the entire U.S. homeless population of 771,480.")
+# In[ ]:
+
+
+# Regional totals, per-100K rates and shares of the national count
+show(f"\n--- Homelessness by Census Region and Division ({latest_year}) ---",
+     lambda: df_regions_latest.drop(columns='Year').round(1).to_string(index=False))
 
 
 # *My initial expectation was that New York would have the highest number of homeless people. However, the data clearly shows that California has a significantly larger absolute homeless population in 2024.*
@@ -327,38 +292,13 @@ print(f"Insight: In 2024, California and New York have a significantly larger ov
 # --- 5.2: Top 10 States with the Highest Population (for comparison) ---
 print("\n--- 5.2: Top 10 States with the Highest Population (for comparison) ---")
 
-df_top_population = df_final.sort_values('Population 2024', ascending=False).head(10)
+df_top_population = ranking_2024.top(population_column(latest_year), 10)
 
 
 # In[25]:
 
 
-plt.figure(figsize=(16, 8))
-ax = sns.barplot(
-    x='State',
-    y='Population 2024',
-    data=df_top_population,
-    palette='Blues_r'
-)
-plt.title('Top 10 States by Total Population in 2024', fontsize=16)
-plt.xlabel('State', fontsize=12)
-plt.ylabel('Population', fontsize=12)
-plt.xticks(rotation=45, ha='right', fontsize=10)
-
-labels_pop_formatted = []
-for pop_val in df_top_population['Population 2024']:
-    if pop_val >= 1_000_000:
-        labels_pop_formatted.append(f'{int(pop_val/1_000_000)}M') # Millions
-    elif pop_val >= 1_000:
-        labels_pop_formatted.append(f'{int(pop_val/1_000)}K') # Thousands
-    else:
-        labels_pop_formatted.append(f'{int(pop_val)}') # Less than a thousand
-
-for container in ax.containers:
-    ax.bar_label(container, labels=labels_pop_formatted, label_type='edge', fontsize=9, padding=3)
-
-
-plt.tight_layout()
+fig = plot_top_population(df_top_population, latest_year)
 plt.show()
 
 
@@ -373,14 +313,13 @@ print("\n--- 5.3: Calculating Homelessness Rate per 100K Population ---")
 
 
 # Calculate 'Homeless Per 100K'
-df_final['Homeless Per 100K'] = (df_final['Overall Homeless'] / df_final['Population 2024']) * 100000
+df_final = add_rate_per_100k(df_final, latest_year)
 
 
 # In[28]:
 
 
-print("\nDataFrame with Homelessness Rate per 100K:")
-print(df_final.head())
+show_head(df_final, "\nDataFrame with Homelessness Rate per 100K:")
 
 
 # In[29]:
@@ -388,31 +327,18 @@ print(df_final.head())
 
 # 10 states with the highest homelessness rate (per 100K)
 print("\n--- 10 States With The Highest Homelessness Rate (Per 100,000 Population) ---")
-df_top_rate = df_final.sort_values('Homeless Per 100K', ascending=False).head(10)
+df_top_rate = ranking_2024.top('Homeless Per 100K', 10)
 
 
 # In[30]:
 
 
-plt.figure(figsize=(12, 7))
-ax = sns.barplot(
-    x='State',
-    y='Homeless Per 100K',
-    data=df_top_rate,
-    palette='viridis'
-)
-plt.title('Top 10 States by Homelessness Rate (Per 100,000 Population) in 2024', fontsize=16)
-plt.xlabel('State', fontsize=12)
-plt.ylabel('Homeless Individuals per 100,000 People', fontsize=12)
-plt.xticks(rotation=45, ha='right', fontsize=10)
-
-for container in ax.containers:
-    ax.bar_label(container, fmt='%.1f', label_type='edge', fontsize=9, padding=3)
-
-plt.tight_layout()
+fig = plot_top_rate(df_top_rate, latest_year)
 plt.show()
 
-print(f"Insight: A significant and concerning trend emerges in Hawaii, Washington D.C., and New York. In 2024, nearly 1% of the population in these areas was experiencing homelessness. Specifically, there are approximately 805 homeless individuals per 100,000 residents in Hawaii, 800 per 100,000 in Washington D.C., and 795 per 100,000 in New York, underscoring the severe housing challenges faced by these populations.")
+(state_a, rate_a), (state_b, rate_b), (state_c, rate_c) = df_top_rate[['State', 'Homeless Per 100K']].head(3).itertuples(index=False)
+name_a, name_b, name_c = (STATE_NAMES[str(state)] for state in (state_a, state_b, state_c))
+print(f"Insight: A significant and concerning trend emerges in {name_a}, {name_b}, and {name_c}. In {latest_year}, {rate_c / 1000:.2f}% to {rate_a / 1000:.2f}% of the population in these areas was experiencing homelessness. Specifically, there are approximately {rate_a:,.0f} homeless individuals per 100,000 residents in {name_a}, {rate_b:,.0f} per 100,000 in {name_b}, and {rate_c:,.0f} per 100,000 in {name_c}, underscoring the severe housing challenges faced by these populations.")
 
 
 # *This metric reveals a different story! Hawaii is indeed Number 1 for density. New York is in 3rd place, and Washington state makes it into the top 10, confirming my local observations.*
@@ -421,27 +347,12 @@ print(f"Insight: A significant and concerning trend emerges in Hawaii, Washingto
 
 
 print("\n--- Bottom 10 States by Homelessness Rate (Per 100,000 Population) ---")
-df_bottom_rate = df_final.sort_values('Homeless Per 100K', ascending=True).head(10)
-
-plt.figure(figsize=(12, 7))
-ax = sns.barplot(
-    x='State',
-    y='Homeless Per 100K',
-    data=df_bottom_rate,
-    palette='viridis_r' # Reversed viridis palette
-)
-plt.title('Bottom 10 States by Homelessness Rate (Per 100,000 Population) in 2024', fontsize=16)
-plt.xlabel('State', fontsize=12)
-plt.ylabel('Homeless Individuals per 100,000 People', fontsize=12)
-plt.xticks(rotation=45, ha='right', fontsize=10)
-
-for container in ax.containers:
-    ax.bar_label(container, fmt='%.1f', label_type='edge', fontsize=9, padding=3)
+df_bottom_rate = ranking_2024.bottom('Homeless Per 100K', 10)
 
-plt.tight_layout()
+fig = plot_bottom_rate(df_bottom_rate, latest_year)
 plt.show()
 
-print(f"Insight: Mississippi had one of the lowest numbers of people experiencing homelessness per 100K population in 2024.")
+print(f"Insight: {STATE_NAMES[str(df_bottom_rate['State'].iloc[0])]} had the lowest number of people experiencing homelessness per 100K population in {latest_year}.")
 
 
 # In[32]:
@@ -457,125 +368,43 @@ print("\n--- Analyzing Historical Homelessness Trends (2007-2024) ---")
 # In[33]:
 
 
-sheet_names = [str(year) for year in range(2024, 2006, -1)]
-
-
-# In[34]:
-
-
-# Based on your df.info(), we'll assume these column names
-state_col_name = 'State'
-homeless_col_name = 'Overall Homeless'
-
-
-# In[35]:
-
-
-# --- 1. Load Data from Multiple Sheets and Combine ---
-all_years_data = []
-
-print(f"Attempting to load sheets: {sheet_names}")
-
-
-# In[36]:
-
-
-# Combinining Sheets
-
-for sheet_name in sheet_names:
-    try:
-        # Read the specific sheet
-        df_year = pd.read_excel(xlsb_file_path , sheet_name=sheet_name)
-
-        # Check if required columns exist before renaming/selecting
-        if state_col_name not in df_year.columns or homeless_col_name not in df_year.columns:
-            print(f"Skipping sheet '{sheet_name}': Missing '{state_col_name}' or '{homeless_col_name}' column.")
-            continue
-
-        # Rename columns to standard names ('State', 'Overall Homeless')
-        df_year = df_year.rename(columns={
-            state_col_name: 'State',
-            homeless_col_name: 'Overall Homeless'
-        })
-
-        # Add a 'Year' column
-        df_year['Year'] = int(sheet_name) # Sheet names are direct year numbers
-
-        # Select only the relevant columns for consistency
-        df_year = df_year[['State', 'Overall Homeless', 'Year']]
-
-        all_years_data.append(df_year)
-        print(f"Successfully loaded sheet: {sheet_name}")
-
-    except FileNotFoundError:
-        print(f"Error: Excel file '{excel_file_path}' not found. Please check the path and filename.")
-        break # Exit loop if file not found
-    except Exception as e:
-        print(f"Error loading sheet '{sheet_name}': {e}")
-        continue
-
-# Check if any data was loaded
-if not all_years_data:
-    print("No data was loaded from any sheets. Please check sheet names, column names, and file path.")
-    exit() # Exit if no data to process
-
-# Concatenate all DataFrames into one
-df_yearly_homeless = pd.concat(all_years_data, ignore_index=True)
-
-print("\n--- Combined DataFrame Info (before final cleaning) ---")
-df_yearly_homeless.info()
-
-
-# In[38]:
-
-
-# --- 2. Clean Combined Data ---
-# Ensuring 'State' column is string and clean up non-state entries (like 'Total', descriptive text)
-
-df_yearly_homeless['State'] = df_yearly_homeless['State'].astype(str).str.strip()
-
-
-# In[39]:
-
-
-# Converting 'Overall Homeless' to numeric, coercing errors to NaN
-
-df_yearly_homeless['Overall Homeless'] = pd.to_numeric(df_yearly_homeless['Overall Homeless'], errors='coerce')
-
-
-# In[40]:
+# --- 1. Take the Cleaned Yearly Data from the Combined Workbook Load ---
+# All year sheets (2024 down to 2007) were already read and cleaned in Section 2:
+# counts coerced to numeric, duplicate (State, Year) rows dropped, and 'Total',
+# footnote and blank rows removed (see pit_loader.clean_yearly_homeless).
 
+df_yearly_homeless_cleaned = df_pit[['State', 'Overall Homeless', 'Year']].copy()
+print(f"Years available: {sorted(df_yearly_homeless_cleaned['Year'].unique().tolist(), reverse=True)}")
 
-# Remove duplicates based on 'State' and 'Year', keeping the first occurrence
-print("\n--- Deduplicating Data ---")
-initial_rows = len(df_yearly_homeless)
-df_yearly_homeless = df_yearly_homeless.drop_duplicates(subset=['State', 'Year'], keep='first')
-print(f"Removed {initial_rows - len(df_yearly_homeless)} duplicate rows.")
-
-
-# In[41]:
+# Population is indexed by (State, Year), so the rate for every state and year is
+# one aligned division. Years without a Census estimate in the reference table have
+# no population, so their rate is NaN rather than one based on another year's estimate.
+df_yearly_homeless_cleaned['Homeless Per 100K'] = rate_per_100k(
+    df_yearly_homeless_cleaned['Overall Homeless'],
+    population_lookup(population, df_yearly_homeless_cleaned['State'], df_yearly_homeless_cleaned['Year'])
+)
 
+show_info(df_yearly_homeless_cleaned, "\n--- Cleaned DataFrame Info (ready for visualization) ---")
+show_head(df_yearly_homeless_cleaned, "\nCleaned DataFrame Head:")
 
-# Filter out non-state rows and rows with NaN in 'Overall Homeless'
-# and also remove any rows where 'State' might be too short or a number
-df_yearly_homeless_cleaned = df_yearly_homeless[
-    (df_yearly_homeless['State'].str.len() == 2) & # Assuming all valid state codes are 2 letters
-    (df_yearly_homeless['State'] != 'Total') &    # Exclude 'Total' row
-    (df_yearly_homeless['State'] != 'nan') &      # Exclude 'nan' string (if it appears after astype(str))
-    (~df_yearly_homeless['State'].str.contains(r'^\*|File does not contain|Beginning in', regex=True, na=False)) & # Exclude descriptive text starting with * or specific phrases
-    (df_yearly_homeless['Overall Homeless'].notna()) # Keep only rows with valid homeless counts
-].copy()
 
-print("\n--- Cleaned DataFrame Info (ready for visualization) ---")
-df_yearly_homeless_cleaned.info()
-print("\nCleaned DataFrame Head:")
-print(df_yearly_homeless_cleaned.head())
+# In[43]:
 
 
-# In[42]:
+# --- Rates, Year-over-Year Changes and Ranks for Every State and Year ---
+# The cleaned table is laid out once as dense state x year arrays (see rates.py),
+# so each metric below covers all states and years in a single array operation.
 
+rate_engine = StateYearMatrix.from_long(df_yearly_homeless_cleaned, population)
+df_rate_by_year = rate_engine.to_frame(rate_engine.rates())
+df_rank_by_year = rate_engine.to_frame(rate_engine.ranks())
+df_yoy_change = rate_engine.to_frame(rate_engine.yoy_delta())
+state_cagr = pd.Series(rate_engine.cagr(), index=rate_engine.states, name='CAGR')
 
-df_yearly_homeless_cleaned.head()
+print("\nRank by Homelessness Rate per 100K (1 = highest), last 5 years:")
+print(df_rank_by_year.iloc[:, -5:].head(10))
+print(f"\nStates with the fastest growth in overall homeless count ({rate_engine.years[0]}-{rate_engine.years[-1]}):")
+print(state_cagr.nlargest(5).map(lambda g: f'{g:.1%} per year'))
 
 
 # In[48]:
@@ -584,72 +413,40 @@ df_yearly_homeless_cleaned.head()
 # Let's again find states with the Highest Amount of Homeless in 2024
 
 # --- 1. Find the Top 10 States in 2024 by Homeless Amount ---
-df_2024_data = df_yearly_homeless_cleaned[df_yearly_homeless_cleaned['Year'] == 2024]
+yearly_ranking = Ranking(df_yearly_homeless_cleaned)
 
 
 # In[56]:
 
 
-# Sort by 'Overall Homeless' and get the top 10 states
-top_10_states_2024_list = df_2024_data.sort_values(by='Overall Homeless', ascending=False).head(10)['State'].tolist()
+# Select the top 10 states of 2024 by 'Overall Homeless'
+top_10_states_2024_list = yearly_ranking.top('Overall Homeless', 10, year=latest_year)['State'].tolist()
 
 
 # In[57]:
 
 
 # --- 2. Filter the Full Yearly Data for These Top 10 States ---
-df_top_10_yearly_trend = df_yearly_homeless_cleaned[
-    df_yearly_homeless_cleaned['State'].isin(top_10_states_2024_list)
-].copy()
-
-
-# In[58]:
+# Sorted by year and then state for consistent plotting. Years flagged as abrupt
+# breaks or missing/partial counts for any state get an 'Anomaly' label.
+df_anomalies = detect_state_anomalies(df_pit)
+df_top_10_yearly_trend = mark_anomalies(yearly_trend(df_yearly_homeless_cleaned, top_10_states_2024_list),
+                                        df_anomalies)
 
+show(f"\nFlagged State-Years ({len(df_anomalies)}):", lambda: df_anomalies.round(1).to_string(index=False))
 
-
-# Sort by year and then state for consistent plotting
-df_top_10_yearly_trend = df_top_10_yearly_trend.sort_values(by=['Year', 'State'])
-
-print("\nData for Top 10 States Across All Years (Head - after deduplication and filtering):")
-print(df_top_10_yearly_trend.head())
+show_head(df_top_10_yearly_trend,
+          "\nData for Top 10 States Across All Years (Head - after deduplication and filtering):")
 
 
 # In[63]:
 
 
 # --- 3. Visualize the Yearly Trend for These Top 10 States ---
-plt.figure(figsize=(15, 9)) # Slightly larger figure for more states
-
-sns.lineplot(
-        data=df_top_10_yearly_trend,
-        x='Year',
-        y='Overall Homeless',
-        hue='State',
-        hue_order=top_10_states_2024_list,
-        marker='o',
-        linewidth=2
-)
-
-plt.title('Yearly Change in Overall Homeless Count for 10 States(2007-2024)', fontsize=16)
-plt.xlabel('Year', fontsize=12)
-plt.ylabel('Overall Homeless Count', fontsize=12)
-
-
-min_year = df_top_10_yearly_trend['Year'].min()
-max_year = df_top_10_yearly_trend['Year'].max()
-plt.xticks(range(min_year, max_year + 1), rotation=45, ha='right')
-
-# Scale y-axis if numbers are very large (e.g., millions/thousands)
-formatter = plt.FuncFormatter(lambda x, loc: f'{int(x):,}') 
-plt.gca().yaxis.set_major_formatter(formatter)
-
-
-plt.grid(True, linestyle='--', alpha=0.6)
-plt.legend(title='State', bbox_to_anchor=(1.05, 1), loc='upper left') 
-plt.tight_layout()
+fig = plot_yearly_trend(df_top_10_yearly_trend, top_10_states_2024_list)
 plt.show()
 
-print(f"Insight: California experienced a notable fluctuation in its homeless population around 2021. The count reportedly dropped significantly from 162K to 57K, only to rise again to 172K. This dramatic shift prompts questions about the factors at play, particularly concerning the aftermath of the COVID-19 pandemic and its impact on homelessness trends in the state.")
+print(anomaly_insight(df_anomalies, top_10_states_2024_list))
 
 
 # In[64]:
@@ -666,50 +463,25 @@ print("\n--- Analyzing Sheltered vs. Unsheltered Homelessness (2024) ---")
 # In[66]:
 
 
-# Focus on the top states by overall homelessness as identified earlier (df_top_homeless)
-df_sheltered_unsheltered = df_top_homeless[['State', 'Sheltered Total Homeless', 'Unsheltered Homeless']].copy()
+# Sheltered/unsheltered counts of every state and year as (state, year) arrays; shares,
+# ratios and year-over-year shifts are computed over all of them at once
+shelter = ShelterBreakdown.from_long(df_pit)
+df_shelter = shelter.to_long()
 
-
-# In[68]:
-
-
-# Melt the DataFrame to long format for stacked bar plot
-df_sheltered_unsheltered_melted = df_sheltered_unsheltered.melt(
-    id_vars='State',
-    var_name='Shelter Status',
-    value_name='Count'
-)
-
-print("\nSheltered vs. Unsheltered data (melted format):")
-print(df_sheltered_unsheltered_melted.head())
+# Focus on the top states by overall homelessness as identified earlier (df_top_homeless)
+print("\nSheltered vs. Unsheltered shares of the top states:")
+print(df_shelter[(df_shelter['Year'] == latest_year) & df_shelter['State'].isin(df_top_homeless['State'])]
+      .set_index('State').loc[df_top_homeless['State'].astype(str),
+                              ['Sheltered Share', 'Unsheltered Share', 'Unsheltered Share Shift (pp)']])
 
 
 # In[88]:
 
 
-plt.figure(figsize=(16, 8))
-ax = sns.barplot(
-    x='State',
-    y='Count',
-    hue='Shelter Status',
-    data=df_sheltered_unsheltered_melted,
-    palette='Oranges'
-)
-
-plt.title('Sheltered vs. Unsheltered Homeless by States (2024)', fontsize=16)
-plt.xlabel('State', fontsize=12)
-plt.ylabel('Number of Homeless Individuals', fontsize=12)
-plt.xticks(rotation=45, ha='right', fontsize=10)
-plt.legend(title='Shelter Status', bbox_to_anchor=(1.05, 1), loc='upper left')
-
-# Add value labels for better interpretation
-for container in ax.containers:
-    ax.bar_label(container, fmt='%.0f', label_type='edge', fontsize=12, color='black')
-
-plt.tight_layout()
+fig = plot_sheltered_unsheltered(shelter, df_top_homeless, latest_year)
 plt.show()
 
-print(f"Insight: While about 66%(124,000 out of 187,000) of California's homeless population in 2024 was unsheltered, over 96%(152,000 out of 158,000) of New York's homeless were sheltered. Interestingly, this means New York actually has a lower number of unsheltered individuals than Washington State, despite New York's much higher overall homeless count.")
+print(shelter_insight(shelter, df_top_homeless['State'].astype(str).tolist(), latest_year))
 
 
 # In[96]:
@@ -725,69 +497,37 @@ print("\n--- Visualizing Geographical Distribution with Choropleth Maps ---")
 # In[97]:
 
 
-df_2024 = pd.read_excel(xlsb_file_path, sheet_name='2024')
-
-
-# In[98]:
-
-
-# Ensure 'Overall Homeless' is numeric. Blanks will become NaN.
-df_2024['Overall Homeless'] = pd.to_numeric(df_2024['Overall Homeless'], errors='coerce')
-
-
-# In[99]:
-
-
-# Drop rows where 'Overall Homeless' is NaN (e.g., for territories like 'AS' if they have no data)
-df_2024.dropna(subset=['Overall Homeless'], inplace=True)
-
-
-# In[100]:
-
-
-non_state_entries = ['Total', 'US', 'PR', 'VI', 'GU', 'AS', 'MP'] # Add any other non-state codes if they appear
-df_2024 = df_2024[~df_2024['State'].isin(non_state_entries)].copy()
+# The 2024 states and DC with a valid 'Overall Homeless' count, as prepared in Section 3
+df_2024 = df_2024_homeless
 
 
 # In[101]:
 
 
-
-# Load the GeoJSON file containing US state boundaries
-with open(us_states_geojson_path, 'r') as f:
-    us_states_geojson = json.load(f)
+# Load the US state boundaries once for both maps. The polygons are simplified and
+# cached as compact arrays (see geometry.py), so later runs skip parsing the GeoJSON.
+try:
+    us_states_geojson = load_geometry(us_states_geojson_path, cache_dir=cache_dir).to_geojson()
+    print("GeoJSON file loaded successfully!")
+except FileNotFoundError:
+    print(f"Error: The GeoJSON file '{us_states_geojson_path}' was not found. Please check the path.")
+    exit()
+except Exception as e:
+    print(f"An error occurred while loading the GeoJSON file: {e}")
+    exit()
 
 
 # In[105]:
 
 
 # --- Choropleth Map Creation ---
-fig = px.choropleth(
-    df_2024,
-    geojson=us_states_geojson,
-    locations='State', # Use the 'State' column directly as it now has abbreviations
-    featureidkey='id', # Point to the 'id' field in your GeoJSON features for matching
-    color='Overall Homeless',
-    hover_name='State', # Display the state abbreviation on hover
-    color_continuous_scale="Oranges", # Colormap: 'Viridis' for high to low (dense to light)
-    scope="usa",
-    title='Overall Homelessness by State in 2024',
-    labels={'Overall Homeless': 'Total Homeless Individuals'}
-)
-
-# Update layout for better appearance
-fig.update_geos(
-    visible=False,
-    resolution=50, # Set resolution (110m, 50m, 10m)
-    showland=True, showcoastlines=True, showcountries=True, showsubunits=True
-)
-fig.update_layout(margin={"r":0,"t":50,"l":0,"b":0})
+fig = map_overall(df_2024, us_states_geojson, latest_year)
 
 # Show the figure
 fig.show()
 
 # You can also save the map as an HTML file
-# fig.write_html("us_homelessness_heatmap_2024.html")
+# fig.write_html(f"us_homelessness_heatmap_{latest_year}.html")
 
 print("Interactive map for 'Overall Homelessness' generated. It should appear below or open in your browser.")
 
@@ -805,7 +545,7 @@ print("\n--- 8.1: Overall Homelessness by State Heatmap ---")
 # Getting Our Early Calculated Homeless Per 100k Variable
 
 
-df_homeless_ratio = df_final[['State', 'Overall Homeless', 'Population 2024', 'Homeless Per 100K']].sort_values('Homeless Per 100K', ascending = False)
+df_homeless_ratio = df_final[['State', 'Overall Homeless', population_column(latest_year), 'Homeless Per 100K']].sort_values('Homeless Per 100K', ascending = False)
 
 
 # In[111]:
@@ -814,128 +554,51 @@ df_homeless_ratio = df_final[['State', 'Overall Homeless', 'Population 2024', 'H
 df_homeless_ratio 
 
 
-# In[112]:
-
-
-data_sample = {
-    'State': [
-        'HI', 'DC', 'NY', 'GU', 'OR', 'VT', 'CA', 'MA', 'WA', 'AK', 'CO', 'NV',
-        'VI', 'RI', 'NM', 'IL', 'AZ', 'ME', 'MT', 'MN', 'NH', 'SD', 'ID', 'NE',
-        'FL', 'NJ', 'OK', 'DE', 'MO', 'TN', 'KY', 'GA', 'UT', 'ND', 'PA', 'NC',
-        'WV', 'OH', 'MD', 'MI', 'KS', 'CT', 'IN', 'AR', 'AL', 'TX', 'WI', 'WY',
-        'SC', 'IA', 'VA', 'LA', 'PR', 'MS' # All 53 entries
-    ],
-    'Overall Homeless': [
-        11637.0, 5616.0, 158019.0, 1249.0, 22875.0, 3458.0, 187084.0, 29360.0,
-        31554.0, 2686.0, 18715.0, 10106.0, 279.0, 2442.0, 4631.0, 25832.0,
-        14737.0, 2702.0, 2008.0, 9201.0, 2245.0, 1338.0, 2750.0, 2720.0,
-        31362.0, 12762.0, 5467.0, 1358.0, 7312.0, 8280.0, 5231.0, 12290.0,
-        3869.0, 865.0, 14088.0, 11626.0, 1779.0, 11759.0, 6069.0, 9739.0,
-        2793.0, 3410.0, 6285.0, 2783.0, 4601.0, 27987.0, 5049.0, 501.0,
-        4593.0, 2631.0, 7141.0, 3469.0, 2096.0, 1041.0
-    ],
-    'Population 2024': [
-        1446146.0, 702250.0, 19867248.0, 172951.0, 4272371.0, 648493.0, 39431263.0,
-        7136171.0, 7958180.0, 740133.0, 5957493.0, 3267467.0, 98774.0, 1112308.0,
-        2130256.0, 12710158.0, 7582384.0, 1405012.0, 1137233.0, 5793151.0,
-        1409032.0, 924669.0, 2001619.0, 2005465.0, 23372215.0, 9500851.0,
-        4095393.0, 1051917.0, 6245466.0, 7227750.0, 4588372.0, 11180878.0,
-        3503613.0, 796568.0, 13078751.0, 11046024.0, 1769979.0, 11883304.0,
-        6263220.0, 10140459.0, 2970606.0, 3675069.0, 6924275.0, 3088354.0,
-        5157699.0, 31290831.0, 5960975.0, 587618.0, 5478831.0, 3241488.0,
-        8811195.0, 4597740.0, 3203295.0, 2943045.0
-    ],
-    'Homeless Per 100K': [
-        805.0, 800.0, 795.0, 722.0, 535.0, 533.0, 474.0, 411.0, 396.0, 363.0,
-        314.0, 309.0, 282.0, 220.0, 217.0, 203.0, 194.0, 192.0, 177.0, 159.0,
-        159.0, 145.0, 137.0, 136.0, 134.0, 134.0, 133.0, 129.0, 117.0, 115.0,
-        114.0, 110.0, 110.0, 109.0, 108.0, 105.0, 101.0, 99.0, 97.0, 96.0,
-        94.0, 93.0, 91.0, 90.0, 89.0, 89.0, 85.0, 85.0, 84.0, 81.0, 81.0,
-        75.0, 65.0, 35.0
-    ]
-}
-
-
-# In[113]:
-
-
-df_homeless_ratio = pd.DataFrame(data_sample) # In your actual code, this would be your loaded/calculated DataFrame.
-
-
 # In[114]:
 
 
-# Ensure 'Homeless Per 100K' is numeric.
-df_homeless_ratio['Homeless Per 100K'] = pd.to_numeric(df_homeless_ratio['Homeless Per 100K'], errors='coerce')
-
 # Drop rows where 'Homeless Per 100K' is NaN, as these states cannot be colored.
-df_homeless_ratio.dropna(subset=['Homeless Per 100K'], inplace=True)
+df_homeless_ratio = df_homeless_ratio.dropna(subset=['Homeless Per 100K'])
 
 
 # In[115]:
 
 
-# Filter out non-state entries from the 'State' column if necessary.
-# This ensures only valid state abbreviations are used for mapping.
-# 'GU', 'DC' are often mapped by Plotly, but can be explicitly excluded if desired.
-non_state_entries = ['Total', 'US', 'PR', 'VI', 'AS', 'MP']
-df_homeless_ratio = df_homeless_ratio[~df_homeless_ratio['State'].isin(non_state_entries)].copy()
+# Keep only the states and DC so every location can be matched to the GeoJSON.
+df_homeless_ratio = states_only(df_homeless_ratio)
 
 
-# In[116]:
-
+# In[118]:
 
-# Load the GeoJSON file containing US state boundaries
-with open(us_states_geojson_path, 'r') as f:
-    us_states_geojson = json.load(f)
 
+# --- Choropleth Map Creation ---
+# Reusing the geometry loaded for the first map
+fig = map_rate(df_homeless_ratio, us_states_geojson, latest_year)
 
-# In[90]:
+# Show the figure (this will open it in your browser or display in a compatible environment like Jupyter)
+fig.show()
 
+# You can also save the map as an HTML file
+# fig.write_html(f"us_homelessness_ratio_heatmap_{latest_year}.html")
 
-# Load the GeoJSON file containing US state boundaries
-try:
-    with open(us_states_geojson_path, 'r') as f:
-        us_states_geojson = json.load(f)
-    print("GeoJSON file loaded successfully!")
-except FileNotFoundError:
-    print(f"Error: The GeoJSON file '{us_states_geojson_path}' was not found. Please check the path.")
-    exit()
-except Exception as e:
-    print(f"An error occurred while loading the GeoJSON file: {e}")
-    exit()
 
+# In[119]:
 
-# In[118]:
 
+# --- Animated Map Across All Years ---
+# One state x year table drives a year slider; the geometry is stored once and every
+# frame only carries that year's counts, e.g. to see what happened in CA around 2021
+fig = map_animated(state_year_frame(df_pit, population), us_states_geojson)
+fig.show()
 
-# --- Choropleth Map Creation ---
-fig = px.choropleth(
-    df_homeless_ratio, # Use your df_homeless_ratio DataFrame
-    geojson=us_states_geojson,
-    locations='State', # Use the 'State' column directly (abbreviations)
-    featureidkey='id', # Point to the 'id' field in your GeoJSON features for matching
-    color='Homeless Per 100K', # Color intensity based on 'Homeless Per 100K'
-    hover_name='State', # Display the state abbreviation on hover
-    color_continuous_scale="Oranges", # Colormap: 'Viridis' (denser for high, lighter for low)
-    scope="usa",
-    title='Homelessness Ratio Per 100K Population by State in 2024',
-    labels={'Homeless Per 100K': 'Homeless Individuals per 100,000 People'}
-)
 
-# Update layout for better appearance
-fig.update_geos(
-    visible=False,
-    resolution=50, # Resolution of map (110m, 50m, 10m)
-    showland=True, showcoastlines=True, showcountries=True, showsubunits=True
-)
-fig.update_layout(margin={"r":0,"t":50,"l":0,"b":0})
+# In[120]:
 
-# Show the figure (this will open it in your browser or display in a compatible environment like Jupyter)
-fig.show()
 
-# You can also save the map as an HTML file
-# fig.write_html("us_homelessness_ratio_heatmap_2024.html")
+# Time, CPU time, rows and peak memory of every pipeline stage and chart in this run
+# (instrument.configure(path) also appends them to a JSON-lines file)
+print("\n--- Pipeline stage summary ---")
+print(summary_table().to_string())
 
 
 # # =============================================================================
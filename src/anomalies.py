@@ -0,0 +1,191 @@
+"""
+Change-point and anomaly flags over (series, year) count matrices.
+
+Works on any matrix with one row per series (a state, or a CoC) and one column
+per consecutive year, e.g. the arrays of rates.StateYearMatrix or
+shelter.ShelterBreakdown. Every check is a whole-array operation, so thousands of
+CoC series cost about the same Python work as 51 states:
+
+- breaks: year-over-year log changes are scored against each series' own median
+  change and median absolute deviation (a robust z-score). Large scores with a
+  large relative change are flagged as a drop or a spike, and as a temporary
+  drop/spike followed by a rebound when the next year reverses it (e.g.
+  California in 2021, when most CoCs skipped the unsheltered count).
+- missing count: a year without a value between two years that have one.
+- partial count: the unsheltered count is missing or zero in a year where the
+  series was sheltered-counted and usually reports unsheltered people.
+"""
+
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from instrument import instrumented
+from shelter import ShelterBreakdown
+from states import STATE_CODES, STATE_DTYPE, STATE_NAMES
+
+
+# Robust z-score above which a year-over-year change is a break
+Z_THRESHOLD = 3.5
+# ... and the smallest relative change that counts (30%), so stable series are not flagged for noise
+MIN_CHANGE = 0.3
+# Floor of the robust scale of log changes, for series that barely move
+MIN_SCALE = 0.05
+# Median absolute deviation -> standard deviation for normally distributed changes
+MAD_TO_SIGMA = 1.4826
+
+
+def log_changes(values):
+    """Log of the ratio to the previous year; NaN for the first year and non-positive counts."""
+    positive = np.where(values > 0, values, np.nan)
+    changes = np.full(values.shape, np.nan)
+    changes[:, 1:] = np.log(positive[:, 1:] / positive[:, :-1])
+    return changes
+
+
+def robust_scores(changes):
+    """Robust z-score of every change against its own series' median and MAD."""
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # Series without any change
+        median = np.nanmedian(changes, axis=1, keepdims=True)
+        mad = np.nanmedian(np.abs(changes - median), axis=1, keepdims=True)
+    scale = np.maximum(mad * MAD_TO_SIGMA, MIN_SCALE)
+    return (changes - median) / scale
+
+
+def internal_gaps(values):
+    """Years without a value that lie between two years with one, per series."""
+    observed = ~np.isnan(values)
+    seen_before = np.zeros_like(observed)
+    seen_before[:, 1:] = np.logical_or.accumulate(observed, axis=1)[:, :-1]
+    seen_after = np.zeros_like(observed)
+    seen_after[:, :-1] = np.logical_or.accumulate(observed[:, ::-1], axis=1)[:, ::-1][:, 1:]
+    return ~observed & seen_before & seen_after
+
+
+def partial_counts(sheltered, unsheltered):
+    """Years whose unsheltered count is missing or zero while the series usually has one."""
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # Series that never report unsheltered people
+        usual = np.nanmedian(np.where(unsheltered > 0, unsheltered, np.nan), axis=1, keepdims=True) > 0
+    absent = np.isnan(unsheltered) | (unsheltered == 0)
+    return absent & (sheltered > 0) & usual
+
+
+def anomaly_masks(values, sheltered=None, unsheltered=None, z_threshold=Z_THRESHOLD, min_change=MIN_CHANGE):
+    """
+    Boolean (series, year) masks per anomaly kind, plus the score of every change.
+
+    Returns ({kind: mask}, scores, changes) where changes are log year-over-year
+    changes and scores their robust z-scores.
+    """
+    changes = log_changes(values)
+    scores = robust_scores(changes)
+    with np.errstate(invalid='ignore'):
+        breaks = (np.abs(scores) > z_threshold) & (np.abs(np.expm1(changes)) >= min_change)
+        down, up = breaks & (changes < 0), breaks & (changes > 0)
+
+    # A break followed the next year by a break the other way is temporary
+    next_up = np.zeros_like(up)
+    next_up[:, :-1] = up[:, 1:]
+    next_down = np.zeros_like(down)
+    next_down[:, :-1] = down[:, 1:]
+    prev_temporary = np.zeros_like(up)
+    prev_temporary[:, 1:] = (down & next_up)[:, :-1] | (up & next_down)[:, :-1]
+
+    masks = {
+        'missing count': internal_gaps(values),
+        'temporary drop': down & next_up,
+        'temporary spike': up & next_down,
+        'rebound': breaks & prev_temporary,
+    }
+    masks['drop'] = down & ~masks['temporary drop'] & ~masks['rebound']
+    masks['spike'] = up & ~masks['temporary spike'] & ~masks['rebound']
+    if sheltered is not None and unsheltered is not None:
+        masks['partial count'] = partial_counts(sheltered, unsheltered)
+    return masks, scores, changes
+
+
+def detect_anomalies(values, labels, years, sheltered=None, unsheltered=None, label='Series',
+                     z_threshold=Z_THRESHOLD, min_change=MIN_CHANGE):
+    """
+    Long table of flagged (series, year) cells of `values`.
+
+    Columns: `label`, 'Year', 'Value', 'Previous', 'Change %', 'Score' and
+    'Anomaly' (kinds joined by '; ', e.g. 'temporary drop; partial count').
+    """
+    years = np.asarray(years, dtype='int64')
+    masks, scores, changes = anomaly_masks(values, sheltered, unsheltered, z_threshold, min_change)
+    flagged = np.logical_or.reduce(list(masks.values()))
+    rows, cols = np.nonzero(flagged)
+
+    kinds = np.array(list(masks))
+    hits = np.stack([masks[kind][rows, cols] for kind in kinds], axis=1)
+    previous = np.full(values.shape, np.nan)
+    previous[:, 1:] = values[:, :-1]
+    return pd.DataFrame({
+        label: np.asarray(labels, dtype=object)[rows],
+        'Year': years[cols],
+        'Value': values[rows, cols],
+        'Previous': previous[rows, cols],
+        'Change %': np.expm1(changes[rows, cols]) * 100,
+        'Score': scores[rows, cols],
+        'Anomaly': ['; '.join(kinds[hit]) for hit in hits],
+    })
+
+
+@instrumented('anomalies')
+def detect_state_anomalies(df_long, states=STATE_CODES, **kwargs):
+    """Anomalies of the 'Overall Homeless' series of every state in the cleaned long table."""
+    shelter = ShelterBreakdown.from_long(df_long, states=states)
+    flags = detect_anomalies(shelter.overall, shelter.states, shelter.years, shelter.sheltered,
+                             shelter.unsheltered, label='State', **kwargs)
+    flags['State'] = flags['State'].astype(STATE_DTYPE)
+    return flags
+
+
+def mark_anomalies(df, flags, key=('State', 'Year')):
+    """`df` with an 'Anomaly' column from `flags` (NaN for rows that were not flagged)."""
+    key = list(key)
+    marks = flags[key + ['Anomaly']].astype({'Year': df['Year'].dtype})
+    return df.drop(columns='Anomaly', errors='ignore').merge(marks, on=key, how='left').set_axis(df.index)
+
+
+def _thousands(count):
+    return f'{count / 1000:.0f}K' if count >= 1000 else f'{count:,.0f}'
+
+
+def anomaly_insight(flags, states):
+    """
+    Insight text for the flagged years of `states`, one sentence per break or gap.
+
+    A temporary drop or spike is described together with the rebound that
+    follows it, e.g. a count that fell from 162K to 57K and rose again to 172K.
+    """
+    flags = flags[flags['State'].isin(states)]
+    rebounds = {(state, year): value for state, year, value, kinds
+                in flags[['State', 'Year', 'Value', 'Anomaly']].itertuples(index=False) if 'rebound' in kinds}
+    sentences = []
+    for state, year, value, previous, kinds in flags[['State', 'Year', 'Value', 'Previous', 'Anomaly']].itertuples(
+            index=False):
+        name = STATE_NAMES[str(state)]
+        if 'temporary' in kinds:
+            direction = 'dropped' if 'temporary drop' in kinds else 'jumped'
+            after = rebounds.get((state, year + 1))
+            sentences.append(f"{name}'s count {direction} from {_thousands(previous)} to {_thousands(value)} in "
+                             f"{year}, only to return to {_thousands(after)} in {year + 1}"
+                             + (" (the unsheltered count looks incomplete that year)" if 'partial count' in kinds
+                                else "") + '.')
+        elif 'drop' in kinds or 'spike' in kinds:
+            direction = 'dropped' if 'drop' in kinds else 'jumped'
+            sentences.append(f"{name}'s count {direction} from {_thousands(previous)} to {_thousands(value)} in "
+                             f"{year}.")
+        elif 'missing count' in kinds:
+            sentences.append(f"{name} has no count for {year}.")
+        elif 'partial count' in kinds and 'rebound' not in kinds:
+            sentences.append(f"{name}'s {year} count has no unsheltered count.")
+    if not sentences:
+        return "Insight: No abrupt breaks or missing counts among these states."
+    return ("Insight: Flagged years look like breaks in reporting rather than real trends. "
+            + ' '.join(sentences))
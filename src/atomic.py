@@ -0,0 +1,28 @@
+"""
+Atomic file writes shared by the caches, stores and exporters.
+"""
+
+import os
+import threading
+
+
+def write_atomic(path, write):
+    """
+    Call `write(tmp_path)`, then rename the temporary file to `path`; returns `path`.
+
+    Readers never see a partially written file, and concurrent writers (threads
+    or processes) each use their own temporary file. The parent directory is
+    created if needed, and the temporary file is removed if `write` fails.
+    Temporary names contain '.tmp' and keep the extension of `path`, since
+    matplotlib and plotly pick the file type from it.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    root, ext = os.path.splitext(path)
+    tmp_path = f'{root}.tmp{os.getpid()}-{threading.get_ident()}{ext}'
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
@@ -0,0 +1,114 @@
+"""
+Headless batch rendering of every figure in the analysis.
+
+Renders the figures in figures.FIGURES to files with the Agg backend, one
+process per figure, and prints how long each figure took. No display is needed.
+Figures whose inputs, builder and settings match an earlier run are copied from
+the figure cache (figure_cache.py) instead of being rendered again.
+
+    python src/batch_render.py --workbook data/raw/2007-2024-PIT-Counts-by-State.xlsb \
+        --geojson data/geojson/us_states.geojson --out Vizualizations
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from diagnostics import QUIET, set_verbosity
+from figure_cache import DEFAULT_FIGURE_CACHE_DIR, DEFAULT_MAX_BYTES, FigureCache, figure_fingerprint
+from figures import FIGURES, build_figure, figure_filename, save_figure
+from geometry import load_geometry
+from instrument import configure, read_records, stage, summary_table
+from parallel import default_workers, process_pool
+from pipeline import build_tables
+
+
+def render_figure(name, inputs, out_dir, cache=None):
+    """
+    Build and save one figure, or copy it from `cache`; returns (name, path, seconds, cached).
+    """
+    start = time.perf_counter()
+    path = os.path.join(out_dir, figure_filename(name, inputs.get('year')))
+    with stage(f'render:{name}') as record:
+        fingerprint = figure_fingerprint(name, inputs) if cache is not None else None
+        cached = fingerprint is not None and cache.fetch(fingerprint, path)
+        if not cached:
+            save_figure(build_figure(name, inputs), path)
+            if fingerprint is not None:
+                cache.store(fingerprint, path)
+        record['rows_out'] = 1
+        record['cached'] = cached
+    return name, path, time.perf_counter() - start, cached
+
+
+def render_all(inputs, out_dir, names=None, max_workers=None, cache=None):
+    """
+    Render figures `names` (default: all of FIGURES) into `out_dir` concurrently.
+
+    Each worker process receives only the inputs its figure needs. With a
+    figure_cache.FigureCache, unchanged figures are copied from it. Returns a list
+    of (name, path, seconds, cached) in the order of `names`.
+    """
+    names = list(FIGURES) if names is None else list(names)
+    os.makedirs(out_dir, exist_ok=True)
+    if max_workers is None:
+        max_workers = default_workers(len(names))
+
+    tasks = [(name, {key: inputs[key] for key in FIGURES[name].inputs}) for name in names]
+    pool = process_pool(max_workers)
+    if pool is None:
+        results = [render_figure(name, task_inputs, out_dir, cache) for name, task_inputs in tasks]
+    else:
+        with pool:
+            futures = [pool.submit(render_figure, name, task_inputs, out_dir, cache) for name, task_inputs in tasks]
+            results = [future.result() for future in futures]
+    if cache is not None:
+        cache.evict()  # Also applies a lowered size cap when every figure was a hit
+    return results
+
+
+def print_timings(results, total_seconds):
+    width = max(len(name) for name, _, _, _ in results)
+    for name, path, seconds, cached in results:
+        print(f"{name:<{width}}  {seconds:7.2f}s  {path}{'  (cached)' if cached else ''}")
+    print(f"{'total':<{width}}  {total_seconds:7.2f}s  (wall clock)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render every analysis figure to files without a display.")
+    parser.add_argument('--workbook', required=True, help="Path to the HUD PIT .xlsb workbook")
+    parser.add_argument('--geojson', required=True, help="Path to the US states GeoJSON file")
+    parser.add_argument('--out', default='Vizualizations', help="Output directory (default: Vizualizations)")
+    parser.add_argument('--figures', nargs='+', choices=list(FIGURES), help="Only render these figures")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: one per figure, up to CPU count)")
+    parser.add_argument('--cache-dir', default=DEFAULT_FIGURE_CACHE_DIR, help="Figure cache directory")
+    parser.add_argument('--cache-size-mb', type=float, default=DEFAULT_MAX_BYTES / 2 ** 20,
+                        help="Size cap of the figure cache; least recently used figures are evicted")
+    parser.add_argument('--no-cache', action='store_true', help="Render every figure, ignoring the cache")
+    parser.add_argument('--metrics', default=None,
+                        help="Append per-stage timing and memory records to this JSON-lines file and print a summary")
+    args = parser.parse_args(argv)
+
+    # No display: matplotlib is imported lazily by the builders and picks this up
+    os.environ['MPLBACKEND'] = 'Agg'
+    # Batch runs never compute the exploratory head/info/describe dumps
+    set_verbosity(QUIET)
+    if args.metrics:
+        configure(args.metrics)
+
+    start = time.perf_counter()
+    inputs = build_tables(args.workbook)
+    inputs['geojson'] = load_geometry(args.geojson).to_geojson()
+    cache = None if args.no_cache else FigureCache(args.cache_dir, int(args.cache_size_mb * 2 ** 20))
+    results = render_all(inputs, args.out, args.figures, args.workers, cache)
+    print_timings(results, time.perf_counter() - start)
+    if args.metrics:
+        # Includes the records the worker processes appended to the same file
+        print()
+        print(summary_table(read_records(args.metrics)).to_string())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
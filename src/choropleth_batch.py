@@ -0,0 +1,158 @@
+"""
+Choropleth maps for every year and metric.
+
+Renders one state map per (metric, year) from the cleaned long table: overall
+count, per-100K rate, sheltered share and year-over-year change. Each metric is
+one (state, year) array (rates.StateYearMatrix, shelter.ShelterBreakdown) and
+each map is just one column of it. The simplified geometry is loaded once, the
+states are matched to GeoJSON features once, and each metric gets one color
+range shared by all of its years, so maps of different years can be compared
+side by side. Maps are rendered in a fork-based process pool; the workers
+inherit the geometry instead of receiving a copy per map.
+
+    python src/choropleth_batch.py --workbook data/raw/2007-2024-PIT-Counts-by-State.xlsb \
+        --geojson data/geojson/us_states.geojson --out Vizualizations/maps
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from diagnostics import QUIET, set_verbosity
+from figures import choropleth_from_arrays, save_figure
+from geometry import load_geometry
+from parallel import default_workers, process_pool
+from pit_cache import load_yearly_table
+from population import load_population
+from rates import StateYearMatrix
+from shelter import ShelterBreakdown
+from states import STATE_CODES
+
+
+MapMetric = namedtuple('MapMetric', ['title', 'label', 'colorscale', 'diverging'])
+
+MAP_METRICS = {
+    'overall': MapMetric('Overall Homelessness by State in {year}', 'Total Homeless Individuals',
+                         'Oranges', False),
+    'per_100k': MapMetric('Homelessness Ratio Per 100K Population by State in {year}',
+                          'Homeless Individuals per 100,000 People', 'Oranges', False),
+    'sheltered_share': MapMetric('Share of Homeless Individuals Sheltered by State in {year}',
+                                 'Sheltered (%)', 'Blues', False),
+    'yoy_change': MapMetric('Year-over-Year Change in Overall Homelessness by State in {year}',
+                            'Change from Previous Year (%)', 'RdBu_r', True),
+}
+
+# Diverging scales are clipped at this percentile of |change| so one outlier
+# (e.g. a state that barely counted the year before) does not wash out the rest
+DIVERGING_CLIP_PERCENTILE = 98
+
+# Geometry and feature ids for the workers; set before the pool forks
+_shared = {}
+
+
+def metric_arrays(df_pit, population, states=STATE_CODES):
+    """Years and {metric: (state, year) array} for every metric in MAP_METRICS."""
+    matrix = StateYearMatrix.from_long(df_pit, population, states=states)
+    shelter = ShelterBreakdown.from_long(df_pit, states=states)
+    return matrix.years, {
+        'overall': matrix.counts,
+        'per_100k': matrix.rates(),
+        'sheltered_share': shelter.sheltered_share() * 100,
+        'yoy_change': matrix.yoy_pct(),
+    }
+
+
+def color_range(values, diverging=False):
+    """One (zmin, zmax) for all years of a metric; symmetric around zero when diverging."""
+    finite = values[np.isfinite(values)]
+    if finite.size == 0:
+        return None, None
+    if diverging:
+        bound = float(np.percentile(np.abs(finite), DIVERGING_CLIP_PERCENTILE))
+        return -bound, bound
+    return float(finite.min()), float(finite.max())
+
+
+def _render_map(metric, year, values, zmin, zmax, path):
+    spec = MAP_METRICS[metric]
+    fig = choropleth_from_arrays(_shared['geojson'], _shared['locations'], values,
+                                 spec.title.format(year=year), spec.label, spec.colorscale, zmin, zmax)
+    save_figure(fig, path)
+    return metric, year, path
+
+
+def render_choropleths(df_pit, population, geometry, out_dir, metrics=None, years=None, fmt='html',
+                       max_workers=None):
+    """
+    Write one map per metric and year to `out_dir` as <metric>_<year>.<fmt>.
+
+    `metrics` defaults to all of MAP_METRICS and `years` to every year of
+    `df_pit`; years without any value for a metric (e.g. the first year of
+    'yoy_change') are skipped. Static formats (png, svg) need the kaleido package.
+    Returns a list of (metric, year, path); raises ValueError for a year outside
+    the workbook's years.
+    """
+    metrics = list(MAP_METRICS) if metrics is None else list(metrics)
+    all_years, arrays = metric_arrays(df_pit, population)
+    years = all_years if years is None else [int(year) for year in years]
+    missing = [year for year in years if not all_years[0] <= year <= all_years[-1]]
+    if missing:
+        raise ValueError(f"No data for {', '.join(map(str, missing))}; years are {all_years[0]}-{all_years[-1]}.")
+
+    # Rows of the states that have a feature in the geometry, matched once for every map
+    index = geometry.feature_index()
+    rows = [i for i, state in enumerate(STATE_CODES) if state in index]
+    _shared['geojson'] = geometry.to_geojson()
+    _shared['locations'] = [STATE_CODES[i] for i in rows]
+
+    os.makedirs(out_dir, exist_ok=True)
+    tasks = []
+    for metric in metrics:
+        values = arrays[metric][rows]
+        zmin, zmax = color_range(values, MAP_METRICS[metric].diverging)
+        for year in years:
+            column = values[:, int(year) - int(all_years[0])]
+            if np.isnan(column).all():
+                continue
+            tasks.append((metric, int(year), column, zmin, zmax, os.path.join(out_dir, f'{metric}_{year}.{fmt}')))
+
+    if max_workers is None:
+        max_workers = default_workers(len(tasks))
+    pool = process_pool(max_workers)
+    if pool is None:
+        return [_render_map(*task) for task in tasks]
+    with pool:
+        futures = [pool.submit(_render_map, *task) for task in tasks]
+        return [future.result() for future in futures]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render a choropleth for every year and metric.")
+    parser.add_argument('--workbook', required=True, help="Path to the HUD PIT .xlsb workbook")
+    parser.add_argument('--geojson', required=True, help="Path to the US states GeoJSON file")
+    parser.add_argument('--out', default=os.path.join('Vizualizations', 'maps'), help="Output directory")
+    parser.add_argument('--metrics', nargs='+', choices=list(MAP_METRICS), help="Only these metrics")
+    parser.add_argument('--years', nargs='+', type=int, help="Only these years")
+    parser.add_argument('--format', default='html', choices=['html', 'png', 'svg'],
+                        help="Output format (png and svg need kaleido)")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    set_verbosity(QUIET)
+    start = time.perf_counter()
+    df_pit, geometry = load_yearly_table(args.workbook), load_geometry(args.geojson)
+    try:
+        results = render_choropleths(df_pit, load_population(), geometry, args.out, args.metrics, args.years,
+                                     args.format, args.workers)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"Wrote {len(results)} maps to {args.out} in {time.perf_counter() - start:.2f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""
+Verbosity-controlled diagnostic output for analysis.py.
+
+The head/tail/info/describe/dtypes dumps of the notebook are useful while
+exploring and wasted work in scheduled runs; describe() and info() scan every
+column. Each dump here takes the frame and is computed only when the current
+verbosity asks for it:
+
+    QUIET    nothing (batch_render.py and the benchmarks run at this level)
+    SUMMARY  head() previews of each step (the default)
+    DETAIL   also tail(), info(), describe(), dtypes and the memory report
+
+The level comes from the PIT_VERBOSITY environment variable ('quiet',
+'summary', 'detail' or 0-2) unless set_verbosity() is called.
+"""
+
+import os
+
+
+QUIET, SUMMARY, DETAIL = 0, 1, 2
+LEVEL_NAMES = {'quiet': QUIET, 'summary': SUMMARY, 'detail': DETAIL}
+VERBOSITY_ENV = 'PIT_VERBOSITY'
+
+_verbosity = None
+
+
+def _parse_level(value):
+    value = str(value).strip().lower()
+    if value in LEVEL_NAMES:
+        return LEVEL_NAMES[value]
+    if value.isdigit():
+        return min(int(value), DETAIL)
+    raise ValueError(f"Unknown verbosity {value!r}; use one of {', '.join(LEVEL_NAMES)} or 0-{DETAIL}.")
+
+
+def verbosity():
+    """Current level, read from PIT_VERBOSITY on first use."""
+    global _verbosity
+    if _verbosity is None:
+        _verbosity = _parse_level(os.environ.get(VERBOSITY_ENV, SUMMARY))
+    return _verbosity
+
+
+def set_verbosity(level):
+    """Set the level to QUIET, SUMMARY or DETAIL (or one of their names)."""
+    global _verbosity
+    _verbosity = _parse_level(level)
+
+
+def enabled(level=SUMMARY):
+    return verbosity() >= level
+
+
+def show(title, compute, level=SUMMARY):
+    """Print `title` and the result of calling `compute()`, only at `level` or above."""
+    if not enabled(level):
+        return
+    print(title)
+    result = compute()
+    if result is not None:  # e.g. DataFrame.info() prints itself
+        print(result)
+
+
+def show_head(df, title, n=5, level=SUMMARY):
+    show(title, lambda: df.head(n), level)
+
+
+def show_tail(df, title, n=5, level=DETAIL):
+    show(title, lambda: df.tail(n), level)
+
+
+def show_info(df, title, level=DETAIL):
+    show(title, df.info, level)
+
+
+def show_describe(df, title, level=DETAIL):
+    show(title, df.describe, level)
+
+
+def show_dtypes(df, title, level=DETAIL):
+    show(title, lambda: df.dtypes, level)
@@ -0,0 +1,193 @@
+"""
+Export the derived tables and every figure to files, with a manifest.
+
+Tables (df_final, the top/bottom rankings, the yearly long tables, the
+anomaly flags and the regional roll-ups) are written as CSV, Parquet and JSON;
+figures as PNG and SVG (matplotlib charts) and HTML (plotly maps, plus PNG/SVG
+when kaleido is installed). Figures are rendered in the fork-based process pool as in
+batch_render.py. Meanwhile the table files are serialized and written by a
+thread pool, so slow disk or network-share writes overlap instead of queuing.
+Every file is written under a temporary name and renamed into place, so a
+reader never sees a partial artifact. manifest.json, listing each artifact with
+its size and SHA-256, is written last, once every artifact is in place.
+
+    python src/export.py --workbook data/raw/2007-2024-PIT-Counts-by-State.xlsb \
+        --geojson data/geojson/us_states.geojson --out exports
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from atomic import write_atomic
+from diagnostics import QUIET, set_verbosity
+from figure_cache import DEFAULT_FIGURE_CACHE_DIR, FigureCache, figure_fingerprint
+from figures import FIGURES, build_figure, figure_filename, save_figure
+from geometry import load_geometry
+from parallel import default_workers, process_pool
+from pipeline import build_tables
+from pit_cache import cache_available, file_checksum
+
+
+EXPORT_TABLES = ['df_final', 'df_top_homeless', 'df_top_population', 'df_top_rate', 'df_bottom_rate',
+                 'df_pit', 'df_state_year', 'df_anomalies', 'df_regions']
+TABLE_FORMATS = ('csv', 'parquet', 'json')
+FIGURE_FORMATS = ('png', 'svg', 'html')
+MANIFEST_NAME = 'manifest.json'
+
+
+def _write_csv(df, path):
+    df.to_csv(path, index=False)
+
+
+def _write_parquet(df, path):
+    df.to_parquet(path, index=False)
+
+
+def _write_json(df, path):
+    df.to_json(path, orient='records', indent=1)
+
+
+TABLE_WRITERS = {'csv': _write_csv, 'parquet': _write_parquet, 'json': _write_json}
+
+
+def artifact(name, kind, fmt, path, out_dir, seconds):
+    """Manifest entry of a written file."""
+    return {'name': name, 'kind': kind, 'format': fmt, 'path': os.path.relpath(path, out_dir),
+            'bytes': os.path.getsize(path), 'sha256': file_checksum(path), 'seconds': round(seconds, 4)}
+
+
+def supported_formats(name, formats):
+    """The formats of `formats` that figure `name` can be saved in."""
+    if FIGURES[name].filename.endswith('.html'):
+        static = importlib.util.find_spec('kaleido') is not None
+        return [fmt for fmt in formats if fmt == 'html' or static]
+    return [fmt for fmt in formats if fmt != 'html']
+
+
+def export_table(name, df, fmt, out_dir):
+    start = time.perf_counter()
+    if hasattr(df, 'to_long'):  # shelter.ShelterBreakdown
+        df = df.to_long()
+    path = write_atomic(os.path.join(out_dir, f'{name}.{fmt}'), lambda tmp: TABLE_WRITERS[fmt](df, tmp))
+    return artifact(name, 'table', fmt, path, out_dir, time.perf_counter() - start)
+
+
+def export_figure(name, inputs, formats, out_dir, cache=None):
+    """Save figure `name` in every format of `formats`, building it at most once; returns manifest entries."""
+    start = time.perf_counter()
+    base = os.path.splitext(figure_filename(name, inputs.get('year')))[0]
+    fingerprint = figure_fingerprint(name, inputs) if cache is not None else None
+    fig = None
+    entries = []
+    for fmt in formats:
+        path = os.path.join(out_dir, f'{base}.{fmt}')
+
+        def write(tmp_path):
+            nonlocal fig
+            if fingerprint is not None and cache.fetch(fingerprint, tmp_path):
+                return
+            if fig is None:
+                fig = build_figure(name, inputs)
+            save_figure(fig, tmp_path, close=False)
+            if fingerprint is not None:
+                cache.store(fingerprint, tmp_path)
+
+        write_atomic(path, write)
+        entries.append(artifact(name, 'figure', fmt, path, out_dir, time.perf_counter() - start))
+        start = time.perf_counter()
+    if hasattr(fig, 'savefig'):
+        import matplotlib.pyplot as plt
+
+        plt.close(fig)
+    return entries
+
+
+def export_all(tables, out_dir, table_names=None, table_formats=TABLE_FORMATS, figure_names=None,
+               figure_formats=FIGURE_FORMATS, max_workers=None, io_threads=None, cache=None):
+    """
+    Write tables and figures to `out_dir`, then the manifest; returns the manifest.
+
+    `tables` is the result of pipeline.build_tables with a 'geojson' entry.
+    Figures go to the process pool first, then the tables are written by
+    `io_threads` threads while the figures render.
+    """
+    table_names = EXPORT_TABLES if table_names is None else list(table_names)
+    figure_names = list(FIGURES) if figure_names is None else list(figure_names)
+    if 'parquet' in table_formats and not cache_available():
+        print("pyarrow is not installed; skipping Parquet tables", file=sys.stderr)
+        table_formats = [fmt for fmt in table_formats if fmt != 'parquet']
+    os.makedirs(out_dir, exist_ok=True)
+    start = time.perf_counter()
+
+    figure_tasks = [(name, {key: tables[key] for key in FIGURES[name].inputs},
+                     supported_formats(name, figure_formats)) for name in figure_names]
+    if max_workers is None:
+        max_workers = default_workers(len(figure_tasks))
+    pool = process_pool(max_workers)
+    # Submitted before any writer thread starts, so every worker is forked from a single-threaded process
+    figure_futures = [pool.submit(export_figure, name, inputs, formats, out_dir, cache)
+                      for name, inputs, formats in figure_tasks] if pool is not None else []
+
+    with ThreadPoolExecutor(io_threads) as writers:
+        table_futures = [writers.submit(export_table, name, tables[name], fmt, out_dir)
+                         for name in table_names for fmt in table_formats]
+        if pool is None:
+            entries = [entry for task in figure_tasks for entry in export_figure(*task, out_dir, cache)]
+        else:
+            with pool:
+                entries = [entry for future in figure_futures for entry in future.result()]
+        entries += [future.result() for future in table_futures]
+    if cache is not None:
+        cache.evict()
+
+    manifest = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'year': tables.get('year'),
+        'seconds': round(time.perf_counter() - start, 3),
+        'artifacts': sorted(entries, key=lambda entry: entry['path']),
+    }
+    write_atomic(os.path.join(out_dir, MANIFEST_NAME), lambda tmp: _write_manifest(manifest, tmp))
+    return manifest
+
+
+def _write_manifest(manifest, path):
+    with open(path, 'w') as f:
+        json.dump(manifest, f, indent=1, default=str)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the analysis tables and figures to files with a manifest.")
+    parser.add_argument('--workbook', required=True, help="Path to the HUD PIT .xlsb workbook")
+    parser.add_argument('--geojson', required=True, help="Path to the US states GeoJSON file")
+    parser.add_argument('--out', default='exports', help="Output directory (default: exports)")
+    parser.add_argument('--tables', nargs='+', choices=EXPORT_TABLES, help="Only these tables")
+    parser.add_argument('--table-formats', nargs='+', default=list(TABLE_FORMATS), choices=TABLE_FORMATS)
+    parser.add_argument('--figures', nargs='+', choices=list(FIGURES), help="Only these figures")
+    parser.add_argument('--figure-formats', nargs='+', default=list(FIGURE_FORMATS), choices=FIGURE_FORMATS,
+                        help="Charts are saved as PNG/SVG, maps as HTML (and PNG/SVG with kaleido)")
+    parser.add_argument('--workers', type=int, default=None, help="Figure worker processes (default: CPU count)")
+    parser.add_argument('--io-threads', type=int, default=None, help="Table writer threads")
+    parser.add_argument('--cache-dir', default=DEFAULT_FIGURE_CACHE_DIR, help="Figure cache directory")
+    parser.add_argument('--no-cache', action='store_true', help="Render every figure, ignoring the cache")
+    args = parser.parse_args(argv)
+
+    os.environ['MPLBACKEND'] = 'Agg'
+    set_verbosity(QUIET)
+    tables = build_tables(args.workbook)
+    tables['geojson'] = load_geometry(args.geojson).to_geojson()
+    cache = None if args.no_cache else FigureCache(args.cache_dir)
+    manifest = export_all(tables, args.out, args.tables, args.table_formats, args.figures, args.figure_formats,
+                          args.workers, args.io_threads, cache)
+    total = sum(entry['bytes'] for entry in manifest['artifacts'])
+    print(f"Wrote {len(manifest['artifacts'])} artifacts ({total / 2 ** 20:.1f} MiB) to {args.out} "
+          f"in {manifest['seconds']:.2f}s; manifest: {os.path.join(args.out, MANIFEST_NAME)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
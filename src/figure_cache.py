@@ -0,0 +1,124 @@
+"""
+Content-addressed cache of rendered figures.
+
+A figure's fingerprint is the SHA-256 of everything that decides what it looks
+like: the figure name, the data it is drawn from (the entries of
+figures.FIGURES[name].inputs, hashed by value), the source of the whole module
+its builder is defined in (so an edit to a shared helper or style constant
+counts too) and the output settings (DPI, plotly.js mode, file type). When a
+fingerprint is already in the cache directory, batch_render.py copies the
+stored PNG/HTML instead of building and rendering the figure again.
+
+Entries are files named <fingerprint><suffix>. A hit refreshes the file's
+modification time, and after every insert the least recently used files are
+removed until the directory is below its size cap.
+"""
+
+import functools
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import sys
+
+import numpy as np
+import pandas as pd
+
+from atomic import write_atomic
+from figures import FIGURES, PLOTLYJS, SAVE_DPI, figure_filename
+from pit_cache import DEFAULT_CACHE_DIR
+
+
+DEFAULT_FIGURE_CACHE_DIR = os.path.join(DEFAULT_CACHE_DIR, 'figures')
+DEFAULT_MAX_BYTES = 256 * 2 ** 20
+
+# Bump when rendering changes in a way the figures source does not show (e.g. a library upgrade)
+FIGURE_CACHE_VERSION = 1
+
+
+def update_digest(digest, value):
+    """Feed `value` into hashlib `digest` by content: frames, arrays, dicts and array containers."""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        frame = value.to_frame() if isinstance(value, pd.Series) else value
+        digest.update(repr((type(value).__name__, list(frame.columns), frame.dtypes.astype(str).tolist())).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif isinstance(value, np.ndarray):
+        digest.update(repr((value.dtype.str, value.shape)).encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, dict):
+        digest.update(json.dumps(value, sort_keys=True, default=str).encode())
+    elif hasattr(value, '__dict__'):
+        # Array containers such as shelter.ShelterBreakdown: hash their attributes
+        digest.update(type(value).__name__.encode())
+        for key in sorted(vars(value)):
+            digest.update(key.encode())
+            update_digest(digest, vars(value)[key])
+    else:
+        digest.update(repr(value).encode())
+
+
+@functools.lru_cache(maxsize=None)
+def module_source(module_name):
+    """Source of module `module_name`, read once per process."""
+    return inspect.getsource(sys.modules[module_name])
+
+
+def figure_fingerprint(name, inputs):
+    """Fingerprint of figure `name` drawn from `inputs` with the current builder and settings."""
+    spec = FIGURES[name]
+    digest = hashlib.sha256()
+    settings = (FIGURE_CACHE_VERSION, name, figure_filename(name, inputs.get('year')), SAVE_DPI, PLOTLYJS)
+    digest.update(repr(settings).encode())
+    digest.update(module_source(inspect.unwrap(spec.builder).__module__).encode())
+    for key in spec.inputs:
+        digest.update(key.encode())
+        update_digest(digest, inputs[key])
+    return digest.hexdigest()
+
+
+class FigureCache:
+    """Rendered figure files in `cache_dir`, capped at `max_bytes` with LRU eviction."""
+
+    def __init__(self, cache_dir=DEFAULT_FIGURE_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def _path(self, fingerprint, suffix):
+        return os.path.join(self.cache_dir, f'{fingerprint}{suffix}')
+
+    def fetch(self, fingerprint, path):
+        """Copy the cached figure to `path` and return True, or return False on a miss."""
+        cached = self._path(fingerprint, os.path.splitext(path)[1])
+        try:
+            shutil.copyfile(cached, path)
+            os.utime(cached)  # Mark as recently used
+        except FileNotFoundError:
+            return False
+        return True
+
+    def store(self, fingerprint, path):
+        """Add the rendered file at `path` under `fingerprint`, then enforce the size cap."""
+        cached = self._path(fingerprint, os.path.splitext(path)[1])
+        write_atomic(cached, lambda tmp_path: shutil.copyfile(path, tmp_path))
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the directory fits in max_bytes."""
+        entries = []
+        if not os.path.isdir(self.cache_dir):
+            return
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.is_file() and '.tmp' not in entry.name:
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:  # Evicted by another worker
+                pass
+            total -= size
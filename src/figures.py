@@ -0,0 +1,361 @@
+"""
+Figure builders for the homelessness analysis.
+
+Each builder takes the prepared table(s) for one chart (see pipeline.figure_inputs)
+and returns the figure without showing it: analysis.py displays it interactively,
+batch_render.py saves it to a file. FIGURES lists every chart with the inputs it
+needs and the file it is saved to.
+
+matplotlib, seaborn and plotly are imported inside the builders, so importing this
+module (e.g. to read FIGURES) does not load any plotting library. Every builder
+call is recorded as a stage by instrument.py.
+"""
+
+from collections import namedtuple
+
+from instrument import instrumented
+
+
+# Matplotlib figures are saved as PNG, plotly maps as standalone HTML; '{year}' in a
+# filename is replaced by the year the figure is drawn for (see figure_filename)
+FigureSpec = namedtuple('FigureSpec', ['builder', 'inputs', 'filename'])
+
+# Plotly maps load plotly.js from its CDN instead of embedding ~3.5 MB in every file
+PLOTLYJS = 'cdn'
+SAVE_DPI = 100
+
+
+def set_style():
+    import seaborn as sns
+
+    # for better aesthetics
+    sns.set_theme(style="whitegrid")
+
+
+def _short_number(value):
+    if value >= 1_000_000:
+        return f'{int(value / 1_000_000)}M'  # Millions
+    if value >= 1_000:
+        return f'{int(value / 1_000)}K'  # Thousands
+    return f'{int(value)}'  # Less than a thousand
+
+
+def _state_bar_chart(df, y, palette, title, ylabel, figsize=(16, 8), fmt='%.0f', labels=None):
+    """Bar chart with one bar per state, in the row order of `df`."""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    set_style()
+    states = df['State'].astype(str).tolist()
+    fig, ax = plt.subplots(figsize=figsize)
+    sns.barplot(
+        x=df['State'].astype(str),
+        y=df[y],
+        hue=df['State'].astype(str),
+        order=states,
+        hue_order=states,
+        palette=palette,
+        legend=False,
+        ax=ax
+    )
+    ax.set_title(title, fontsize=16)
+    ax.set_xlabel('State', fontsize=12)
+    ax.set_ylabel(ylabel, fontsize=12)
+    plt.setp(ax.get_xticklabels(), rotation=45, ha='right', fontsize=10)  # Rotate x-axis labels for readability
+
+    # Add value labels on top of the bars; each state is its own bar container
+    for i, container in enumerate(ax.containers):
+        if labels is None:
+            ax.bar_label(container, fmt=fmt, label_type='edge', fontsize=9, padding=3)
+        else:
+            ax.bar_label(container, labels=[labels[i]], label_type='edge', fontsize=9, padding=3)
+
+    fig.tight_layout()  # Adjust layout to prevent labels from overlapping
+    return fig
+
+
+@instrumented()
+def plot_top_homeless(df_top_homeless, year):
+    return _state_bar_chart(
+        df_top_homeless, 'Overall Homeless', 'viridis',
+        f'Top 10 States by Overall Homeless Population in {year}', 'Overall Homeless Count'
+    )
+
+
+@instrumented()
+def plot_top_population(df_top_population, year):
+    column = f'Population {year}'
+    return _state_bar_chart(
+        df_top_population, column, 'Blues_r',
+        f'Top 10 States by Total Population in {year}', 'Population',
+        labels=[_short_number(pop) for pop in df_top_population[column]]
+    )
+
+
+@instrumented()
+def plot_top_rate(df_top_rate, year):
+    return _state_bar_chart(
+        df_top_rate, 'Homeless Per 100K', 'viridis',
+        f'Top 10 States by Homelessness Rate (Per 100,000 Population) in {year}',
+        'Homeless Individuals per 100,000 People', figsize=(12, 7), fmt='%.1f'
+    )
+
+
+@instrumented()
+def plot_bottom_rate(df_bottom_rate, year):
+    return _state_bar_chart(
+        df_bottom_rate, 'Homeless Per 100K', 'viridis_r',  # Reversed viridis palette
+        f'Bottom 10 States by Homelessness Rate (Per 100,000 Population) in {year}',
+        'Homeless Individuals per 100,000 People', figsize=(12, 7), fmt='%.1f'
+    )
+
+
+@instrumented()
+def plot_yearly_trend(df_top_10_yearly_trend, top_states):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    set_style()
+    df_trend = df_top_10_yearly_trend.assign(State=df_top_10_yearly_trend['State'].astype(str))
+    fig, ax = plt.subplots(figsize=(15, 9))  # Slightly larger figure for more states
+    sns.lineplot(
+        data=df_trend,
+        x='Year',
+        y='Overall Homeless',
+        hue='State',
+        hue_order=[str(state) for state in top_states],
+        marker='o',
+        linewidth=2,
+        ax=ax
+    )
+    if 'Anomaly' in df_trend:
+        # Years flagged by anomalies.mark_anomalies (breaks, missing or partial counts)
+        df_flagged = df_trend[df_trend['Anomaly'].notna()]
+        ax.scatter(df_flagged['Year'], df_flagged['Overall Homeless'], s=140, marker='x', color='red',
+                   linewidths=2.5, zorder=5, label='Flagged year')
+    ax.set_title(f'Yearly Change in Overall Homeless Count for {len(top_states)} States'
+                 f'({df_trend["Year"].min()}-{df_trend["Year"].max()})', fontsize=16)
+    ax.set_xlabel('Year', fontsize=12)
+    ax.set_ylabel('Overall Homeless Count', fontsize=12)
+
+    min_year = int(df_trend['Year'].min())
+    max_year = int(df_trend['Year'].max())
+    ax.set_xticks(range(min_year, max_year + 1))
+    plt.setp(ax.get_xticklabels(), rotation=45, ha='right')
+
+    # Thousands separators on the y-axis
+    ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, loc: f'{int(x):,}'))
+
+    ax.grid(True, linestyle='--', alpha=0.6)
+    ax.legend(title='State', bbox_to_anchor=(1.05, 1), loc='upper left')
+    fig.tight_layout()
+    return fig
+
+
+@instrumented()
+def plot_sheltered_unsheltered(shelter, df_top_homeless, year):
+    """Grouped bars of sheltered and unsheltered counts, read straight from a shelter.ShelterBreakdown."""
+    import matplotlib.pyplot as plt
+    import numpy as np
+    import seaborn as sns
+
+    set_style()
+    states = df_top_homeless['State'].astype(str).tolist()
+    rows, col = shelter.rows(states), shelter.year_index(year)
+    x = np.arange(len(states))
+    width = 0.4
+    fig, ax = plt.subplots(figsize=(16, 8))
+    series = (('Sheltered Total Homeless', shelter.sheltered[rows, col]),
+              ('Unsheltered Homeless', shelter.unsheltered[rows, col]))
+    for i, ((label, counts), color) in enumerate(zip(series, sns.color_palette('Oranges', len(series)))):
+        bars = ax.bar(x + (i - 0.5) * width, np.nan_to_num(counts), width, label=label, color=color)
+        # Add value labels for better interpretation
+        ax.bar_label(bars, labels=['' if np.isnan(count) else f'{count:.0f}' for count in counts],
+                     label_type='edge', fontsize=12, color='black')
+
+    ax.set_title(f'Sheltered vs. Unsheltered Homeless by States ({year})', fontsize=16)
+    ax.set_xlabel('State', fontsize=12)
+    ax.set_ylabel('Number of Homeless Individuals', fontsize=12)
+    ax.set_xticks(x, states)
+    plt.setp(ax.get_xticklabels(), rotation=45, ha='right', fontsize=10)
+    ax.legend(title='Shelter Status', bbox_to_anchor=(1.05, 1), loc='upper left')
+
+    fig.tight_layout()
+    return fig
+
+
+def _state_choropleth(df, geojson, color, title, label):
+    import plotly.express as px
+
+    fig = px.choropleth(
+        df.assign(State=df['State'].astype(str)),
+        geojson=geojson,
+        locations='State',  # Two-letter abbreviations match the GeoJSON feature ids
+        featureidkey='id',
+        color=color,
+        hover_name='State',  # Display the state abbreviation on hover
+        color_continuous_scale="Oranges",
+        scope="usa",
+        title=title,
+        labels={color: label}
+    )
+    fig.update_geos(
+        visible=False,
+        resolution=50,  # Resolution of map (110m, 50m, 10m)
+        showland=True, showcoastlines=True, showcountries=True, showsubunits=True
+    )
+    fig.update_layout(margin={"r": 0, "t": 50, "l": 0, "b": 0})
+    return fig
+
+
+@instrumented()
+def map_overall(df_2024, geojson, year):
+    return _state_choropleth(df_2024, geojson, 'Overall Homeless',
+                             f'Overall Homelessness by State in {year}', 'Total Homeless Individuals')
+
+
+@instrumented()
+def map_rate(df_homeless_ratio, geojson, year):
+    return _state_choropleth(df_homeless_ratio, geojson, 'Homeless Per 100K',
+                             f'Homelessness Ratio Per 100K Population by State in {year}',
+                             'Homeless Individuals per 100,000 People')
+
+
+@instrumented()
+def choropleth_from_arrays(geojson, locations, values, title, label, colorscale='Oranges',
+                           zmin=None, zmax=None):
+    """
+    State choropleth from aligned arrays of feature ids and values.
+
+    Unlike the px maps above, no DataFrame is built and the color range can be
+    pinned (`zmin`/`zmax`) so that maps of different years share one scale.
+    """
+    import plotly.graph_objects as go
+
+    fig = go.Figure(go.Choropleth(
+        geojson=geojson,
+        locations=locations,
+        featureidkey='id',
+        z=values,
+        zmin=zmin,
+        zmax=zmax,
+        colorscale=colorscale,
+        colorbar={'title': {'text': label}},
+        hovertemplate='%{location}: %{z:,.1f}<extra></extra>',
+    ))
+    fig.update_geos(
+        visible=False, scope='usa',
+        resolution=50,
+        showland=True, showcoastlines=True, showcountries=True, showsubunits=True
+    )
+    fig.update_layout(title=title, margin={"r": 0, "t": 50, "l": 0, "b": 0})
+    return fig
+
+
+@instrumented()
+def map_animated(df_state_year, geojson, value='Overall Homeless', label='Total Homeless Individuals'):
+    """
+    Choropleth with a year slider over a pre-joined long table of every state and year.
+
+    The GeoJSON and the state ids are stored once, in the base trace; each
+    animation frame carries only that year's values and title, so adding years
+    adds a few hundred bytes each instead of another copy of the geometry. All
+    frames share one color range.
+    """
+    import numpy as np
+    import plotly.graph_objects as go
+
+    wide = df_state_year.pivot(index='State', columns='Year', values=value)
+    wide.index = wide.index.astype(str)
+    years = [int(year) for year in wide.columns]
+    values = wide.to_numpy(dtype='float64', na_value=np.nan).round(1)
+    finite = values[np.isfinite(values)]
+    title = f'{value} by State, {{year}}'
+
+    def frame_values(i):
+        return [None if np.isnan(v) else float(v) for v in values[:, i]]
+
+    fig = go.Figure(
+        data=[go.Choropleth(
+            geojson=geojson,
+            locations=wide.index.tolist(),
+            featureidkey='id',
+            z=frame_values(len(years) - 1),
+            zmin=float(finite.min()) if finite.size else None,
+            zmax=float(finite.max()) if finite.size else None,
+            colorscale='Oranges',
+            colorbar={'title': {'text': label}},
+            hovertemplate='%{location}: %{z:,.1f}<extra></extra>',
+        )],
+        frames=[go.Frame(name=str(year), traces=[0], data=[go.Choropleth(z=frame_values(i))],
+                         layout={'title': {'text': title.format(year=year)}})
+                for i, year in enumerate(years)],
+    )
+    steps = [{'label': str(year), 'method': 'animate',
+              'args': [[str(year)], {'mode': 'immediate', 'frame': {'duration': 0, 'redraw': True}}]}
+             for year in years]
+    fig.update_geos(
+        visible=False, scope='usa',
+        resolution=50,
+        showland=True, showcoastlines=True, showcountries=True, showsubunits=True
+    )
+    fig.update_layout(
+        title=title.format(year=years[-1]),
+        margin={"r": 0, "t": 50, "l": 0, "b": 0},
+        sliders=[{'active': len(years) - 1, 'currentvalue': {'prefix': 'Year: '}, 'steps': steps}],
+        updatemenus=[{'type': 'buttons', 'showactive': False, 'x': 0.05, 'y': 0, 'buttons': [
+            {'label': 'Play', 'method': 'animate',
+             'args': [None, {'frame': {'duration': 700, 'redraw': True}, 'fromcurrent': True}]},
+            {'label': 'Pause', 'method': 'animate',
+             'args': [[None], {'mode': 'immediate', 'frame': {'duration': 0, 'redraw': False}}]},
+        ]}],
+    )
+    return fig
+
+
+FIGURES = {
+    'top_homeless': FigureSpec(plot_top_homeless, ('df_top_homeless', 'year'),
+                               'top_10_states_homeless_{year}.png'),
+    'top_population': FigureSpec(plot_top_population, ('df_top_population', 'year'),
+                                 'US_States_Pop_{year}.png'),
+    'top_rate': FigureSpec(plot_top_rate, ('df_top_rate', 'year'),
+                           'Top10_Homelessness_Rate100K.png'),
+    'bottom_rate': FigureSpec(plot_bottom_rate, ('df_bottom_rate', 'year'),
+                              'Bottom10_Homelessness_Rate100K.png'),
+    'yearly_trend': FigureSpec(plot_yearly_trend, ('df_top_10_yearly_trend', 'top_states'),
+                               'yearly_trend.png'),
+    'sheltered_unsheltered': FigureSpec(plot_sheltered_unsheltered,
+                                        ('shelter', 'df_top_homeless', 'year'),
+                                        'Sheltered_VS_Unsheltered.png'),
+    'overall_map': FigureSpec(map_overall, ('df_2024', 'geojson', 'year'),
+                              'us_homelessness_heatmap_{year}.html'),
+    'rate_map': FigureSpec(map_rate, ('df_homeless_ratio', 'geojson', 'year'),
+                           'us_homelessness_ratio_heatmap_{year}.html'),
+    'animated_map': FigureSpec(map_animated, ('df_state_year', 'geojson'),
+                               'us_homelessness_heatmap_animated.html'),
+}
+
+
+def figure_filename(name, year=None):
+    """File name of figure `name` drawn for `year`, e.g. 'US_States_Pop_2024.png'."""
+    return FIGURES[name].filename.format(year=year)
+
+
+def build_figure(name, inputs):
+    """Build figure `name` from the matching entries of `inputs`."""
+    spec = FIGURES[name]
+    return spec.builder(*[inputs[key] for key in spec.inputs])
+
+
+def save_figure(fig, path, close=True):
+    """Save a matplotlib figure (and close it, unless `close` is False) or a plotly figure, by file extension."""
+    if hasattr(fig, 'savefig'):
+        import matplotlib.pyplot as plt
+
+        fig.savefig(path, dpi=SAVE_DPI, bbox_inches='tight')
+        if close:
+            plt.close(fig)
+    elif path.endswith('.html'):
+        fig.write_html(path, include_plotlyjs=PLOTLYJS)
+    else:
+        fig.write_image(path)  # Static plotly export needs the kaleido package
@@ -0,0 +1,162 @@
+"""
+Cached, simplified state geometry for the choropleth maps.
+
+The US states GeoJSON is parsed once, every polygon ring is simplified with the
+Douglas-Peucker algorithm to a configurable tolerance (in degrees) and the result
+is kept as flat coordinate arrays with offset arrays for features, polygons and
+rings. The arrays are cached in memory for the process and as an .npz file under
+data/cache keyed by the GeoJSON checksum and tolerance, so every map - in this run
+and later runs - reuses the same compact geometry instead of re-reading and
+serialising the full-resolution polygons.
+"""
+
+import json
+import os
+
+import numpy as np
+
+from atomic import write_atomic
+from pit_cache import DEFAULT_CACHE_DIR, file_checksum
+
+
+# Degrees; below one pixel on a national map (~60 degrees across ~1000 pixels)
+DEFAULT_TOLERANCE = 0.05
+# Decimal places kept in the GeoJSON handed to plotly (~10 m)
+COORDINATE_DECIMALS = 4
+
+_loaded = {}
+
+
+def simplify_ring(points, tolerance):
+    """Douglas-Peucker simplification of one closed ring given as an (n, 2) array."""
+    n = len(points)
+    if tolerance <= 0 or n <= 4:
+        return points
+
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        start, end = points[first], points[last]
+        inner = points[first + 1:last]
+        dx, dy = end - start
+        norm = np.hypot(dx, dy)
+        if norm == 0:
+            # Closed ring: first and last points coincide, use the distance to that point
+            distance = np.hypot(inner[:, 0] - start[0], inner[:, 1] - start[1])
+        else:
+            distance = np.abs(dx * (inner[:, 1] - start[1]) - dy * (inner[:, 0] - start[0])) / norm
+        farthest = int(np.argmax(distance))
+        if distance[farthest] > tolerance:
+            split = first + 1 + farthest
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+
+    simplified = points[keep]
+    # A ring needs at least three distinct points plus the closing point
+    return simplified if len(simplified) >= 4 else points
+
+
+class StateGeometry:
+    """
+    Simplified polygons of every feature as flat arrays.
+
+    Feature i owns polygons feature_offsets[i]:feature_offsets[i + 1], polygon j
+    owns rings polygon_offsets[j]:polygon_offsets[j + 1] and ring r owns points
+    coords[ring_offsets[r]:ring_offsets[r + 1]].
+    """
+
+    ARRAYS = ('ids', 'feature_offsets', 'polygon_offsets', 'ring_offsets', 'coords')
+
+    def __init__(self, ids, feature_offsets, polygon_offsets, ring_offsets, coords, source_points=None):
+        self.ids = np.asarray(ids, dtype=str)
+        self.feature_offsets = feature_offsets
+        self.polygon_offsets = polygon_offsets
+        self.ring_offsets = ring_offsets
+        self.coords = coords
+        self.source_points = source_points
+        self._geojson = None
+
+    @classmethod
+    def from_geojson(cls, geojson, tolerance=DEFAULT_TOLERANCE):
+        ids, feature_offsets, polygon_offsets, ring_offsets, rings = [], [0], [0], [0], []
+        source_points = 0
+        for feature in geojson['features']:
+            geometry = feature['geometry']
+            polygons = geometry['coordinates']
+            if geometry['type'] == 'Polygon':
+                polygons = [polygons]
+            for polygon in polygons:
+                for ring in polygon:
+                    points = np.asarray(ring, dtype='float64')
+                    source_points += len(points)
+                    rings.append(simplify_ring(points, tolerance))
+                    ring_offsets.append(ring_offsets[-1] + len(rings[-1]))
+                polygon_offsets.append(polygon_offsets[-1] + len(polygon))
+            feature_offsets.append(feature_offsets[-1] + len(polygons))
+            ids.append(str(feature.get('id', feature.get('properties', {}).get('name'))))
+
+        coords = np.concatenate(rings).astype('float32') if rings else np.empty((0, 2), dtype='float32')
+        return cls(ids, np.asarray(feature_offsets, dtype='int32'), np.asarray(polygon_offsets, dtype='int32'),
+                   np.asarray(ring_offsets, dtype='int32'), coords, source_points)
+
+    def feature_index(self):
+        """Feature id (e.g. 'CA') -> feature position."""
+        return {feature_id: i for i, feature_id in enumerate(self.ids.tolist())}
+
+    def _feature_geometry(self, i):
+        polygons = []
+        for j in range(self.feature_offsets[i], self.feature_offsets[i + 1]):
+            polygon = []
+            for r in range(self.polygon_offsets[j], self.polygon_offsets[j + 1]):
+                ring = self.coords[self.ring_offsets[r]:self.ring_offsets[r + 1]]
+                polygon.append(np.round(ring.astype('float64'), COORDINATE_DECIMALS).tolist())
+            polygons.append(polygon)
+        if len(polygons) == 1:
+            return {'type': 'Polygon', 'coordinates': polygons[0]}
+        return {'type': 'MultiPolygon', 'coordinates': polygons}
+
+    def to_geojson(self):
+        """The simplified geometry as a GeoJSON FeatureCollection (built once, then shared)."""
+        if self._geojson is None:
+            self._geojson = {
+                'type': 'FeatureCollection',
+                'features': [{'type': 'Feature', 'id': feature_id, 'properties': {},
+                              'geometry': self._feature_geometry(i)}
+                             for i, feature_id in enumerate(self.ids.tolist())],
+            }
+        return self._geojson
+
+    def save(self, path):
+        arrays = {name: getattr(self, name) for name in self.ARRAYS}
+        write_atomic(path, lambda tmp_path: np.savez(tmp_path, **arrays))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as arrays:
+            return cls(*(arrays[name] for name in cls.ARRAYS))
+
+
+def load_geometry(path, tolerance=DEFAULT_TOLERANCE, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Simplified StateGeometry for the GeoJSON at `path`.
+
+    Returned from the in-process cache when possible, then from the .npz cache on
+    disk; otherwise the GeoJSON is parsed, simplified and written to the cache.
+    """
+    checksum = file_checksum(path)
+    key = (checksum, tolerance)
+    if key not in _loaded:
+        cache_path = os.path.join(cache_dir, f'geometry_{checksum[:16]}_{tolerance:g}.npz')
+        if os.path.exists(cache_path):
+            _loaded[key] = StateGeometry.load(cache_path)
+        else:
+            with open(path, 'r') as f:
+                geometry = StateGeometry.from_geojson(json.load(f), tolerance)
+            geometry.save(cache_path)
+            _loaded[key] = geometry
+    return _loaded[key]
@@ -0,0 +1,314 @@
+"""
+Incremental update of the stored long table when a new PIT workbook arrives.
+
+HUD republishes the whole workbook every year, but usually only the new year
+sheet (and now and then a revised one) differs from the previous release. Instead
+of reloading every sheet, each year sheet gets a fingerprint from the raw bytes
+of its part inside the workbook package (.xlsb and .xlsx are zip archives), so
+unchanged sheets are recognised without parsing them. Sheets whose fingerprint
+changed are parsed and cleaned, and their cleaned rows are hashed: only years
+whose content really differs replace their rows in the stored long table.
+
+Derived metrics are then recomputed for the affected years only: per-year ranks
+and top-10 lists for the changed years, year-over-year changes for the changed
+years and the year after each of them. Everything is stored under data/cache
+next to a JSON manifest of the sheet hashes. Needs pyarrow to persist the store;
+without it every run recomputes everything.
+
+    python src/incremental.py data/raw/2007-2024-PIT-Counts-by-State.xlsb
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import posixpath
+import struct
+import sys
+import zipfile
+from collections import namedtuple
+from xml.etree import ElementTree
+
+import numpy as np
+import pandas as pd
+
+from atomic import write_atomic
+from pit_cache import DEFAULT_CACHE_DIR, cache_available, file_checksum, write_parquet_atomic
+from pit_loader import PIT_COLUMNS, apply_schema, clean_yearly_homeless, load_pit_workbook, year_sheet_names, excel_engine
+from population import DEFAULT_POPULATION_PATH, load_population
+from ranking import top_k_indices
+from rates import StateYearMatrix
+from states import to_state_categorical
+
+
+# Bump when the stored tables or metrics change shape so old stores are rebuilt
+STORE_VERSION = 3
+STORE_PREFIX = 'pit_incremental'
+
+TOP_K = 10
+# Metrics ranked per year, with the column holding each one in the metrics table
+RANKED_METRICS = {'Overall Homeless': 'Rank', 'Homeless Per 100K': 'Rate Rank'}
+
+_MAIN_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_PKG_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+# BIFF12 record type of one sheet entry in xl/workbook.bin ([MS-XLSB] 2.4.304 BrtBundleSh)
+_BRT_BUNDLE_SH = 156
+
+YearlyUpdate = namedtuple('YearlyUpdate', ['df_pit', 'metrics', 'top_lists', 'changed_years', 'removed_years'])
+
+
+def store_paths(store_dir=DEFAULT_CACHE_DIR):
+    """Paths of the long table, the metrics table and the manifest."""
+    base = os.path.join(store_dir, f'{STORE_PREFIX}_v{STORE_VERSION}')
+    return f'{base}_yearly.parquet', f'{base}_metrics.parquet', f'{base}.json'
+
+
+def _relationships(zf, member):
+    """Relationship id -> target of a package .rels part."""
+    with zf.open(member) as f:
+        return {el.attrib['Id']: el.attrib['Target'] for el in ElementTree.parse(f).getroot()
+                if el.tag == f'{_PKG_REL_NS}Relationship'}
+
+
+def _biff12_records(data):
+    """(record type, payload) of every record of a BIFF12 part such as xl/workbook.bin."""
+    pos = 0
+    while pos < len(data):
+        # Type and size are little-endian base-128 varints of at most 2 and 4 bytes
+        values = []
+        for max_bytes in (2, 4):
+            value = 0
+            for shift in range(0, 7 * max_bytes, 7):
+                byte = data[pos]
+                pos += 1
+                value |= (byte & 0x7F) << shift
+                if not byte & 0x80:
+                    break
+            values.append(value)
+        record_type, size = values
+        if pos + size > len(data):
+            raise ValueError("Truncated BIFF12 record.")
+        yield record_type, data[pos:pos + size]
+        pos += size
+
+
+def _wide_string(payload, pos):
+    """An XLWideString (uint32 character count, then UTF-16LE) at `pos`; returns (text or None, end)."""
+    (length,) = struct.unpack_from('<I', payload, pos)
+    pos += 4
+    if length == 0xFFFFFFFF:  # XLNullableWideString without a value
+        return None, pos
+    end = pos + 2 * length
+    if end > len(payload):
+        raise ValueError("Truncated BIFF12 string.")
+    return payload[pos:end].decode('utf-16-le'), end
+
+
+def _sheet_parts(zf):
+    """
+    Sheet name -> zip member holding that sheet's cells.
+
+    For .xlsx the sheets are listed in xl/workbook.xml; for .xlsb they are the
+    BrtBundleSh records of xl/workbook.bin (after 8 bytes of hsState and iTabID,
+    the strRelID and strName strings). Either way the relationship id is
+    resolved through the workbook's .rels part.
+    """
+    if 'xl/workbook.xml' in zf.namelist():
+        rels = _relationships(zf, 'xl/_rels/workbook.xml.rels')
+        with zf.open('xl/workbook.xml') as f:
+            sheets = ElementTree.parse(f).getroot().iter(f'{_MAIN_NS}sheet')
+            targets = {el.attrib['name']: rels[el.attrib[f'{_REL_NS}id']] for el in sheets}
+    else:
+        rels = _relationships(zf, 'xl/_rels/workbook.bin.rels')
+        targets = {}
+        for record_type, payload in _biff12_records(zf.read('xl/workbook.bin')):
+            if record_type == _BRT_BUNDLE_SH:
+                rel_id, pos = _wide_string(payload, 8)
+                name, _ = _wide_string(payload, pos)
+                targets[name] = rels[rel_id]
+    return {name: target.lstrip('/') if target.startswith('/') else posixpath.join('xl', target)
+            for name, target in targets.items()}
+
+
+def sheet_fingerprints(path):
+    """
+    Year sheet name -> SHA-256 of its raw part plus the shared-string table.
+
+    Text cells point into the workbook-wide shared-string table, so its digest is
+    part of every fingerprint. Returns an empty dict for workbooks that are not a
+    zip package (e.g. legacy .xls) or whose sheet list cannot be read; every
+    sheet is then treated as changed and reloaded.
+    """
+    try:
+        zf = zipfile.ZipFile(path)
+    except zipfile.BadZipFile:
+        return {}
+    with zf:
+        try:
+            parts = _sheet_parts(zf)
+        except (KeyError, IndexError, ValueError, struct.error, ElementTree.ParseError):
+            return {}
+        shared = hashlib.sha256()
+        for member in ('xl/sharedStrings.bin', 'xl/sharedStrings.xml'):
+            if member in zf.namelist():
+                shared.update(zf.read(member))
+        fingerprints = {}
+        for name in year_sheet_names(parts):
+            digest = shared.copy()
+            digest.update(zf.read(parts[name]))
+            fingerprints[str(name).strip()] = digest.hexdigest()
+    return fingerprints
+
+
+def content_hash(df_year):
+    """SHA-256 of the cleaned rows of one year, independent of their storage."""
+    hashes = pd.util.hash_pandas_object(df_year.astype({'State': str}), index=False).to_numpy()
+    return hashlib.sha256(hashes.tobytes()).hexdigest()
+
+
+def _read_manifest(manifest_path, store_paths_exist):
+    if not store_paths_exist or not os.path.exists(manifest_path):
+        return {'sheets': {}, 'population': None, 'top_lists': {}}
+    with open(manifest_path, 'r') as f:
+        return json.load(f)
+
+
+def _write_manifest(manifest, manifest_path):
+    def write(tmp_path):
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+    write_atomic(manifest_path, write)
+
+
+def compute_metrics(df_pit, population, years):
+    """
+    Ranks, per-100K rates, year-over-year changes and top-10 lists for `years`.
+
+    Only the rows of `years` and the year before each of them are scattered into
+    the state x year matrix. Returns the metrics table (one row per state and year
+    in `years`) and {metric: {year: [top states]}}.
+    """
+    years = sorted(int(year) for year in years)
+    if not years:
+        return pd.DataFrame(), {metric: {} for metric in RANKED_METRICS}
+    needed = set(years) | {year - 1 for year in years}
+    df_needed = df_pit[df_pit['Year'].isin(needed)]
+    matrix = StateYearMatrix.from_long(df_needed, population)
+    rates = matrix.rates()
+    values = {'Overall Homeless': matrix.counts, 'Homeless Per 100K': rates}
+
+    metrics = matrix.to_long(**{
+        'Overall Homeless': matrix.counts,
+        'Homeless Per 100K': rates,
+        'Rank': matrix.ranks(matrix.counts),
+        'Rate Rank': matrix.ranks(rates),
+        'YoY Change': matrix.yoy_delta(),
+        'YoY % Change': matrix.yoy_pct(),
+    })
+    metrics = metrics[metrics['Year'].isin(years)].reset_index(drop=True)
+
+    columns = [matrix.year_index(year) for year in years]
+    top_lists = {}
+    for metric in RANKED_METRICS:
+        top = top_k_indices(values[metric][:, columns], TOP_K)
+        column_values = np.take_along_axis(values[metric][:, columns], top, axis=0)
+        top_lists[metric] = {
+            str(year): [matrix.states[row] for row, value in zip(top[:, i], column_values[:, i])
+                        if not np.isnan(value)]
+            for i, year in enumerate(years)
+        }
+    return metrics, top_lists
+
+
+def update_yearly_table(xlsb_path, store_dir=DEFAULT_CACHE_DIR, population_path=DEFAULT_POPULATION_PATH,
+                        refresh=False):
+    """
+    Bring the stored long table and its metrics up to date with `xlsb_path`.
+
+    Only year sheets that are new or whose content changed are parsed into the
+    store, years whose sheet disappeared are dropped, and metrics are recomputed
+    only where their inputs changed (every year when the population file changed
+    or with `refresh=True`). Returns a YearlyUpdate with the full long table, the
+    full metrics table, the top-10 lists and the changed and removed years.
+    """
+    persist = cache_available()
+    yearly_path, metrics_path, manifest_path = store_paths(store_dir)
+    stored = persist and not refresh and os.path.exists(yearly_path) and os.path.exists(metrics_path)
+    manifest = _read_manifest(manifest_path, stored)
+
+    fingerprints = sheet_fingerprints(xlsb_path)
+    with pd.ExcelFile(xlsb_path, engine=excel_engine(xlsb_path)) as xls:
+        sheet_names = {str(name).strip(): name for name in year_sheet_names(xls.sheet_names)}
+    stale = [name for name in sheet_names
+             if name not in fingerprints or manifest['sheets'].get(name, {}).get('fingerprint') != fingerprints[name]]
+
+    df_fresh = apply_schema(pd.DataFrame(columns=PIT_COLUMNS + ['Year']))
+    if stale:
+        df_fresh = clean_yearly_homeless(load_pit_workbook(xlsb_path, [sheet_names[name] for name in stale]))
+
+    changed_years, sheets = [], {}
+    for name in sheet_names:
+        entry = manifest['sheets'].get(name)
+        if name in stale:
+            digest = content_hash(df_fresh[df_fresh['Year'] == int(name)])
+            if entry is None or entry.get('content') != digest:
+                changed_years.append(int(name))
+            entry = {'content': digest}
+        sheets[name] = dict(entry, fingerprint=fingerprints.get(name))
+    removed_years = sorted(int(name) for name in manifest['sheets'] if name not in sheet_names)
+
+    df_pit = pd.read_parquet(yearly_path) if stored else df_fresh.iloc[:0]
+    dropped = set(changed_years) | set(removed_years)
+    df_pit = pd.concat([df_pit[~df_pit['Year'].isin(dropped)],
+                        df_fresh[df_fresh['Year'].isin(changed_years)]], ignore_index=True)
+    df_pit = apply_schema(df_pit)
+    df_pit = df_pit.sort_values(['Year', 'State'], ascending=[False, True], kind='stable').reset_index(drop=True)
+
+    # Ranks and top-10 lists depend on one year, year-over-year changes also on the year before
+    all_years = set(df_pit['Year'].astype(int))
+    population_checksum = file_checksum(population_path)
+    if not stored or manifest.get('population') != population_checksum:
+        affected = all_years
+    else:
+        affected = (set(changed_years) | {year + 1 for year in dropped}) & all_years
+
+    metrics, top_lists = compute_metrics(df_pit, load_population(population_path), affected)
+    if stored:
+        df_old = pd.read_parquet(metrics_path)
+        df_old = df_old[~df_old['Year'].isin(affected | dropped)]
+        metrics = pd.concat([df_old, metrics], ignore_index=True) if len(metrics) else df_old
+        metrics['State'] = to_state_categorical(metrics['State'])
+        for metric, lists in top_lists.items():
+            kept = {year: states for year, states in manifest['top_lists'].get(metric, {}).items()
+                    if int(year) in all_years}
+            top_lists[metric] = dict(kept, **lists)
+    metrics = metrics.sort_values(['Year', 'State'], kind='stable').reset_index(drop=True)
+
+    if persist:
+        write_parquet_atomic(df_pit, yearly_path)
+        write_parquet_atomic(metrics, metrics_path)
+        _write_manifest({'version': STORE_VERSION, 'workbook': os.path.basename(xlsb_path), 'sheets': sheets,
+                         'population': population_checksum, 'top_lists': top_lists}, manifest_path)
+
+    return YearlyUpdate(df_pit, metrics, top_lists, sorted(changed_years), removed_years)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Update the stored PIT long table with new or changed year sheets.")
+    parser.add_argument('workbook', help="Path to the HUD PIT .xlsb workbook")
+    parser.add_argument('--store-dir', default=DEFAULT_CACHE_DIR, help="Directory of the stored tables")
+    parser.add_argument('--population', default=DEFAULT_POPULATION_PATH, help="Population estimates CSV")
+    parser.add_argument('--refresh', action='store_true', help="Rebuild the store from scratch")
+    args = parser.parse_args(argv)
+
+    update = update_yearly_table(args.workbook, args.store_dir, args.population, args.refresh)
+    print(f"Changed years: {', '.join(map(str, update.changed_years)) or 'none'}")
+    if update.removed_years:
+        print(f"Removed years: {', '.join(map(str, update.removed_years))}")
+    print(f"Stored {len(update.df_pit):,} rows for {update.df_pit['Year'].nunique()} years")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
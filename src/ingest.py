@@ -0,0 +1,244 @@
+"""
+Streaming ingestion of PIT inputs that do not fit in memory.
+
+Walks a directory of PIT workbooks and CSV files (for example one per year or per
+CoC), turns each into cleaned chunks through a chain of generators and appends
+every chunk to a single Parquet file as its own row group. Only one chunk is held
+in memory at a time: CSV files are read `chunk_rows` rows at a time and
+workbooks one year sheet at a time. Needs pyarrow.
+
+Rows are identified by State, Year and any extra columns kept (e.g. 'CoC Number'
+for CoC-level extracts); the first occurrence of a key wins. Rows of one file
+that share a key but differ in their counts stop the run, since keeping only the
+first of them would silently drop the others (e.g. every CoC but the first of a
+state when 'CoC Number' is not kept). Each run replaces the store, unless
+`--append` adds the new rows to the rows already stored.
+
+    python src/ingest.py data/raw/coc --extra-columns 'CoC Number' --store data/cache/pit_ingest.parquet
+"""
+
+import argparse
+import itertools
+import os
+import re
+import sys
+
+import pandas as pd
+
+from atomic import write_atomic
+from instrument import stage
+from pit_cache import DEFAULT_CACHE_DIR
+from pit_loader import (PIT_COLUMNS, PIT_SCHEMA, apply_schema, deduplicate_yearly_homeless, excel_engine,
+                        normalize_yearly_homeless, read_year_sheet, year_sheet_names)
+
+
+DEFAULT_STORE_PATH = os.path.join(DEFAULT_CACHE_DIR, 'pit_ingest.parquet')
+DEFAULT_CHUNK_ROWS = 100_000
+
+WORKBOOK_EXTENSIONS = ('.xlsb', '.xlsx', '.xls')
+CSV_EXTENSIONS = ('.csv',)
+_YEAR_IN_NAME = re.compile(r'(?<!\d)(19|20)\d{2}(?!\d)')
+
+
+def iter_input_files(directory):
+    """Every PIT workbook and CSV under `directory`, in sorted path order."""
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(WORKBOOK_EXTENSIONS + CSV_EXTENSIONS) and not name.startswith('~$'):
+                yield os.path.join(root, name)
+
+
+def year_from_name(path):
+    """The year in a file name such as 'pit_2019_coc.csv', or None."""
+    match = _YEAR_IN_NAME.search(os.path.basename(path))
+    return int(match.group(0)) if match else None
+
+
+def iter_raw_chunks(path, columns=PIT_COLUMNS, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Raw long-format chunks of one input file, each with a 'Year' column.
+
+    CSV files without a 'Year' column take the year from their file name.
+    """
+    if path.lower().endswith(CSV_EXTENSIONS):
+        wanted = set(columns) | {'Year'}
+        year = year_from_name(path)
+        reader = pd.read_csv(path, usecols=lambda c: c.strip() in wanted, chunksize=chunk_rows,
+                             dtype={'State': 'object'})
+        for chunk in reader:
+            chunk.columns = [c.strip() for c in chunk.columns]
+            if 'Year' not in chunk.columns:
+                if year is None:
+                    raise ValueError(f"'{path}' has no 'Year' column and no year in its file name.")
+                chunk['Year'] = year
+            yield chunk.reindex(columns=list(columns) + ['Year'])
+        return
+
+    with pd.ExcelFile(path, engine=excel_engine(path)) as xls:
+        for sheet_name in year_sheet_names(xls.sheet_names):
+            df_year = read_year_sheet(xls, sheet_name, list(columns))
+            if df_year is None:
+                continue
+            for start in range(0, len(df_year), chunk_rows):
+                yield df_year.iloc[start:start + chunk_rows]
+
+
+def _normalize_dtypes(chunk):
+    """Give every chunk the same dtypes so all row groups share one Parquet schema."""
+    extra = [col for col in chunk.columns if col not in PIT_SCHEMA]
+    # Extra identifiers such as 'CoC Number'; the PIT columns already follow PIT_SCHEMA
+    return chunk.astype({col: 'string' for col in extra})
+
+
+def default_key(columns=PIT_COLUMNS):
+    """State, Year and every extra column of `columns`, which tell sub-state rows apart."""
+    return ('State', 'Year') + tuple(col for col in columns if col not in PIT_COLUMNS)
+
+
+def _key_clash(path, key, example):
+    shared = ', '.join(f'{col}={value}' for col, value in zip(key, example))
+    return ValueError(f"Rows of '{path}' share {shared} but have different counts; "
+                      f"keep the column that tells them apart (e.g. --extra-columns 'CoC Number').")
+
+
+def _check_key(df, key, path):
+    """Raise ValueError if rows of `df` with a count share `key` but differ elsewhere."""
+    distinct = df[df['Overall Homeless'].notna()].drop_duplicates()
+    clashing = distinct.duplicated(subset=list(key), keep=False)
+    if clashing.any():
+        raise _key_clash(path, key, distinct.loc[clashing, list(key)].iloc[0].tolist())
+
+
+def _hashes(df):
+    return pd.util.hash_pandas_object(df, index=False).to_numpy().tolist()
+
+
+def iter_clean_chunks(paths, columns=PIT_COLUMNS, key=None, chunk_rows=DEFAULT_CHUNK_ROWS, stored=()):
+    """
+    Cleaned chunks of every file in `paths`, deduplicated on `key` across all of them.
+
+    `key` defaults to default_key(columns). Each chunk is cleaned as in
+    pit_loader.clean_yearly_homeless; rows of one file that share a key but not
+    their counts raise ValueError. The hash of every key seen, with the hash of
+    its row and the file it came from, is kept in a dict, so the first
+    occurrence wins as in the in-memory loader and each chunk costs time in
+    proportion to its own rows. Chunks of `stored` (e.g. iter_store of an
+    existing store) are yielded first and their keys win over the files.
+    """
+    key = default_key(columns) if key is None else tuple(key)
+    seen = {}  # key hash -> (row hash, file index) of its first row
+
+    def keep_first(chunk, file_index, path):
+        fresh = []
+        for i, (key_hash, row_hash) in enumerate(zip(_hashes(chunk[list(key)]), _hashes(chunk))):
+            first = seen.get(key_hash)
+            if first is None:
+                seen[key_hash] = (row_hash, file_index)
+            elif first[1] == file_index and first[0] != row_hash:  # Same file, earlier chunk
+                raise _key_clash(path, key, chunk[list(key)].iloc[i].tolist())
+            fresh.append(first is None)
+        return chunk[fresh].reset_index(drop=True)
+
+    for chunk in stored:
+        chunk = _normalize_dtypes(apply_schema(chunk))
+        keep_first(chunk, -1, None)
+        yield chunk
+    for file_index, path in enumerate(paths):
+        for raw in iter_raw_chunks(path, columns, chunk_rows):
+            with stage('clean', len(raw)) as record:
+                normalized = normalize_yearly_homeless(raw)
+                _check_key(normalized, key, path)
+                chunk = _normalize_dtypes(deduplicate_yearly_homeless(normalized, key))
+                record['rows_out'] = len(chunk)
+            chunk = keep_first(chunk, file_index, path)
+            if not chunk.empty:
+                yield chunk
+
+
+def append_chunks(chunks, store_path=DEFAULT_STORE_PATH):
+    """
+    Write `chunks` to one Parquet file, one row group per chunk; returns rows written.
+
+    The file is written under a temporary name and moved into place at the end,
+    so readers never see a partially written store. The file is replaced as a
+    whole; to add to an existing store, pass its row groups first (see
+    ingest_directory with `append=True`).
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    chunks = iter(chunks)
+    first = next(chunks, None)
+    if first is None:
+        return 0
+    rows = 0
+
+    def write(tmp_path):
+        nonlocal rows
+        schema = pa.Table.from_pandas(first, preserve_index=False).schema
+        with pq.ParquetWriter(tmp_path, schema) as writer:
+            for chunk in itertools.chain([first], chunks):
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+                rows += len(chunk)
+
+    write_atomic(store_path, write)
+    return rows
+
+
+def ingest_directory(directory, store_path=DEFAULT_STORE_PATH, columns=PIT_COLUMNS,
+                     key=None, chunk_rows=DEFAULT_CHUNK_ROWS, append=False):
+    """
+    Stream every PIT file under `directory` into the Parquet store; returns rows in the store.
+
+    The store is replaced, unless `append` is set: the rows already stored are
+    then copied over one row group at a time, and new rows whose key is already
+    stored are skipped.
+    """
+    paths = list(iter_input_files(directory))
+    if not paths:
+        raise FileNotFoundError(f"No PIT workbooks or CSV files found under '{directory}'.")
+    stored = ()
+    if append and os.path.exists(store_path):
+        import pyarrow.parquet as pq
+
+        stored_columns = pq.read_schema(store_path).names
+        if stored_columns != list(columns) + ['Year']:
+            raise ValueError(f"Cannot append to '{store_path}': it has the columns {stored_columns}.")
+        stored = iter_store(store_path)
+    return append_chunks(iter_clean_chunks(paths, columns, key, chunk_rows, stored), store_path)
+
+
+def iter_store(store_path=DEFAULT_STORE_PATH, columns=None):
+    """Read the store back one row group at a time as DataFrames."""
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(store_path)
+    for i in range(parquet_file.num_row_groups):
+        yield parquet_file.read_row_group(i, columns=columns).to_pandas()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream a directory of PIT workbooks/CSVs into a Parquet store.")
+    parser.add_argument('directory', help="Directory with PIT .xlsb/.xlsx/.csv files")
+    parser.add_argument('--store', default=DEFAULT_STORE_PATH, help="Output Parquet file")
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS, help="Rows per chunk")
+    parser.add_argument('--key', nargs='+', default=None,
+                        help="Columns identifying a row for deduplication (default: State, Year and the extra columns)")
+    parser.add_argument('--extra-columns', nargs='*', default=[],
+                        help="Columns to keep besides State and the count columns (e.g. 'CoC Number')")
+    parser.add_argument('--append', action='store_true',
+                        help="Add to the rows already in the store instead of replacing it")
+    args = parser.parse_args(argv)
+
+    columns = PIT_COLUMNS + [c for c in args.extra_columns if c not in PIT_COLUMNS]
+    try:
+        rows = ingest_directory(args.directory, args.store, columns, args.key, args.chunk_rows, args.append)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"Wrote {rows:,} rows to {args.store}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""
+Per-stage timing and memory instrumentation.
+
+Wrap a pipeline stage in `with stage('load') as record:` or decorate the
+function that implements it with `@instrumented('load')`. Each finished stage
+produces one record with its wall time, CPU time, rows in and out, the resident
+set size at the end of the stage and the process's peak RSS so far. Records are
+kept in memory for summary_table() and, once configure() is given a path,
+appended to a JSON-lines file. Worker processes forked later inherit the sink
+and append to the same file.
+"""
+
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+_sink_path = None
+_records = []
+_local = threading.local()
+
+
+def configure(path=None, reset=False):
+    """Append records to the JSON-lines file at `path` (None: keep them in memory only)."""
+    global _sink_path
+    _sink_path = path
+    if path:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if reset:
+        _records.clear()
+
+
+def records():
+    """Records of every stage finished in this process, oldest first."""
+    return list(_records)
+
+
+def peak_rss_bytes():
+    """High-water mark of the resident set size of this process, or None if unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024  # Linux reports kilobytes
+
+
+def rss_bytes():
+    """Current resident set size of this process, or None if unknown."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _rows(value):
+    # Row count of a DataFrame/Series/array result, None for anything else
+    shape = getattr(value, 'shape', None)
+    if shape:
+        return int(shape[0])
+    return None
+
+
+def _emit(record):
+    _records.append(record)
+    if _sink_path:
+        with open(_sink_path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+
+@contextmanager
+def stage(name, rows_in=None):
+    """
+    Record the enclosed block as stage `name`.
+
+    Yields the record as a dict; set record['rows_out'] (and 'rows_in', if not
+    passed) inside the block. Nested stages name their enclosing stage in 'parent'.
+    """
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    record = {'stage': name, 'parent': stack[-1] if stack else None, 'pid': os.getpid(),
+              'rows_in': rows_in, 'rows_out': None}
+    stack.append(name)
+    wall, cpu = time.perf_counter(), time.process_time()
+    record['started'] = time.time()
+    try:
+        yield record
+    finally:
+        stack.pop()
+        record['wall_seconds'] = time.perf_counter() - wall
+        record['cpu_seconds'] = time.process_time() - cpu
+        record['rss_bytes'] = rss_bytes()
+        record['peak_rss_bytes'] = peak_rss_bytes()
+        _emit(record)
+
+
+def instrumented(name=None):
+    """
+    Decorator recording every call of the function as a stage (default: its name).
+
+    Rows in are the rows of the first argument, rows out the rows of the result,
+    when they have a shape (DataFrames, Series, arrays).
+    """
+    def decorate(func):
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(stage_name, _rows(args[0]) if args else None) as record:
+                result = func(*args, **kwargs)
+                record['rows_out'] = _rows(result)
+            return result
+        return wrapper
+    return decorate
+
+
+def read_records(path):
+    """Records from a JSON-lines file written by this module."""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def summary_table(stage_records=None):
+    """
+    One row per stage: calls, total wall and CPU seconds, rows and peak RSS (MiB).
+
+    Defaults to the records of this process; pass read_records(path) to summarise
+    a JSON-lines file, including records written by worker processes.
+    """
+    import pandas as pd
+
+    df = pd.DataFrame(records() if stage_records is None else stage_records)
+    if df.empty:
+        return df
+    summary = df.groupby('stage', sort=False).agg(
+        calls=('stage', 'size'),
+        wall_seconds=('wall_seconds', 'sum'),
+        cpu_seconds=('cpu_seconds', 'sum'),
+        rows_in=('rows_in', lambda rows: rows.sum(min_count=1)),
+        rows_out=('rows_out', lambda rows: rows.sum(min_count=1)),
+        peak_rss_mib=('peak_rss_bytes', 'max'),
+    )
+    summary['peak_rss_mib'] = (summary['peak_rss_mib'] / 2 ** 20).round(1)
+    return summary.round({'wall_seconds': 3, 'cpu_seconds': 3})
@@ -0,0 +1,32 @@
+"""
+Process-pool helper shared by the workbook loader and the batch renderers.
+"""
+
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+
+def default_workers(n_tasks):
+    """Number of worker processes to use for `n_tasks` independent tasks."""
+    return max(1, min(os.cpu_count() or 1, n_tasks))
+
+
+def process_pool(max_workers):
+    """
+    Return a fork-based ProcessPoolExecutor, or None where forking is not safe.
+
+    analysis.py is an exported notebook without a ``__main__`` guard, so start
+    methods that re-import the main module (spawn, forkserver) would rerun the
+    whole script inside every worker. Fork is only used on Linux, where it is the
+    long-standing default (CPython documents it as unsafe on macOS), and only
+    while this process runs a single thread: a forked child gets a copy of locks
+    that other threads (e.g. those of a Jupyter kernel) may hold. Callers fall
+    back to serial work on None.
+    """
+    if max_workers <= 1 or not sys.platform.startswith('linux') or threading.active_count() > 1:
+        return None
+    return ProcessPoolExecutor(max_workers=max_workers,
+                               mp_context=multiprocessing.get_context('fork'))
@@ -0,0 +1,231 @@
+"""
+Data pipeline shared by analysis.py and the batch renderer.
+
+These functions turn the cleaned long-format PIT table into the tables the
+charts are drawn from: the latest-year state table with population and per-100K
+rate (df_final), the top/bottom 10 slices, the yearly trend for the top states
+and the sheltered vs. unsheltered breakdown (shelter.ShelterBreakdown). Years
+flagged by anomalies.py (abrupt breaks, missing or partial counts) are listed in
+df_anomalies and marked in the 'Anomaly' column of the yearly tables.
+
+Each table is one entry of TABLES with the tables it is built from, so callers
+can build only what they need (compute_tables) and schedule independent tables
+side by side (stages.py). Nothing here imports a plotting library: build_tables
+runs the whole data side (load, clean, merge, rate, rank) for callers that only
+need the numbers.
+"""
+
+from collections import namedtuple
+
+from anomalies import detect_state_anomalies, mark_anomalies
+from geometry import load_geometry
+from instrument import instrumented, stage
+from pit_cache import DEFAULT_CACHE_DIR, load_yearly_table
+from population import load_population, population_lookup, rate_per_100k
+from ranking import Ranking
+from rates import StateYearMatrix
+from regions import rollup
+from shelter import ShelterBreakdown
+from states import states_only
+
+
+COUNT_COLUMNS = ['Overall Homeless', 'Sheltered Total Homeless', 'Unsheltered Homeless']
+
+
+def population_column(year):
+    return f'Population {year}'
+
+
+def latest_year(df_pit):
+    """The most recent year in the long table."""
+    return int(df_pit['Year'].max())
+
+
+def split_latest_year(df_pit):
+    """Return the most recent year in the long table and that year's rows without 'Year'."""
+    year = latest_year(df_pit)
+    return year, df_pit[df_pit['Year'] == year].drop(columns='Year').reset_index(drop=True)
+
+
+def select_states_with_counts(df_year):
+    """States and DC with an 'Overall Homeless' count, keeping State and the count columns."""
+    df_states = states_only(df_year[df_year['Overall Homeless'].notna()])
+    return df_states[['State'] + COUNT_COLUMNS].copy()
+
+
+@instrumented('merge')
+def attach_population(df_homeless, population, year):
+    """Add an integer 'Population <year>' column, dropping states without an estimate."""
+    df_final = df_homeless.reset_index(drop=True)
+    column = population_column(year)
+    df_final[column] = population_lookup(population, df_final['State'], year)
+    df_final = df_final.dropna(subset=[column])
+    df_final[column] = df_final[column].astype(int)
+    return df_final
+
+
+@instrumented('rate')
+def add_rate_per_100k(df_final, year):
+    """Add 'Homeless Per 100K' from 'Overall Homeless' and 'Population <year>'."""
+    df_final['Homeless Per 100K'] = rate_per_100k(df_final['Overall Homeless'],
+                                                  df_final[population_column(year)])
+    return df_final
+
+
+def yearly_trend(df_yearly, states):
+    """Every year's rows for `states`, sorted by Year then State for plotting."""
+    df_trend = df_yearly[df_yearly['State'].isin(states)]
+    return df_trend.sort_values(by=['Year', 'State'])
+
+
+def state_year_frame(df_pit, population):
+    """
+    Every state and DC for every year in one long table, with the count and per-100K rate.
+
+    Years or states without a count are NaN rows rather than missing rows, so each
+    year has the same states in the same order.
+    """
+    matrix = StateYearMatrix.from_long(df_pit, population)
+    return matrix.to_long(**{'Overall Homeless': matrix.counts, 'Homeless Per 100K': matrix.rates()})
+
+
+def latest_states(df_pit):
+    """The latest year's rows of the states and DC with a count (the 'df_2024' table)."""
+    return select_states_with_counts(split_latest_year(df_pit)[1])
+
+
+def final_table(df_2024, population, year):
+    """The latest-year state table with population and per-100K rate (the 'df_final' table)."""
+    return add_rate_per_100k(attach_population(df_2024, population, year), year)
+
+
+def top_homeless(df_final, k):
+    return Ranking(df_final).top('Overall Homeless', k)
+
+
+def top_population(df_final, year, k):
+    return Ranking(df_final).top(population_column(year), k)
+
+
+def top_rate(df_final, k):
+    return Ranking(df_final).top('Homeless Per 100K', k)
+
+
+def bottom_rate(df_final, k):
+    return Ranking(df_final).bottom('Homeless Per 100K', k)
+
+
+def homeless_ratio(df_final):
+    return df_final.sort_values('Homeless Per 100K', ascending=False)
+
+
+def top_states_by_count(df_pit, year, k):
+    """The `k` states with the largest 'Overall Homeless' count in `year`, largest first."""
+    return Ranking(df_pit).top('Overall Homeless', k, year=year)['State'].tolist()
+
+
+def marked_yearly_trend(df_pit, top_states, df_anomalies):
+    return mark_anomalies(yearly_trend(df_pit, top_states), df_anomalies)
+
+
+def marked_state_year_frame(df_pit, population, df_anomalies):
+    return mark_anomalies(state_year_frame(df_pit, population), df_anomalies)
+
+
+def geojson_from_path(geojson_path, cache_dir=DEFAULT_CACHE_DIR):
+    return load_geometry(geojson_path, cache_dir=cache_dir).to_geojson()
+
+
+TableSpec = namedtuple('TableSpec', ['builder', 'inputs'])
+
+# Every table of the pipeline and the tables (or parameters) it is built from.
+# 'workbook', 'population_path', 'geojson_path', 'cache_dir' and 'k' are parameters supplied by the caller.
+TABLES = {
+    'df_pit': TableSpec(load_yearly_table, ('workbook', 'cache_dir')),
+    'population': TableSpec(load_population, ('population_path',)),
+    'geojson': TableSpec(geojson_from_path, ('geojson_path', 'cache_dir')),
+    'year': TableSpec(latest_year, ('df_pit',)),
+    'df_2024': TableSpec(latest_states, ('df_pit',)),
+    'df_final': TableSpec(final_table, ('df_2024', 'population', 'year')),
+    'df_top_homeless': TableSpec(top_homeless, ('df_final', 'k')),
+    'df_top_population': TableSpec(top_population, ('df_final', 'year', 'k')),
+    'df_top_rate': TableSpec(top_rate, ('df_final', 'k')),
+    'df_bottom_rate': TableSpec(bottom_rate, ('df_final', 'k')),
+    'df_homeless_ratio': TableSpec(homeless_ratio, ('df_final',)),
+    'top_states': TableSpec(top_states_by_count, ('df_pit', 'year', 'k')),
+    'df_anomalies': TableSpec(detect_state_anomalies, ('df_pit',)),
+    'df_top_10_yearly_trend': TableSpec(marked_yearly_trend, ('df_pit', 'top_states', 'df_anomalies')),
+    'shelter': TableSpec(ShelterBreakdown.from_long, ('df_pit',)),
+    'df_state_year': TableSpec(marked_state_year_frame, ('df_pit', 'population', 'df_anomalies')),
+    'df_regions': TableSpec(rollup, ('df_pit', 'population')),
+}
+
+
+def table_order(targets, known=(), tables=TABLES):
+    """
+    The tables needed for `targets`, each after the tables it is built from.
+
+    Tables in `known` (already computed, or parameters) are not included and
+    their inputs are not followed.
+    """
+    order, visiting = [], set()
+
+    def visit(name):
+        if name in known or name in order:
+            return
+        if name not in tables:
+            raise KeyError(f"Unknown table {name!r}; no value was given for it either.")
+        if name in visiting:
+            raise ValueError(f"Table {name!r} depends on itself.")
+        visiting.add(name)
+        for key in tables[name].inputs:
+            visit(key)
+        order.append(name)
+
+    for name in targets:
+        visit(name)
+    return order
+
+
+def compute_tables(targets, values, tables=TABLES):
+    """Build `targets` and every table they need into `values` (a dict of known tables and parameters)."""
+    for name in table_order(targets, values, tables):
+        spec = tables[name]
+        with stage(name):
+            values[name] = spec.builder(*[values[key] for key in spec.inputs])
+    return values
+
+
+# The tables figures.FIGURES are drawn from
+FIGURE_TABLES = ['year', 'df_final', 'df_top_homeless', 'df_top_population', 'df_top_rate', 'df_bottom_rate',
+                 'df_top_10_yearly_trend', 'top_states', 'shelter', 'df_2024', 'df_homeless_ratio', 'df_state_year',
+                 'df_anomalies']
+
+
+def figure_inputs(df_pit, population, geojson=None, k=10):
+    """
+    Everything the figures in figures.FIGURES are drawn from, keyed by input name.
+
+    `df_pit` is the cleaned long table from pit_cache.load_yearly_table and
+    `population` the Series from population.load_population.
+    """
+    values = compute_tables(FIGURE_TABLES, {'df_pit': df_pit, 'population': population, 'k': k})
+    tables = {name: values[name] for name in FIGURE_TABLES}
+    tables['geojson'] = geojson
+    return tables
+
+
+def build_tables(xlsb_path, k=10, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Run the data pipeline for `xlsb_path` and return every table keyed by name.
+
+    The result holds the cleaned long table ('df_pit'), the population Series
+    ('population'), the entries of figure_inputs (without a GeoJSON) and the
+    regional roll-ups ('df_regions').
+    """
+    df_pit = load_yearly_table(xlsb_path, cache_dir)
+    population = load_population()
+    tables = figure_inputs(df_pit, population, k=k)
+    tables['df_pit'] = df_pit
+    tables['population'] = population
+    return compute_tables(['df_regions'], tables)
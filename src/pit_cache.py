@@ -0,0 +1,101 @@
+"""
+On-disk columnar cache of the cleaned year-by-state PIT table.
+
+Parsing the .xlsb workbook and cleaning every year sheet is the slowest part of
+a run, yet the HUD file rarely changes between runs. The cleaned long-format
+table is stored as Parquet under a name derived from the workbook's SHA-256
+checksum, so an unchanged workbook is reloaded straight from the cache and a
+changed one misses the cache and is rebuilt. Tables of several workbooks (e.g.
+two HUD releases, or a test fixture next to the real file) share the cache
+directory: a hit refreshes the entry's modification time, and only the
+least recently used entries beyond DEFAULT_MAX_ENTRIES, plus entries written
+by older CACHE_VERSIONs, are removed. Caching needs pyarrow; without it the
+table is simply rebuilt every time.
+"""
+
+import glob
+import hashlib
+import importlib.util
+import os
+
+import pandas as pd
+
+from atomic import write_atomic
+from instrument import instrumented
+from pit_loader import clean_yearly_homeless, load_pit_workbook
+
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'cache')
+
+# Bump when the cleaning rules change so tables cleaned the old way are not reused
+CACHE_VERSION = 3
+CACHE_PREFIX = 'pit_yearly_'
+
+# Cleaned tables kept for different workbooks; the least recently used go first
+DEFAULT_MAX_ENTRIES = 4
+
+
+def file_checksum(path, chunk_size=1 << 20):
+    """SHA-256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_available():
+    """Parquet caching requires pyarrow."""
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def cache_path_for(checksum, cache_dir=DEFAULT_CACHE_DIR):
+    return os.path.join(cache_dir, f'{CACHE_PREFIX}v{CACHE_VERSION}_{checksum[:16]}.parquet')
+
+
+def write_parquet_atomic(df, path):
+    """Write `df` to `path` via a temporary file so readers never see a partial file."""
+    write_atomic(path, lambda tmp_path: df.to_parquet(tmp_path, index=False))
+
+
+def _remove_stale(cache_dir, max_entries=DEFAULT_MAX_ENTRIES):
+    """Remove entries of older cache versions and the least recently used beyond `max_entries`."""
+    current = f'{CACHE_PREFIX}v{CACHE_VERSION}_'
+    entries, stale = [], []
+    for path in glob.glob(os.path.join(cache_dir, f'{CACHE_PREFIX}*.parquet')):
+        if '.tmp' in os.path.basename(path):  # Being written by write_parquet_atomic
+            continue
+        if os.path.basename(path).startswith(current):
+            entries.append((os.path.getmtime(path), path))
+        else:
+            stale.append(path)
+    stale += [path for _, path in sorted(entries, reverse=True)[max_entries:]]
+    for path in stale:
+        try:
+            os.remove(path)
+        except FileNotFoundError:  # Removed by a concurrent run
+            pass
+
+
+@instrumented('load')
+def load_yearly_table(xlsb_path, cache_dir=DEFAULT_CACHE_DIR, refresh=False, max_entries=DEFAULT_MAX_ENTRIES):
+    """
+    Return the cleaned long-format table for `xlsb_path`, using the cache when possible.
+
+    The cache entry is keyed by the workbook checksum; a miss (or `refresh=True`)
+    loads and cleans the workbook, stores the result and trims `cache_dir` to
+    the `max_entries` most recently used tables.
+    """
+    use_cache = cache_available()
+    if use_cache:
+        cache_path = cache_path_for(file_checksum(xlsb_path), cache_dir)
+        if not refresh and os.path.exists(cache_path):
+            os.utime(cache_path)  # Mark as recently used
+            return pd.read_parquet(cache_path)
+
+    df_clean = clean_yearly_homeless(load_pit_workbook(xlsb_path))
+
+    if use_cache:
+        write_parquet_atomic(df_clean, cache_path)
+        _remove_stale(cache_dir, max_entries)
+    return df_clean
@@ -0,0 +1,182 @@
+"""
+Loading helpers for the HUD PIT "Counts by State" workbook.
+
+The workbook keeps one sheet per year (2024 down to 2007). Reading it with one
+``pd.read_excel`` call per sheet re-opens and re-parses the binary file every
+time, so these helpers open it once and pull only the columns the analysis uses
+from every year sheet, returning a single long-format frame with a 'Year' column.
+"""
+
+import pandas as pd
+
+from instrument import instrumented
+from parallel import default_workers, process_pool
+from states import STATE_DTYPE, to_state_categorical
+
+
+PIT_COLUMNS = ['State', 'Overall Homeless', 'Sheltered Total Homeless', 'Unsheltered Homeless']
+REQUIRED_COLUMNS = ['State', 'Overall Homeless']
+
+# Dtypes of the cleaned long table, set once by clean_yearly_homeless and kept
+# downstream: counts are whole people and fit in a nullable 32-bit integer
+COUNT_DTYPE = 'Int32'
+YEAR_DTYPE = 'int16'
+PIT_SCHEMA = {'State': STATE_DTYPE, 'Year': YEAR_DTYPE, **{col: COUNT_DTYPE for col in PIT_COLUMNS[1:]}}
+# What the same table used to hold: object strings, int64 years and float64 counts
+LEGACY_SCHEMA = {'State': object, 'Year': 'int64', **{col: 'float64' for col in PIT_COLUMNS[1:]}}
+
+# Below this many sheets, starting worker processes costs more than it saves
+PARALLEL_SHEET_THRESHOLD = 6
+
+
+def year_sheet_names(sheet_names):
+    """Keep only the sheets named after a year (e.g. '2024'), in workbook order."""
+    return [name for name in sheet_names if str(name).strip().isdigit()]
+
+
+def excel_engine(path):
+    return 'pyxlsb' if str(path).lower().endswith('.xlsb') else None
+
+
+def read_year_sheet(xls, sheet_name, columns=PIT_COLUMNS):
+    """Parse one year sheet from an open ExcelFile, or return None if it is unusable."""
+    wanted = set(columns)
+    try:
+        df_year = xls.parse(sheet_name, usecols=lambda c: str(c).strip() in wanted)
+    except Exception as e:
+        print(f"Error loading sheet '{sheet_name}': {e}")
+        return None
+
+    df_year.columns = [str(c).strip() for c in df_year.columns]
+    missing = [c for c in REQUIRED_COLUMNS if c not in df_year.columns]
+    if missing:
+        print(f"Skipping sheet '{sheet_name}': Missing {missing} column(s).")
+        return None
+
+    # Older sheets may lack a breakdown column; keep the frame shape identical
+    df_year = df_year.reindex(columns=columns)
+    df_year['Year'] = int(str(sheet_name).strip())
+    return df_year
+
+
+def _read_sheet_batch(path, sheet_names, columns):
+    # Runs in a worker process: the workbook is opened once per batch of sheets
+    with pd.ExcelFile(path, engine=excel_engine(path)) as xls:
+        return [read_year_sheet(xls, name, columns) for name in sheet_names]
+
+
+@instrumented('read_workbook')
+def load_pit_workbook(path, sheet_names=None, columns=PIT_COLUMNS, max_workers=None):
+    """
+    Load every year sheet of the PIT workbook into one long-format DataFrame.
+
+    Only `columns` are read from each sheet and a 'Year' column is added from the
+    sheet name. When `sheet_names` is None, all sheets named after a year are read.
+    Workbooks with at least PARALLEL_SHEET_THRESHOLD sheets are split across a
+    process pool (`max_workers` processes, default one per CPU); each worker
+    opens the file once for its whole batch of sheets.
+
+    Raises FileNotFoundError if the workbook is missing and ValueError if no
+    sheet could be loaded.
+    """
+    columns = list(columns)
+    with pd.ExcelFile(path, engine=excel_engine(path)) as xls:
+        if sheet_names is None:
+            sheet_names = year_sheet_names(xls.sheet_names)
+        sheet_names = [str(name) for name in sheet_names]
+
+        if max_workers is None:
+            max_workers = default_workers(len(sheet_names))
+        pool = None
+        if len(sheet_names) >= PARALLEL_SHEET_THRESHOLD:
+            pool = process_pool(max_workers)
+
+        if pool is None:
+            frames = [read_year_sheet(xls, name, columns) for name in sheet_names]
+
+    if pool is not None:
+        # Round-robin batches keep the large recent sheets spread across workers
+        batches = [sheet_names[i::max_workers] for i in range(max_workers)]
+        with pool:
+            results = pool.map(_read_sheet_batch,
+                               [path] * len(batches), batches, [columns] * len(batches))
+            by_sheet = {}
+            for batch, frames_in_batch in zip(batches, results):
+                by_sheet.update(zip(batch, frames_in_batch))
+        frames = [by_sheet[name] for name in sheet_names]
+
+    frames = [frame for frame in frames if frame is not None]
+    if not frames:
+        raise ValueError(f"No year sheets could be loaded from '{path}'. "
+                         "Please check sheet names, column names, and file path.")
+    return pd.concat(frames, ignore_index=True)
+
+
+def apply_schema(df, schema=PIT_SCHEMA):
+    """Cast the columns of `df` that appear in `schema` to their schema dtype."""
+    return df.astype({col: dtype for col, dtype in schema.items() if col in df.columns})
+
+
+def memory_report(df, schema=LEGACY_SCHEMA):
+    """
+    Deep memory use of every column of `df` next to the same data laid out as `schema`.
+
+    By default compares the compact schema with the object/int64/float64 layout the
+    table had before it, so the report shows what the schema saves.
+    """
+    legacy = df.astype({col: dtype for col, dtype in schema.items() if col in df.columns})
+    report = pd.DataFrame({
+        'dtype': df.dtypes.astype(str),
+        'bytes': df.memory_usage(deep=True, index=False),
+        'legacy dtype': legacy.dtypes.astype(str),
+        'legacy bytes': legacy.memory_usage(deep=True, index=False),
+    })
+    report.loc['total'] = ['', report['bytes'].sum(), '', report['legacy bytes'].sum()]
+    report['saved %'] = ((1 - report['bytes'] / report['legacy bytes']) * 100).round(1)
+    return report
+
+
+def normalize_yearly_homeless(df_long):
+    """
+    First half of clean_yearly_homeless: state codes and numeric counts.
+
+    'State' is cast to the shared state-code dimension (states.STATE_DTYPE), which
+    turns the 'Total' row, footnotes and blanks into NaN in one lookup; those rows
+    are dropped. Counts are coerced to numeric.
+    """
+    df_clean = df_long[df_long['State'].notna()].copy()
+    df_clean['State'] = to_state_categorical(df_clean['State'])
+    df_clean = df_clean[df_clean['State'].notna()]
+    for col in PIT_COLUMNS[1:]:
+        if col in df_clean.columns:
+            df_clean[col] = pd.to_numeric(df_clean[col], errors='coerce').round()
+    return df_clean
+
+
+def deduplicate_yearly_homeless(df_clean, key=('State', 'Year')):
+    """
+    Second half of clean_yearly_homeless: one row per `key`, with a count, in PIT_SCHEMA.
+
+    Duplicate `key` rows are dropped (keeping the first occurrence) before rows
+    without an 'Overall Homeless' count are removed.
+    """
+    df_clean = df_clean.drop_duplicates(subset=list(key), keep='first')
+    df_clean = df_clean[df_clean['Overall Homeless'].notna()]
+    return apply_schema(df_clean.reset_index(drop=True))
+
+
+@instrumented('clean')
+def clean_yearly_homeless(df_long, key=('State', 'Year')):
+    """
+    Clean the long-format table returned by load_pit_workbook.
+
+    'State' is cast to the shared state-code dimension (states.STATE_DTYPE), which
+    turns the 'Total' row, footnotes and blanks into NaN in one lookup. Counts are
+    coerced to numeric, duplicate `key` rows are dropped (keeping the first
+    occurrence), and rows without a valid code or an 'Overall Homeless' count are
+    removed. Sub-state extracts (e.g. one row per CoC) pass their own `key`.
+
+    The result follows PIT_SCHEMA: categorical State, int16 Year and nullable
+    Int32 counts. Downstream code works on these dtypes and does not convert them.
+    """
+    return deduplicate_yearly_homeless(normalize_yearly_homeless(df_long), key)
@@ -0,0 +1,94 @@
+"""
+Population reference table keyed by (State, Year).
+
+Census Bureau estimates live in data/reference/census_population_estimates.csv,
+one row per State, Year and Vintage (the Census estimates release a figure comes
+from). Loading keeps the newest vintage for every (State, Year) and lays the
+figures out as a jurisdiction x year matrix whose rows follow states.STATE_DTYPE,
+so looking up the population for any column of states and years is integer
+indexing into that matrix - no merge and no dropna.
+
+The file currently holds the 2024 estimates only, so every other year has no
+population and its per-100K rates are NaN. Adding rows for earlier years to the
+CSV fills in historical rates without any code change. carry=True uses the
+nearest year with an estimate instead, which is only a rough stand-in: a 2024
+population is not the population of 2010.
+"""
+
+import functools
+import os
+
+import numpy as np
+import pandas as pd
+
+from states import JURISDICTION_CODES, to_state_categorical
+
+
+DEFAULT_POPULATION_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                       '..', 'data', 'reference', 'census_population_estimates.csv')
+
+
+@functools.lru_cache(maxsize=8)
+def load_population(path=DEFAULT_POPULATION_PATH, vintage=None):
+    """
+    Population Series indexed by (State, Year), State on the shared dimension.
+
+    When a (State, Year) appears in several vintages the newest one wins, unless
+    `vintage` pins a specific release. The result is cached per path and vintage;
+    treat it as read-only.
+    """
+    df_pop = pd.read_csv(path, dtype={'State': str, 'Year': 'int16', 'Vintage': 'int16',
+                                      'Population': 'int64'})
+    if vintage is not None:
+        df_pop = df_pop[df_pop['Vintage'] == vintage]
+    df_pop = df_pop.sort_values('Vintage').drop_duplicates(subset=['State', 'Year'], keep='last')
+    df_pop['State'] = to_state_categorical(df_pop['State'])
+    df_pop = df_pop[df_pop['State'].notna()]
+    return df_pop.set_index(['State', 'Year'])['Population'].sort_index()
+
+
+def population_matrix(pop, years, carry=False):
+    """
+    Jurisdiction x year DataFrame of population for `years`.
+
+    Rows are every code in states.JURISDICTION_CODES, in dtype order. Years
+    missing from the reference table are NaN unless `carry` is set, in which case
+    they take the closest earlier estimate, or the closest later one when there is
+    no earlier estimate.
+    """
+    years = [int(year) for year in years]
+    wide = pop.unstack('Year')
+    known_years = sorted(set(wide.columns) | set(years))
+    wide = wide.reindex(index=pd.CategoricalIndex(JURISDICTION_CODES, name='State'),
+                        columns=known_years).astype('float64')
+    if carry:
+        wide = wide.ffill(axis=1).bfill(axis=1)
+    return wide[years]
+
+
+def population_lookup(pop, states, years, carry=False):
+    """
+    Population for each (state, year) pair as a float64 array (NaN when unknown).
+
+    `years` may be a single year or one year per state. The lookup uses the
+    category codes of `states` as row positions in population_matrix.
+    """
+    states = to_state_categorical(states)
+    years = np.broadcast_to(np.asarray(years, dtype='int64'), (len(states),))
+    if len(states) == 0:
+        return np.empty(0, dtype='float64')
+
+    first_year, last_year = int(years.min()), int(years.max())
+    matrix = population_matrix(pop, range(first_year, last_year + 1), carry=carry).to_numpy()
+    rows = states.cat.codes.to_numpy()
+    values = matrix[rows, years - first_year]
+    values[rows == -1] = np.nan
+    return values
+
+
+def rate_per_100k(counts, population):
+    """Homeless per 100,000 residents for aligned arrays of counts and population."""
+    # Nullable integer counts (pit_loader.COUNT_DTYPE) turn their missing values into NaN
+    if hasattr(counts, 'to_numpy'):
+        counts = counts.to_numpy(dtype='float64', na_value=np.nan)
+    return np.asarray(counts, dtype='float64') / np.asarray(population, dtype='float64') * 100_000
@@ -0,0 +1,214 @@
+"""
+Local HTTP/JSON service for one-off state and year numbers.
+
+The cleaned long table and the population estimates are loaded once and
+scattered into (state, year) arrays, one per metric (rates.StateYearMatrix,
+shelter.ShelterBreakdown). A lookup is then a dict lookup for the state row and
+an offset for the year column. The order of every metric's states in every year
+is sorted once up front (ranking.top_k_indices), so a top-k query is a slice of
+a precomputed column. Encoded responses are kept in a bounded LRU cache keyed
+by the request path and query string.
+
+    python src/query_service.py --workbook data/raw/2007-2024-PIT-Counts-by-State.xlsb --port 8000
+
+    GET /metrics                                        metrics, states and years
+    GET /value?state=WA&year=2019&metric=per_100k       one number
+    GET /ranking?metric=unsheltered&year=2022&k=10      top k (order=bottom for the lowest)
+    GET /series?state=CA&metric=overall&start=2015      one state over the years
+
+The server binds to 127.0.0.1 by default.
+"""
+
+import argparse
+import functools
+import json
+import math
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from pit_cache import load_yearly_table
+from population import load_population
+from ranking import top_k_indices
+from rates import StateYearMatrix
+from shelter import ShelterBreakdown
+from states import STATE_CODES
+
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8000
+DEFAULT_CACHE_SIZE = 4096
+
+
+class QueryError(ValueError):
+    """A request with a missing or invalid parameter (HTTP 400)."""
+
+
+class QueryIndex:
+    """
+    Every metric as a (state, year) array, with the per-year order of the states.
+
+    Metrics: overall, sheltered, unsheltered, population, per_100k,
+    sheltered_share and unsheltered_share (%), yoy_change (%).
+    """
+
+    def __init__(self, df_pit, population, states=STATE_CODES):
+        matrix = StateYearMatrix.from_long(df_pit, population, states=states)
+        shelter = ShelterBreakdown.from_long(df_pit, states=states)
+        self.states = matrix.states
+        self.years = matrix.years
+        self.metrics = {
+            'overall': matrix.counts,
+            'sheltered': shelter.sheltered,
+            'unsheltered': shelter.unsheltered,
+            'population': matrix.population,
+            'per_100k': matrix.rates(),
+            'sheltered_share': shelter.sheltered_share() * 100,
+            'unsheltered_share': shelter.unsheltered_share() * 100,
+            'yoy_change': matrix.yoy_pct(),
+        }
+        self.row_of_state = {state: i for i, state in enumerate(self.states)}
+        # Rows of every metric's states in every year, highest first (NaN last)
+        self.order = {metric: top_k_indices(values, len(self.states)) for metric, values in self.metrics.items()}
+        self.available = {metric: (~np.isnan(values)).sum(axis=0) for metric, values in self.metrics.items()}
+
+    def _metric(self, metric):
+        if metric not in self.metrics:
+            raise QueryError(f"Unknown metric {metric!r}; use one of {', '.join(self.metrics)}.")
+        return self.metrics[metric]
+
+    def _row(self, state):
+        state = str(state).upper()
+        if state not in self.row_of_state:
+            raise QueryError(f"Unknown state {state!r}.")
+        return self.row_of_state[state]
+
+    def _column(self, year):
+        column = int(year) - int(self.years[0])
+        if not 0 <= column < len(self.years):
+            raise QueryError(f"No data for {year}; years are {self.years[0]}-{self.years[-1]}.")
+        return column
+
+    def value(self, state, year, metric='overall'):
+        return _number(self._metric(metric)[self._row(state), self._column(year)])
+
+    def ranking(self, metric='overall', year=None, k=10, bottom=False):
+        """[(rank, state, value)] of the `k` highest (lowest if `bottom`) states with a value."""
+        values = self._metric(metric)
+        column = self._column(self.years[-1] if year is None else year)
+        n = int(self.available[metric][column])
+        rows = self.order[metric][:n, column]
+        rows = rows[::-1][:k] if bottom else rows[:k]
+        ranks = n - np.arange(len(rows)) if bottom else np.arange(1, len(rows) + 1)
+        return [(int(rank), self.states[row], _number(values[row, column])) for rank, row in zip(ranks, rows)]
+
+    def series(self, state, metric='overall', start=None, end=None):
+        """([year], [value]) of one state from `start` to `end` (inclusive)."""
+        values = self._metric(metric)[self._row(state)]
+        first = 0 if start is None else self._column(start)
+        last = len(self.years) - 1 if end is None else self._column(end)
+        return ([int(year) for year in self.years[first:last + 1]],
+                [_number(value) for value in values[first:last + 1]])
+
+
+def _number(value):
+    value = float(value)
+    return None if math.isnan(value) else value
+
+
+def _param(query, name, default=None, convert=str):
+    values = query.get(name)
+    if not values:
+        if default is None:
+            raise QueryError(f"Missing parameter {name!r}.")
+        return default
+    try:
+        return convert(values[0])
+    except ValueError:
+        raise QueryError(f"Invalid {name}: {values[0]!r}.") from None
+
+
+def respond(index, path, query_string):
+    """(HTTP status, JSON body bytes) for a GET of `path` with `query_string`."""
+    query = parse_qs(query_string)
+    try:
+        if path == '/metrics':
+            body = {'metrics': list(index.metrics), 'states': index.states,
+                    'years': [int(year) for year in index.years]}
+        elif path == '/value':
+            state, year = _param(query, 'state'), _param(query, 'year', convert=int)
+            metric = _param(query, 'metric', 'overall')
+            body = {'state': state.upper(), 'year': year, 'metric': metric,
+                    'value': index.value(state, year, metric)}
+        elif path == '/ranking':
+            metric = _param(query, 'metric', 'overall')
+            year = _param(query, 'year', int(index.years[-1]), int)
+            k = _param(query, 'k', 10, int)
+            order = _param(query, 'order', 'top')
+            if k < 1:
+                raise QueryError(f"Invalid k: {k}; k must be at least 1.")
+            if order not in ('top', 'bottom'):
+                raise QueryError(f"Invalid order: {order!r}; use top or bottom.")
+            rows = index.ranking(metric, year, k, bottom=order == 'bottom')
+            body = {'metric': metric, 'year': year, 'order': order,
+                    'ranking': [{'rank': rank, 'state': state, 'value': value} for rank, state, value in rows]}
+        elif path == '/series':
+            state, metric = _param(query, 'state'), _param(query, 'metric', 'overall')
+            years, values = index.series(state, metric, _param(query, 'start', int(index.years[0]), int),
+                                         _param(query, 'end', int(index.years[-1]), int))
+            body = {'state': state.upper(), 'metric': metric, 'years': years, 'values': values}
+        else:
+            return 404, json.dumps({'error': f"Unknown path {path!r}."}).encode()
+    except QueryError as e:
+        return 400, json.dumps({'error': str(e)}).encode()
+    return 200, json.dumps(body).encode()
+
+
+def make_server(index, host=DEFAULT_HOST, port=DEFAULT_PORT, cache_size=DEFAULT_CACHE_SIZE):
+    """A ThreadingHTTPServer answering queries on `index` (port 0 picks a free port)."""
+    cached_respond = functools.lru_cache(maxsize=cache_size)(functools.partial(respond, index))
+
+    class QueryHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlsplit(self.path)
+            status, body = cached_respond(url.path.rstrip('/') or '/', url.query)
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # One line per request on stderr is noise for a query service
+
+    server = ThreadingHTTPServer((host, port), QueryHandler)
+    server.respond = cached_respond
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve state and year metrics as JSON on localhost.")
+    parser.add_argument('--workbook', required=True, help="Path to the HUD PIT .xlsb workbook")
+    parser.add_argument('--host', default=DEFAULT_HOST, help=f"Address to bind (default: {DEFAULT_HOST})")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f"Port (default: {DEFAULT_PORT})")
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE,
+                        help=f"Responses kept in the LRU cache (default: {DEFAULT_CACHE_SIZE})")
+    args = parser.parse_args(argv)
+
+    index = QueryIndex(load_yearly_table(args.workbook), load_population())
+    server = make_server(index, args.host, args.port, args.cache_size)
+    print(f"Serving {len(index.states)} states x {len(index.years)} years on "
+          f"http://{args.host}:{server.server_address[1]}/ (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""
+Top-k / bottom-k selection over any metric and year.
+
+Selections use partial selection (DataFrame.nlargest / nsmallest for tables,
+np.argpartition for state x year arrays) rather than sorting every row, and a
+Ranking caches each result per (metric, year, k, direction) so charts that share
+a ranking reuse it instead of recomputing it. Every selection that is computed
+(not served from the cache) is recorded as an instrument.py 'rank' stage.
+"""
+
+import numpy as np
+
+from instrument import instrumented, stage
+
+
+class Ranking:
+    """
+    Cached top-k / bottom-k lookups over one table.
+
+    `df` needs a column per metric and, for per-year lookups, a 'Year' column.
+    Results are shared between callers: copy before modifying them, and do not
+    change a metric column of `df` after it has been ranked.
+    """
+
+    def __init__(self, df, year_column='Year'):
+        self.df = df
+        self.year_column = year_column
+        self._year_rows = None
+        self._cache = {}
+
+    def top(self, metric, k=10, year=None):
+        """The `k` rows with the highest `metric` (in `year`, if given), highest first."""
+        return self._select(metric, k, year, largest=True)
+
+    def bottom(self, metric, k=10, year=None):
+        """The `k` rows with the lowest `metric` (in `year`, if given), lowest first."""
+        return self._select(metric, k, year, largest=False)
+
+    def _rows_for_year(self, year):
+        if year is None:
+            return self.df
+        if self._year_rows is None:
+            # Row positions per year, computed once for all lookups
+            self._year_rows = self.df.groupby(self.year_column, observed=True).indices
+        positions = self._year_rows.get(year, np.empty(0, dtype='int64'))
+        return self.df.iloc[positions]
+
+    def _select(self, metric, k, year, largest):
+        key = (metric, year, k, largest)
+        if key not in self._cache:
+            with stage('rank') as record:
+                rows = self._rows_for_year(year)
+                record['rows_in'] = len(rows)
+                if largest:
+                    self._cache[key] = rows.nlargest(k, metric)
+                else:
+                    self._cache[key] = rows.nsmallest(k, metric)
+                record['rows_out'] = len(self._cache[key])
+        return self._cache[key]
+
+    def clear(self):
+        self._cache.clear()
+        self._year_rows = None
+
+
+@instrumented('rank')
+def top_k_indices(values, k=10, largest=True):
+    """
+    Row indices of the `k` highest (or lowest) values in every column of `values`.
+
+    `values` is a (state, year) array such as rates.StateYearMatrix.rates(); the
+    result has shape (k, n_years), ordered best first within each column. NaN
+    values rank last.
+    """
+    values = np.asarray(values, dtype='float64')
+    k = min(k, values.shape[0])
+    keyed = -values if largest else values.copy()
+    keyed[np.isnan(keyed)] = np.inf
+    candidates = np.argpartition(keyed, k - 1, axis=0)[:k]
+    order = np.argsort(np.take_along_axis(keyed, candidates, axis=0), axis=0, kind='stable')
+    return np.take_along_axis(candidates, order, axis=0)
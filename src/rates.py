@@ -0,0 +1,124 @@
+"""
+Multi-year rate engine over a dense state x year matrix.
+
+The cleaned long table is scattered once into two NumPy arrays with one row per
+state and one column per year: homeless counts and population. Per-100K rates,
+year-over-year changes, CAGR and per-year ranks are then whole-array operations
+over all states and years at once, instead of a sort-and-head per year.
+Missing counts are NaN and propagate through every metric.
+"""
+
+import numpy as np
+import pandas as pd
+
+from population import population_matrix
+from states import JURISDICTION_CODES, STATE_CODES, STATE_DTYPE, to_state_categorical
+
+
+def year_span(df_long):
+    """Every year from the first to the last year in the 'Year' column of `df_long`."""
+    year_values = df_long['Year'].to_numpy(dtype='int64')
+    return np.arange(year_values.min(), year_values.max() + 1)
+
+
+def state_year_array(df_long, value, states, years):
+    """
+    Scatter column `value` of a long table into a (state, year) float64 array.
+
+    Rows follow `states` and columns `years` (consecutive); states, years and
+    values that are missing from `df_long` are NaN.
+    """
+    states = list(states)
+    year_values = df_long['Year'].to_numpy(dtype='int64')
+    # Category code -> row position in `states` (-1 for codes not in `states`)
+    row_of_code = np.full(len(JURISDICTION_CODES), -1, dtype='int64')
+    row_of_code[[JURISDICTION_CODES.index(code) for code in states]] = np.arange(len(states))
+    codes = to_state_categorical(df_long['State']).cat.codes.to_numpy()
+    rows = np.where(codes >= 0, row_of_code[codes], -1)
+    columns = year_values - int(years[0])
+    keep = (rows >= 0) & (columns >= 0) & (columns < len(years))
+
+    array = np.full((len(states), len(years)), np.nan)
+    array[rows[keep], columns[keep]] = df_long[value].to_numpy(dtype='float64', na_value=np.nan)[keep]
+    return array
+
+
+class StateYearMatrix:
+    """Homeless counts and population as aligned (state, year) float64 arrays."""
+
+    def __init__(self, states, years, counts, population):
+        self.states = list(states)
+        self.years = np.asarray(years, dtype='int64')
+        self.counts = counts
+        self.population = population
+
+    @classmethod
+    def from_long(cls, df_long, population, value='Overall Homeless', states=STATE_CODES, carry=False):
+        """
+        Build the matrices from a long table with 'State', 'Year' and `value` columns.
+
+        Rows follow `states` (the 50 states and DC by default) and columns cover
+        every year from the first to the last year in `df_long`. `population` is
+        the Series from population.load_population.
+        """
+        states = list(states)
+        years = year_span(df_long)
+        counts = state_year_array(df_long, value, states, years)
+        pop = population_matrix(population, years, carry=carry).reindex(states).to_numpy()
+        return cls(states, years, counts, pop)
+
+    def year_index(self, year):
+        return int(year) - int(self.years[0])
+
+    def rates(self):
+        """Homeless per 100,000 residents."""
+        return self.counts / self.population * 100_000
+
+    def yoy_delta(self, values=None):
+        """Change from the previous year; the first year is NaN."""
+        values = self.counts if values is None else values
+        delta = np.full_like(values, np.nan)
+        delta[:, 1:] = values[:, 1:] - values[:, :-1]
+        return delta
+
+    def yoy_pct(self, values=None):
+        """Percent change from the previous year; the first year is NaN."""
+        values = self.counts if values is None else values
+        pct = np.full_like(values, np.nan)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pct[:, 1:] = (values[:, 1:] / values[:, :-1] - 1) * 100
+        return pct
+
+    def cagr(self, start_year=None, end_year=None, values=None):
+        """Compound annual growth rate per state between two years, as a fraction."""
+        values = self.counts if values is None else values
+        start_year = self.years[0] if start_year is None else start_year
+        end_year = self.years[-1] if end_year is None else end_year
+        start = values[:, self.year_index(start_year)]
+        end = values[:, self.year_index(end_year)]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return (end / start) ** (1 / (int(end_year) - int(start_year))) - 1
+
+    def ranks(self, values=None, ascending=False):
+        """
+        Rank of every state within each year (1 = highest unless `ascending`).
+
+        Ties share the lowest rank; states with no value in a year are NaN.
+        """
+        values = self.rates() if values is None else values
+        return pd.DataFrame(values).rank(axis=0, method='min', ascending=ascending).to_numpy()
+
+    def to_frame(self, values):
+        """Wrap a (state, year) array as a DataFrame indexed by State with Year columns."""
+        return pd.DataFrame(values, index=pd.Index(self.states, name='State'),
+                            columns=pd.Index(self.years, name='Year'))
+
+    def to_long(self, **metrics):
+        """Long table with 'State', 'Year' and one column per named (state, year) array."""
+        df_long = pd.DataFrame({
+            'State': pd.Categorical(np.repeat(self.states, len(self.years)), dtype=STATE_DTYPE),
+            'Year': np.tile(self.years, len(self.states)),
+        })
+        for name, values in metrics.items():
+            df_long[name] = np.asarray(values).reshape(-1)
+        return df_long
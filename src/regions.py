@@ -0,0 +1,149 @@
+"""
+Census region and division roll-ups, and roll-ups over custom state groupings.
+
+A grouping maps state codes to group names. Every grouping is turned once into
+rows of a 0/1 indicator matrix (group x state), and all groupings are stacked
+into a single GroupIndex. The overall, sheltered and unsheltered counts and the
+population of every state and year are stacked side by side into one
+(state, metric x year) array. One matrix product then yields every group total
+of every grouping for every year, and rates and shares are element-wise
+operations on those totals. No filter-and-sum runs per group or per year.
+
+Population is summed only over the states that reported a count in that year,
+so a missing state lowers neither a group's per-100K rate nor its share. Years
+in which a reporting state has no population estimate have no group population
+or rate.
+"""
+
+import numpy as np
+import pandas as pd
+
+from rates import StateYearMatrix
+from shelter import ShelterBreakdown
+from states import STATE_CODES
+
+
+# Census Bureau divisions, https://www2.census.gov/geo/pdfs/maps-data/maps/reference/us_regdiv.pdf
+CENSUS_DIVISIONS = {
+    'New England': ('CT', 'ME', 'MA', 'NH', 'RI', 'VT'),
+    'Middle Atlantic': ('NJ', 'NY', 'PA'),
+    'East North Central': ('IL', 'IN', 'MI', 'OH', 'WI'),
+    'West North Central': ('IA', 'KS', 'MN', 'MO', 'NE', 'ND', 'SD'),
+    'South Atlantic': ('DE', 'DC', 'FL', 'GA', 'MD', 'NC', 'SC', 'VA', 'WV'),
+    'East South Central': ('AL', 'KY', 'MS', 'TN'),
+    'West South Central': ('AR', 'LA', 'OK', 'TX'),
+    'Mountain': ('AZ', 'CO', 'ID', 'MT', 'NV', 'NM', 'UT', 'WY'),
+    'Pacific': ('AK', 'CA', 'HI', 'OR', 'WA'),
+}
+CENSUS_REGIONS = {
+    'Northeast': ('New England', 'Middle Atlantic'),
+    'Midwest': ('East North Central', 'West North Central'),
+    'South': ('South Atlantic', 'East South Central', 'West South Central'),
+    'West': ('Mountain', 'Pacific'),
+}
+NATIONAL = 'United States'
+
+# Grouping name -> {group: states}; the national total is its own one-group grouping
+GROUPINGS = {
+    'national': {NATIONAL: STATE_CODES},
+    'region': {region: tuple(state for division in divisions for state in CENSUS_DIVISIONS[division])
+               for region, divisions in CENSUS_REGIONS.items()},
+    'division': CENSUS_DIVISIONS,
+}
+
+ROLLUP_COUNTS = ['Overall Homeless', 'Sheltered Total Homeless', 'Unsheltered Homeless']
+
+
+class GroupIndex:
+    """
+    Indicator rows of every group of every grouping over `states`.
+
+    `indicator[r, i]` is 1 when state i belongs to the group of row r; `labels[r]`
+    is that row's (grouping, group). A state may be in at most one group per
+    grouping, and states outside every group of a grouping are left out of it.
+    """
+
+    def __init__(self, groupings=None, states=STATE_CODES):
+        groupings = GROUPINGS if groupings is None else groupings
+        self.states = list(states)
+        column_of_state = {state: i for i, state in enumerate(self.states)}
+        self.labels = []
+        rows = []
+        for grouping, groups in groupings.items():
+            seen = set()
+            for group, members in groups.items():
+                members = [str(state) for state in members]
+                overlap = seen.intersection(members)
+                if overlap:
+                    raise ValueError(f"States {sorted(overlap)} are in more than one group of {grouping!r}.")
+                seen.update(members)
+                unknown = [state for state in members if state not in column_of_state]
+                if unknown:
+                    raise ValueError(f"Unknown states {unknown} in group {group!r} of {grouping!r}.")
+                row = np.zeros(len(self.states))
+                row[[column_of_state[state] for state in members]] = 1
+                rows.append(row)
+                self.labels.append((grouping, group))
+        self.indicator = np.vstack(rows) if rows else np.zeros((0, len(self.states)))
+
+    def reduce(self, *arrays):
+        """
+        Group sums of (state, year) arrays, NaN counted as zero, in one matrix product.
+
+        Returns one (group, year) array per input, in order.
+        """
+        stacked = np.nan_to_num(np.hstack(arrays), nan=0.0)
+        return np.hsplit(self.indicator @ stacked, len(arrays))
+
+
+def rollup(df_pit, population, groupings=None, states=STATE_CODES, group_index=None):
+    """
+    Totals, per-100K rates and shares of every group and year as a long table.
+
+    Columns: 'Grouping', 'Group', 'Year', the three counts, 'Population' (of the
+    states reporting that year; NaN when one of them has no estimate), 'States
+    Reporting', 'Homeless Per 100K', 'Sheltered Share %' and 'Share of National %'. `groupings` defaults to
+    GROUPINGS (national, Census regions and divisions); pass a prebuilt
+    `group_index` to reuse it across calls.
+    """
+    index = GroupIndex(groupings, states) if group_index is None else group_index
+    matrix = StateYearMatrix.from_long(df_pit, population, states=index.states)
+    shelter = ShelterBreakdown.from_long(df_pit, states=index.states)
+    reported = ~np.isnan(shelter.overall)
+    with_population = reported & ~np.isnan(matrix.population)
+    overall, sheltered, unsheltered, people, reporting, reporting_population = index.reduce(
+        shelter.overall, shelter.sheltered, shelter.unsheltered,
+        np.where(reported, matrix.population, np.nan), reported.astype('float64'),
+        with_population.astype('float64'))
+
+    national = np.nansum(shelter.overall, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        metrics = {
+            'Overall Homeless': overall,
+            'Sheltered Total Homeless': sheltered,
+            'Unsheltered Homeless': unsheltered,
+            'Population': people,
+            'States Reporting': reporting,
+            'Homeless Per 100K': overall / people * 100_000,
+            'Sheltered Share %': sheltered / overall * 100,
+            'Share of National %': overall / national * 100,
+        }
+    # Groups without a single reporting state have no totals rather than zeros
+    empty = reporting == 0
+    for name in metrics:
+        if name != 'States Reporting':
+            metrics[name][empty] = np.nan
+    # ... and no population or rate for years in which a reporting state has no population estimate
+    unknown = reporting_population < reporting
+    metrics['Population'][unknown] = np.nan
+    metrics['Homeless Per 100K'][unknown] = np.nan
+
+    n_groups, n_years = overall.shape
+    labels = np.array(index.labels, dtype=object).reshape(n_groups, 2)
+    df = pd.DataFrame({
+        'Grouping': np.repeat(labels[:, 0], n_years),
+        'Group': np.repeat(labels[:, 1], n_years),
+        'Year': np.tile(matrix.years, n_groups),
+        **{name: values.ravel() for name, values in metrics.items()},
+    })
+    return df.astype({'States Reporting': 'int64'})
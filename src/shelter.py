@@ -0,0 +1,117 @@
+"""
+Sheltered vs. unsheltered breakdown for every state and year.
+
+The overall, sheltered and unsheltered counts of the cleaned long table are
+scattered once into (state, year) arrays, as in rates.StateYearMatrix. Shares,
+the unsheltered-to-sheltered ratio and the year-over-year shift in the
+unsheltered share are then whole-array operations over all states and years.
+The chart and the insight text both read from these arrays, so neither needs a
+melted copy of the table nor hand-checked numbers.
+"""
+
+import numpy as np
+
+from rates import StateYearMatrix, state_year_array, year_span
+from states import STATE_CODES, STATE_NAMES
+
+
+class ShelterBreakdown(StateYearMatrix):
+    """
+    Overall, sheltered and unsheltered counts as aligned (state, year) float64 arrays.
+
+    `counts` is the overall count; the year-over-year helpers of StateYearMatrix
+    apply to any of the arrays. No population is attached.
+    """
+
+    def __init__(self, states, years, overall, sheltered, unsheltered):
+        super().__init__(states, years, overall, None)
+        self.overall = overall
+        self.sheltered = sheltered
+        self.unsheltered = unsheltered
+        self._row = {state: i for i, state in enumerate(self.states)}
+
+    @classmethod
+    def from_long(cls, df_long, states=STATE_CODES):
+        """Build the arrays from the cleaned long table (rows follow `states`)."""
+        states = list(states)
+        years = year_span(df_long)
+        return cls(states, years,
+                   state_year_array(df_long, 'Overall Homeless', states, years),
+                   state_year_array(df_long, 'Sheltered Total Homeless', states, years),
+                   state_year_array(df_long, 'Unsheltered Homeless', states, years))
+
+    def rows(self, states):
+        """Row positions of `states`."""
+        return np.array([self._row[str(state)] for state in states], dtype='int64')
+
+    def sheltered_share(self):
+        """Fraction of the overall count that was sheltered."""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.sheltered / self.overall
+
+    def unsheltered_share(self):
+        """Fraction of the overall count that was unsheltered."""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.unsheltered / self.overall
+
+    def unsheltered_ratio(self):
+        """Unsheltered people per sheltered person."""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.unsheltered / self.sheltered
+
+    def share_shift(self):
+        """Year-over-year change of the unsheltered share, in percentage points."""
+        return self.yoy_delta(self.unsheltered_share() * 100)
+
+    def to_long(self):
+        """Long table with 'State', 'Year', the counts and every share metric."""
+        return super().to_long(**{
+            'Overall Homeless': self.overall,
+            'Sheltered Total Homeless': self.sheltered,
+            'Unsheltered Homeless': self.unsheltered,
+            'Sheltered Share': self.sheltered_share(),
+            'Unsheltered Share': self.unsheltered_share(),
+            'Unsheltered Per Sheltered': self.unsheltered_ratio(),
+            'Unsheltered Share Shift (pp)': self.share_shift(),
+        })
+
+
+def _about(count):
+    # Counts in the text are rounded to the nearest thousand, e.g. 124,000
+    return f'{round(count, -3):,.0f}' if count >= 1000 else f'{count:,.0f}'
+
+
+def shelter_insight(shelter, states, year):
+    """
+    Insight text comparing the shelter status of `states` in `year`.
+
+    Names the state with the largest unsheltered share and the one with the largest
+    sheltered share and, when one exists, a state among `states` that has more
+    unsheltered people than the most-sheltered state despite a smaller overall count.
+    """
+    rows = shelter.rows(states)
+    col = shelter.year_index(year)
+    overall = shelter.overall[rows, col]
+    sheltered = shelter.sheltered[rows, col]
+    unsheltered = shelter.unsheltered[rows, col]
+    unsheltered_share = shelter.unsheltered_share()[rows, col]
+    sheltered_share = shelter.sheltered_share()[rows, col]
+    if min(np.count_nonzero(~np.isnan(unsheltered_share)), np.count_nonzero(~np.isnan(sheltered_share))) < 2:
+        return f"Insight: Not enough sheltered/unsheltered counts to compare states in {year}."
+
+    a = int(np.nanargmax(unsheltered_share))
+    b = int(np.nanargmax(sheltered_share))
+    name_a, name_b = STATE_NAMES[str(states[a])], STATE_NAMES[str(states[b])]
+    text = (f"Insight: While about {unsheltered_share[a] * 100:.0f}%({_about(unsheltered[a])} out of "
+            f"{_about(overall[a])}) of {name_a}'s homeless population in {year} was unsheltered, over "
+            f"{np.floor(sheltered_share[b] * 100):.0f}%({_about(sheltered[b])} out of "
+            f"{_about(overall[b])}) of {name_b}'s homeless were sheltered.")
+
+    with np.errstate(invalid='ignore'):
+        outnumbered = np.flatnonzero((overall < overall[b]) & (unsheltered > unsheltered[b]))
+    if len(outnumbered):
+        c = int(outnumbered[np.argmax(unsheltered[outnumbered])])
+        name_c = STATE_NAMES[str(states[c])]
+        text += (f" Interestingly, this means {name_b} actually has a lower number of unsheltered "
+                 f"individuals than {name_c}, despite {name_b}'s higher overall homeless count.")
+    return text
@@ -0,0 +1,136 @@
+"""
+Persisted stage outputs for stages.py, Make-style.
+
+Every stage of stages.py (a table of pipeline.TABLES or a figure of
+figures.FIGURES) gets a key: the SHA-256 of its name, the source of the
+module its builder is defined in and of every module of src/ that module
+imports, directly or not (so helpers and version constants such as
+pit_cache.CACHE_VERSION count), its output settings and the content hashes of
+its inputs. Parameters that are file paths (the workbook, the population CSV,
+the GeoJSON) are hashed by file content, and stage inputs by the content hash
+of the stage's output.
+After a stage runs, its output is pickled to <name>.pkl and the key and the
+output's content hash are recorded in manifest.json.
+
+On the next run a stage whose key matches the manifest is up to date and is
+not run; its stored output is only read if a stage that does run needs it.
+Because keys are built from output hashes, a stage that reruns and produces
+the same output (e.g. the workbook was re-saved without changes) leaves
+everything downstream up to date. A styling change to a chart only changes
+the keys of the figures, so the workbook is not parsed again.
+"""
+
+import functools
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import sys
+
+from atomic import write_atomic
+from figure_cache import module_source, update_digest
+from pit_cache import DEFAULT_CACHE_DIR, file_checksum
+
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_STAGE_STORE_DIR = os.path.join(DEFAULT_CACHE_DIR, 'stages')
+MANIFEST_NAME = 'manifest.json'
+
+# Bump when stage outputs change in a way the module sources do not show
+STAGE_STORE_VERSION = 1
+
+# Parameters that name a file: their hash is that of the file's content
+PATH_PARAMETERS = ('workbook', 'population_path', 'geojson_path')
+
+
+def value_hash(value):
+    """SHA-256 hex digest of `value` by content (see figure_cache.update_digest)."""
+    digest = hashlib.sha256()
+    update_digest(digest, value)
+    return digest.hexdigest()
+
+
+def parameter_hash(name, value):
+    if name in PATH_PARAMETERS and value is not None:
+        return file_checksum(value)
+    return value_hash(value)
+
+
+def _is_local(module):
+    path = getattr(module, '__file__', None)
+    return path is not None and os.path.dirname(os.path.abspath(path)) == SRC_DIR
+
+
+@functools.lru_cache(maxsize=None)
+def local_dependencies(module_name):
+    """Sorted names of `module_name` and of every module of src/ it imports, directly or not."""
+    seen = set()
+    pending = [module_name]
+    while pending:
+        name = pending.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+        for value in vars(sys.modules[name]).values():
+            # Modules imported as such, and the modules of imported functions and classes
+            module = value if inspect.ismodule(value) else sys.modules.get(getattr(value, '__module__', None) or '')
+            if module is not None and _is_local(module):
+                pending.append(module.__name__)
+    return tuple(sorted(seen))
+
+
+def _write_bytes(path, data):
+    def write(tmp_path):
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+    write_atomic(path, write)
+
+
+class StageStore:
+    """Stage outputs and their keys in `store_dir`."""
+
+    def __init__(self, store_dir=DEFAULT_STAGE_STORE_DIR):
+        self.store_dir = store_dir
+        try:
+            with open(os.path.join(store_dir, MANIFEST_NAME)) as f:
+                self.manifest = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.manifest = {}
+
+    def _path(self, name):
+        return os.path.join(self.store_dir, f'{name}.pkl')
+
+    def stage_key(self, name, builder, settings, input_hashes):
+        """Key of stage `name` built by `builder` from inputs with `input_hashes` (in input order)."""
+        digest = hashlib.sha256()
+        digest.update(repr((STAGE_STORE_VERSION, name, settings)).encode())
+        for module_name in local_dependencies(inspect.unwrap(builder).__module__):
+            digest.update(module_source(module_name).encode())
+        for input_hash in input_hashes:
+            digest.update(input_hash.encode())
+        return digest.hexdigest()
+
+    def is_current(self, name, key, outputs=()):
+        """Whether `name` was stored under `key` and its output files (e.g. a figure) still exist."""
+        entry = self.manifest.get(name)
+        return (entry is not None and entry['key'] == key and os.path.exists(self._path(name))
+                and all(os.path.exists(path) for path in outputs))
+
+    def output_hash(self, name):
+        return self.manifest[name]['hash']
+
+    def load(self, name):
+        with open(self._path(name), 'rb') as f:
+            return pickle.load(f)
+
+    def save(self, name, value):
+        """Store the output of `name` and return its content hash; safe to call from worker processes."""
+        _write_bytes(self._path(name), pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        return value_hash(value)
+
+    def record(self, name, key, output_hash):
+        """Record that `name` was stored under `key`; called by the scheduling process only."""
+        self.manifest[name] = {'key': key, 'hash': output_hash}
+        _write_bytes(os.path.join(self.store_dir, MANIFEST_NAME),
+                     json.dumps(self.manifest, indent=1, sort_keys=True).encode())
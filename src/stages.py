@@ -0,0 +1,241 @@
+"""
+Run only the parts of the analysis a job needs.
+
+Every table of pipeline.TABLES and every figure of figures.FIGURES is a stage
+that declares the stages (or parameters) it is built from. Given a list of
+targets, the stages they need are resolved from those declarations and run in a
+fork-based process pool as soon as their inputs are ready, so independent
+stages (e.g. the rankings and the anomaly flags, or several figures) run side
+by side. Tables that were asked for are written to the output directory as
+CSV; figures are saved as in batch_render.py, with the same figure cache.
+Stage outputs are kept in a stage_store.StageStore, and a rerun only runs the
+stages whose inputs, builder or settings changed (`--force` runs them all).
+
+    python src/stages.py --workbook data/raw/2007-2024-PIT-Counts-by-State.xlsb df_final
+    python src/stages.py --workbook data/raw/2007-2024-PIT-Counts-by-State.xlsb \
+        --geojson data/geojson/us_states.geojson --out Vizualizations rate_map yearly_trend
+
+`--list` prints every stage with its inputs.
+"""
+
+import argparse
+import contextlib
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
+import pandas as pd
+
+from batch_render import render_figure
+from diagnostics import QUIET, set_verbosity
+from figure_cache import FigureCache
+from figures import FIGURES, PLOTLYJS, SAVE_DPI, figure_filename
+from instrument import configure, read_records, stage, summary_table
+from parallel import default_workers, process_pool
+from pipeline import TABLES, TableSpec, table_order
+from pit_cache import DEFAULT_CACHE_DIR
+from population import DEFAULT_POPULATION_PATH
+from stage_store import StageStore, parameter_hash
+
+
+# Values supplied on the command line rather than built by a stage
+PARAMETERS = ('workbook', 'population_path', 'geojson_path', 'cache_dir', 'k')
+
+
+def stage_graph():
+    """Every table and figure stage keyed by name, as TableSpec(builder, inputs)."""
+    graph = dict(TABLES)
+    for name, spec in FIGURES.items():
+        graph[name] = TableSpec(spec.builder, spec.inputs)
+    return graph
+
+
+def save_table(name, value, out_dir):
+    """Write a table target to `out_dir` as <name>.csv; returns the path, or None for scalars."""
+    if hasattr(value, 'to_long'):  # shelter.ShelterBreakdown
+        value = value.to_long()
+    elif isinstance(value, list):
+        value = pd.Series(value, name=name)
+    if not isinstance(value, (pd.DataFrame, pd.Series)):
+        return None
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f'{name}.csv')
+    value.to_csv(path, index=False)
+    return path
+
+
+def run_stage(name, inputs, out_dir, cache=None, store=None):
+    """Run one stage with its inputs; returns (value, seconds, output hash or None without a store)."""
+    start = time.perf_counter()
+    if name in FIGURES:
+        value = render_figure(name, inputs, out_dir, cache)
+    else:
+        with stage(name):
+            value = TABLES[name].builder(*[inputs[key] for key in TABLES[name].inputs])
+    output_hash = store.save(name, value) if store is not None else None
+    return value, time.perf_counter() - start, output_hash
+
+
+def stage_settings(name, out_dir):
+    """What besides its builder and inputs decides a stage's output: for figures, the file written."""
+    if name not in FIGURES:
+        return None
+    return FIGURES[name].filename, os.path.abspath(out_dir), SAVE_DPI, PLOTLYJS
+
+
+def run_stages(targets, params, out_dir, max_workers=None, cache=None, store=None):
+    """
+    Run `targets` and the stages they need; returns ({name: value}, [(name, seconds, up_to_date)]).
+
+    `params` holds the parameters ('workbook', 'population_path', 'geojson_path',
+    'cache_dir', 'k'). Each stage is submitted to the process pool once all of its inputs are
+    done; a worker receives only the inputs of its own stage. Figure stages
+    return the result tuple of batch_render.render_figure.
+
+    With a stage_store.StageStore, stages whose key is unchanged since the last
+    run are skipped, and their stored output is read only when a stage that
+    does run needs it (the targets themselves are always in the result).
+    """
+    graph = stage_graph()
+    values = dict(params)
+    order = table_order(targets, values, graph)
+    waiting = {name: {key for key in graph[name].inputs if key in order} for name in order}
+    hashes, keys, stored = {}, {}, set()
+    timings = []
+    if max_workers is None:
+        max_workers = default_workers(len(order))
+    if FIGURES.keys() & waiting.keys():
+        os.makedirs(out_dir, exist_ok=True)
+
+    def value(key):
+        if key in stored:
+            values[key] = store.load(key)
+            stored.discard(key)
+        return values[key]
+
+    def input_hash(key):
+        if key not in hashes:
+            hashes[key] = parameter_hash(key, params[key])
+        return hashes[key]
+
+    def finish(name, result, up_to_date=False):
+        output, seconds, hashes[name] = result
+        if up_to_date:
+            stored.add(name)
+        else:
+            values[name] = output
+            if store is not None:
+                store.record(name, keys[name], hashes[name])
+        timings.append((name, seconds, up_to_date))
+        for deps in waiting.values():
+            deps.discard(name)
+
+    def start(name):
+        spec = graph[name]
+        if store is not None:
+            keys[name] = store.stage_key(name, spec.builder, stage_settings(name, out_dir),
+                                         [input_hash(key) for key in spec.inputs])
+            year = value('year') if 'year' in spec.inputs else None
+            outputs = [os.path.join(out_dir, figure_filename(name, year))] if name in FIGURES else []
+            if store.is_current(name, keys[name], outputs):
+                finish(name, (None, 0.0, store.output_hash(name)), up_to_date=True)
+                return
+        task_inputs = {key: value(key) for key in spec.inputs}
+        if pool is None:
+            finish(name, run_stage(name, task_inputs, out_dir, cache, store))
+        else:
+            running[pool.submit(run_stage, name, task_inputs, out_dir, cache, store)] = name
+
+    pool = process_pool(max_workers)
+    running = {}
+    with pool or contextlib.nullcontext():
+        while waiting or running:
+            for name in [name for name, deps in waiting.items() if not deps]:
+                del waiting[name]
+                start(name)
+            if running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    finish(running.pop(future), future.result())
+    for name in targets:
+        value(name)
+    if cache is not None:
+        cache.evict()
+    return values, timings
+
+
+def print_stages():
+    graph = stage_graph()
+    width = max(len(name) for name in graph)
+    for name, spec in graph.items():
+        kind = 'figure' if name in FIGURES else 'table'
+        print(f"{name:<{width}}  {kind:<6}  <- {', '.join(spec.inputs) or '(none)'}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run selected tables and figures of the analysis and what they need.")
+    parser.add_argument('targets', nargs='*', help="Tables and figures to produce (see --list)")
+    parser.add_argument('--workbook', help="Path to the HUD PIT .xlsb workbook")
+    parser.add_argument('--geojson', help="Path to the US states GeoJSON file (needed by the maps)")
+    parser.add_argument('--population', default=DEFAULT_POPULATION_PATH, help="Population estimates CSV")
+    parser.add_argument('--out', default='Vizualizations', help="Output directory (default: Vizualizations)")
+    parser.add_argument('--k', type=int, default=10, help="Size of the top/bottom slices (default: 10)")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR,
+                        help="Cache directory of the cleaned workbook, the geometry, the rendered figures "
+                             "(figures/) and the stage outputs (stages/)")
+    parser.add_argument('--no-cache', action='store_true', help="Render every figure, ignoring the cache")
+    parser.add_argument('--store-dir', default=None,
+                        help="Where stage outputs and their keys are kept between runs (default: <cache-dir>/stages)")
+    parser.add_argument('--force', action='store_true', help="Run every needed stage even if it is up to date")
+    parser.add_argument('--metrics', default=None,
+                        help="Append per-stage timing and memory records to this JSON-lines file and print a summary")
+    parser.add_argument('--list', action='store_true', help="List the stages and their inputs, then exit")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        print_stages()
+        return 0
+    graph = stage_graph()
+    unknown = [name for name in args.targets if name not in graph]
+    if unknown or not args.targets:
+        parser.error(f"unknown stages: {', '.join(unknown)} (see --list)" if unknown else "no targets given")
+    params = {'workbook': args.workbook, 'population_path': args.population, 'geojson_path': args.geojson,
+              'cache_dir': args.cache_dir, 'k': args.k}
+    needed = table_order(args.targets, PARAMETERS, graph)
+    for param, flag in (('workbook', '--workbook'), ('geojson_path', '--geojson')):
+        if params[param] is None and any(param in graph[name].inputs for name in needed):
+            parser.error(f"{flag} is required for {', '.join(args.targets)}")
+
+    os.environ['MPLBACKEND'] = 'Agg'
+    set_verbosity(QUIET)
+    if args.metrics:
+        configure(args.metrics)
+
+    start = time.perf_counter()
+    cache = None if args.no_cache else FigureCache(os.path.join(args.cache_dir, 'figures'))
+    store = StageStore(args.store_dir or os.path.join(args.cache_dir, 'stages'))
+    if args.force:
+        store.manifest = {}
+    values, timings = run_stages(args.targets, params, args.out, args.workers, cache, store)
+    width = max(len(name) for name, _, _ in timings)
+    for name, seconds, up_to_date in timings:
+        if name in FIGURES:
+            note = values[name][1] + ('  (cached)' if values[name][3] and not up_to_date else '')
+        elif name in args.targets:
+            note = save_table(name, values[name], args.out) or repr(values[name])
+        else:
+            note = ''
+        if up_to_date:
+            note = f'{note}  (up to date)'.strip()
+        print(f"{name:<{width}}  {seconds:7.2f}s  {note}".rstrip())
+    print(f"{'total':<{width}}  {time.perf_counter() - start:7.2f}s  (wall clock)")
+    if args.metrics:
+        print()
+        print(summary_table(read_records(args.metrics)).to_string())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""
+State-code dimension shared by every stage of the analysis.
+
+All jurisdictions that appear in the HUD PIT workbook (50 states, DC and the five
+territories) form one fixed pandas CategoricalDtype. Casting the raw 'State'
+column to it is a single hash lookup per row: the 'Total' row, footnotes and
+blanks fall outside the categories and become NaN, so no string or regex
+filtering is needed. Stages that compare states (rankings, rates, maps) keep only
+STATE_CODES, dropping the territories in one isin().
+"""
+
+import numpy as np
+import pandas as pd
+
+
+STATE_CODES = (
+    'AL', 'AK', 'AZ', 'AR', 'CA', 'CO', 'CT', 'DE', 'DC', 'FL', 'GA', 'HI',
+    'ID', 'IL', 'IN', 'IA', 'KS', 'KY', 'LA', 'ME', 'MD', 'MA', 'MI', 'MN',
+    'MS', 'MO', 'MT', 'NE', 'NV', 'NH', 'NJ', 'NM', 'NY', 'NC', 'ND', 'OH',
+    'OK', 'OR', 'PA', 'RI', 'SC', 'SD', 'TN', 'TX', 'UT', 'VT', 'VA', 'WA',
+    'WV', 'WI', 'WY',
+)
+TERRITORY_CODES = ('AS', 'GU', 'MP', 'PR', 'VI')
+JURISDICTION_CODES = STATE_CODES + TERRITORY_CODES
+
+STATE_DTYPE = pd.CategoricalDtype(JURISDICTION_CODES)
+
+# Display names for generated text
+STATE_NAMES = {
+    'AL': 'Alabama', 'AK': 'Alaska', 'AZ': 'Arizona', 'AR': 'Arkansas', 'CA': 'California',
+    'CO': 'Colorado', 'CT': 'Connecticut', 'DE': 'Delaware', 'DC': 'Washington D.C.',
+    'FL': 'Florida', 'GA': 'Georgia', 'HI': 'Hawaii', 'ID': 'Idaho', 'IL': 'Illinois',
+    'IN': 'Indiana', 'IA': 'Iowa', 'KS': 'Kansas', 'KY': 'Kentucky', 'LA': 'Louisiana',
+    'ME': 'Maine', 'MD': 'Maryland', 'MA': 'Massachusetts', 'MI': 'Michigan', 'MN': 'Minnesota',
+    'MS': 'Mississippi', 'MO': 'Missouri', 'MT': 'Montana', 'NE': 'Nebraska', 'NV': 'Nevada',
+    'NH': 'New Hampshire', 'NJ': 'New Jersey', 'NM': 'New Mexico', 'NY': 'New York',
+    'NC': 'North Carolina', 'ND': 'North Dakota', 'OH': 'Ohio', 'OK': 'Oklahoma', 'OR': 'Oregon',
+    'PA': 'Pennsylvania', 'RI': 'Rhode Island', 'SC': 'South Carolina', 'SD': 'South Dakota',
+    'TN': 'Tennessee', 'TX': 'Texas', 'UT': 'Utah', 'VT': 'Vermont', 'VA': 'Virginia',
+    'WA': 'Washington', 'WV': 'West Virginia', 'WI': 'Wisconsin', 'WY': 'Wyoming',
+    'AS': 'American Samoa', 'GU': 'Guam', 'MP': 'Northern Mariana Islands', 'PR': 'Puerto Rico',
+    'VI': 'U.S. Virgin Islands',
+}
+
+
+def to_state_categorical(values):
+    """
+    Cast state codes to STATE_DTYPE; anything that is not a known code becomes NaN.
+
+    Only values that miss the direct lookup are stripped of whitespace and looked
+    up again, so clean input never goes through string operations.
+    """
+    series = pd.Series(values)
+    if isinstance(series.dtype, pd.CategoricalDtype) and series.dtype == STATE_DTYPE:
+        return series
+
+    cat = pd.Categorical(series, dtype=STATE_DTYPE)
+    unmatched = (cat.codes == -1) & series.notna().to_numpy()
+    if unmatched.any():
+        stripped = series[unmatched].astype(str).str.strip()
+        cat[unmatched] = stripped.where(stripped.isin(JURISDICTION_CODES)).to_numpy()
+    return pd.Series(cat, index=series.index, name=series.name)
+
+
+def state_mask(states):
+    """Boolean array that is True for the 50 states and DC (not territories or NaN)."""
+    return np.asarray(pd.Series(states).isin(STATE_CODES))
+
+
+def states_only(df, column='State'):
+    """Rows of `df` whose `column` is one of the 50 states or DC."""
+    return df[state_mask(df[column])].copy()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The analysis modules live side by side in src/ and import each other directly
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
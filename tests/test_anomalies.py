@@ -0,0 +1,55 @@
+import numpy as np
+
+from anomalies import anomaly_insight, anomaly_masks, detect_anomalies
+
+YEARS = np.arange(2015, 2025)
+# California's overall count, with the 2021 count that skipped most unsheltered people
+CA = np.array([[115_738, 118_142, 131_532, 129_972, 151_278, 161_548, 57_468, 171_521, 181_399, 187_084]],
+              dtype='float64')
+
+
+def test_temporary_drop_and_rebound():
+    flags = detect_anomalies(CA, ['CA'], YEARS, label='State')
+    assert flags[['Year', 'Anomaly']].values.tolist() == [[2021, 'temporary drop'], [2022, 'rebound']]
+    drop = flags.iloc[0]
+    assert drop['Previous'] == 161_548 and drop['Value'] == 57_468
+    assert drop['Change %'] < -60 and drop['Score'] < -3.5
+
+
+def test_insight_describes_drop_with_rebound():
+    flags = detect_anomalies(CA, ['CA'], YEARS, label='State')
+    insight = anomaly_insight(flags, ['CA'])
+    assert "dropped from 162K to 57K in 2021, only to return to 172K in 2022" in insight
+
+
+def test_lasting_break_is_a_drop():
+    values = np.array([[100, 102, 101, 103, 104, 50, 51, 52, 51, 53]], dtype='float64')
+    masks, scores, _ = anomaly_masks(values)
+    assert np.flatnonzero(masks['drop'][0]).tolist() == [5]
+    assert not masks['temporary drop'].any() and not masks['rebound'].any()
+    assert scores[0, 5] < -3.5
+
+
+def test_noise_below_min_change_is_not_a_break():
+    # A 20% step scores above the threshold in a flat series but is too small to count
+    values = np.array([[100, 100, 100, 100, 100, 80, 80, 80, 80, 80]], dtype='float64')
+    masks, scores, _ = anomaly_masks(values)
+    assert abs(scores[0, 5]) > 3.5
+    assert not any(mask.any() for mask in masks.values())
+
+
+def test_partial_and_missing_counts():
+    overall = np.array([[100, 110, np.nan, 105, 60, 108]], dtype='float64')
+    sheltered = np.array([[60, 65, np.nan, 62, 60, 63]], dtype='float64')
+    unsheltered = np.array([[40, 45, np.nan, 43, 0, 45]], dtype='float64')
+    masks, _, _ = anomaly_masks(overall, sheltered, unsheltered)
+    assert np.flatnonzero(masks['missing count'][0]).tolist() == [2]
+    assert np.flatnonzero(masks['partial count'][0]).tolist() == [4]
+
+
+def test_no_partial_count_for_series_without_unsheltered_people():
+    overall = np.array([[100, 110, 105]], dtype='float64')
+    sheltered = overall.copy()
+    unsheltered = np.zeros_like(overall)
+    masks, _, _ = anomaly_masks(overall, sheltered, unsheltered)
+    assert not masks['partial count'].any()
@@ -0,0 +1,40 @@
+import os
+
+import pytest
+
+from atomic import write_atomic
+
+
+def write_text(text):
+    def write(tmp_path):
+        with open(tmp_path, 'w') as f:
+            f.write(text)
+    return write
+
+
+def test_replaces_file_and_keeps_extension(tmp_path):
+    path = str(tmp_path / 'sub' / 'table.csv')
+    seen = []
+
+    def write(tmp):
+        seen.append(tmp)
+        write_text('new')(tmp)
+
+    assert write_atomic(path, write) == path
+    assert open(path).read() == 'new'
+    assert seen[0].endswith('.csv') and '.tmp' in seen[0]
+    assert os.listdir(tmp_path / 'sub') == ['table.csv']
+
+
+def test_failed_write_leaves_old_file(tmp_path):
+    path = str(tmp_path / 'table.csv')
+    write_atomic(path, write_text('old'))
+
+    def fail(tmp):
+        write_text('partial')(tmp)
+        raise RuntimeError('disk full')
+
+    with pytest.raises(RuntimeError):
+        write_atomic(path, fail)
+    assert open(path).read() == 'old'
+    assert os.listdir(tmp_path) == ['table.csv']
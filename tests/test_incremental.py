@@ -0,0 +1,119 @@
+import struct
+import zipfile
+
+import pytest
+
+from incremental import _BRT_BUNDLE_SH, _sheet_parts, sheet_fingerprints, update_yearly_table
+from pit_loader import PIT_COLUMNS
+
+pytest.importorskip('openpyxl')
+pytest.importorskip('pyarrow')
+
+STATES = ['AL', 'AK', 'AZ', 'CA', 'NY']
+RELS = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">{}</Relationships>')
+
+
+def write_workbook(path, counts):
+    """A PIT-shaped .xlsx with one sheet per year of `counts` ({year: [overall per state]}), newest first."""
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    for year in sorted(counts, reverse=True):
+        ws = wb.create_sheet(str(year))
+        ws.append(PIT_COLUMNS)
+        for state, overall in zip(STATES, counts[year]):
+            ws.append([state, overall, overall // 2, overall - overall // 2])
+    wb.save(path)
+    return path
+
+
+def _record(record_type, payload):
+    header = bytearray()
+    for value, max_bytes in ((record_type, 2), (len(payload), 4)):
+        for _ in range(max_bytes):
+            byte, value = value & 0x7F, value >> 7
+            header.append(byte | (0x80 if value else 0))
+            if not value:
+                break
+    return bytes(header) + payload
+
+
+def _wide_string(text):
+    return struct.pack('<I', len(text)) + text.encode('utf-16-le')
+
+
+def _sheet_record(i, name):
+    return _record(_BRT_BUNDLE_SH, struct.pack('<II', 0, i) + _wide_string(f'rId{i}') + _wide_string(name))
+
+
+def write_xlsb_workbook_part(path, sheets, records=None):
+    """A zip with only xl/workbook.bin and its .rels, listing `sheets` as (name, target)."""
+    if records is None:
+        records = _record(0x83, b'') + _record(0x8F, b'')  # BrtBeginBook, BrtBeginBundleShs
+        records += b''.join(_sheet_record(i, name) for i, (name, _) in enumerate(sheets, 1))
+        records += _record(0x90, b'') + _record(0x84, b'')  # BrtEndBundleShs, BrtEndBook
+    rels = ''.join(f'<Relationship Id="rId{i}" Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+                   f'relationships/worksheet" Target="{target}"/>' for i, (_, target) in enumerate(sheets, 1))
+    with zipfile.ZipFile(path, 'w') as zf:
+        zf.writestr('xl/workbook.bin', records)
+        zf.writestr('xl/_rels/workbook.bin.rels', RELS.format(rels))
+    return path
+
+
+def test_xlsb_sheet_parts_match_pyxlsb(tmp_path):
+    sheets = [('2024', 'worksheets/sheet1.bin'), ('2023', 'worksheets/sheet2.bin'),
+              ('Änderungen', '/xl/worksheets/sheet3.bin')]
+    path = write_xlsb_workbook_part(tmp_path / 'book.xlsb', sheets)
+    with zipfile.ZipFile(path) as zf:
+        parts = _sheet_parts(zf)
+    assert parts == {'2024': 'xl/worksheets/sheet1.bin', '2023': 'xl/worksheets/sheet2.bin',
+                     'Änderungen': 'xl/worksheets/sheet3.bin'}
+    pyxlsb = pytest.importorskip('pyxlsb')
+    with pyxlsb.open_workbook(str(path)) as wb:
+        assert wb.sheets == list(parts)
+
+
+def test_unreadable_sheet_list_reloads_every_sheet(tmp_path):
+    # The sheet name claims 50 characters but the record ends after its length
+    truncated = _record(_BRT_BUNDLE_SH, struct.pack('<II', 0, 1) + _wide_string('rId1') + struct.pack('<I', 50))
+    path = write_xlsb_workbook_part(tmp_path / 'book.xlsb', [('2024', 'worksheets/sheet1.bin')], truncated)
+    assert sheet_fingerprints(path) == {}
+
+
+def test_unchanged_workbook_changes_no_year(tmp_path):
+    counts = {2022: [100, 200, 300, 400, 500], 2023: [110, 210, 310, 410, 510]}
+    store = tmp_path / 'store'
+    first = update_yearly_table(write_workbook(tmp_path / 'a.xlsx', counts), store)
+    assert first.changed_years == [2022, 2023]
+    again = update_yearly_table(write_workbook(tmp_path / 'b.xlsx', counts), store)
+    assert again.changed_years == []
+    assert again.df_pit.equals(first.df_pit)
+
+
+def test_one_changed_sheet(tmp_path):
+    counts = {2022: [100, 200, 300, 400, 500], 2023: [110, 210, 310, 410, 510]}
+    old = write_workbook(tmp_path / 'a.xlsx', counts)
+    store = tmp_path / 'store'
+    update_yearly_table(old, store)
+    new = write_workbook(tmp_path / 'b.xlsx', {**counts, 2022: [100, 200, 300, 400, 999]})
+    assert {name for name, digest in sheet_fingerprints(new).items() if sheet_fingerprints(old)[name] != digest} \
+        == {'2022'}
+    update = update_yearly_table(new, store)
+    assert update.changed_years == [2022]
+    row = update.df_pit[(update.df_pit['Year'] == 2022) & (update.df_pit['State'] == 'NY')]
+    assert row['Overall Homeless'].tolist() == [999]
+    # The year after a changed year gets a new year-over-year change
+    ny_2023 = update.metrics[(update.metrics['Year'] == 2023) & (update.metrics['State'] == 'NY')]
+    assert ny_2023['YoY Change'].tolist() == [510 - 999]
+
+
+def test_added_year(tmp_path):
+    counts = {2022: [100, 200, 300, 400, 500], 2023: [110, 210, 310, 410, 510]}
+    store = tmp_path / 'store'
+    update_yearly_table(write_workbook(tmp_path / 'a.xlsx', counts), store)
+    new = write_workbook(tmp_path / 'b.xlsx', {**counts, 2024: [120, 220, 320, 420, 520]})
+    update = update_yearly_table(new, store)
+    assert update.changed_years == [2024]
+    assert sorted(update.df_pit['Year'].unique().tolist()) == [2022, 2023, 2024]
+    assert update.top_lists['Overall Homeless']['2024'][0] == 'NY'
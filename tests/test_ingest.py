@@ -0,0 +1,60 @@
+import pandas as pd
+import pytest
+
+from ingest import ingest_directory, iter_store
+from pit_loader import PIT_COLUMNS
+
+pytest.importorskip('pyarrow')
+
+COC_ROWS = [
+    ['CA', 'CA-500', 9_000, 3_000, 6_000],
+    ['CA', 'CA-501', 7_000, 2_000, 5_000],
+    ['NY', 'NY-600', 88_000, 86_000, 2_000],
+]
+
+
+def write_coc_csv(path, rows):
+    pd.DataFrame(rows, columns=['State', 'CoC Number'] + PIT_COLUMNS[1:]).to_csv(path, index=False)
+    return path
+
+
+def read_store(path):
+    return pd.concat(iter_store(path), ignore_index=True)
+
+
+def test_coc_rows_are_kept_apart_by_their_number(tmp_path):
+    write_coc_csv(tmp_path / 'pit_2025_coc.csv', COC_ROWS)
+    store = tmp_path / 'store.parquet'
+    rows = ingest_directory(tmp_path, str(store), PIT_COLUMNS + ['CoC Number'])
+    assert rows == 3
+    df = read_store(store)
+    assert sorted(df['CoC Number']) == ['CA-500', 'CA-501', 'NY-600']
+    assert df.loc[df['State'] == 'CA', 'Overall Homeless'].sum() == 16_000
+
+
+def test_rows_sharing_state_and_year_are_refused(tmp_path):
+    write_coc_csv(tmp_path / 'pit_2025_coc.csv', COC_ROWS)
+    with pytest.raises(ValueError, match="'CoC Number'"):
+        ingest_directory(tmp_path, str(tmp_path / 'store.parquet'))
+    # ... also when they fall into different chunks
+    with pytest.raises(ValueError, match="'CoC Number'"):
+        ingest_directory(tmp_path, str(tmp_path / 'store.parquet'), chunk_rows=1)
+
+
+def test_first_file_wins_and_append_keeps_stored_rows(tmp_path):
+    inputs = tmp_path / 'in'
+    inputs.mkdir()
+    write_coc_csv(inputs / 'a_2024.csv', COC_ROWS)
+    write_coc_csv(inputs / 'b_2024.csv', [['CA', 'CA-500', 1, 1, 0], ['WA', 'WA-500', 5_000, 2_000, 3_000]])
+    store = str(tmp_path / 'store.parquet')
+    columns = PIT_COLUMNS + ['CoC Number']
+    assert ingest_directory(inputs, store, columns, chunk_rows=2) == 4
+    df = read_store(store)
+    assert df.loc[df['CoC Number'] == 'CA-500', 'Overall Homeless'].tolist() == [9_000]
+
+    (inputs / 'a_2024.csv').unlink()
+    (inputs / 'b_2024.csv').unlink()
+    write_coc_csv(inputs / 'c_2025.csv', [['CA', 'CA-500', 9_500, 3_500, 6_000]])
+    assert ingest_directory(inputs, store, columns, append=True) == 5
+    assert sorted(read_store(store)['Year'].tolist()) == [2024] * 4 + [2025]
+    assert ingest_directory(inputs, store, columns) == 1
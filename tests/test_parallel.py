@@ -0,0 +1,31 @@
+import sys
+import threading
+
+import pytest
+
+from parallel import process_pool
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason="the pool is only used on Linux")
+def test_pool_on_linux_with_a_single_thread():
+    if threading.active_count() > 1:
+        pytest.skip("another test left a thread running")
+    pool = process_pool(2)
+    assert pool is not None
+    with pool:
+        assert list(pool.map(abs, [-1, -2])) == [1, 2]
+
+
+def test_no_pool_while_other_threads_run():
+    stop = threading.Event()
+    thread = threading.Thread(target=stop.wait)
+    thread.start()
+    try:
+        assert process_pool(2) is None
+    finally:
+        stop.set()
+        thread.join()
+
+
+def test_no_pool_for_one_worker():
+    assert process_pool(1) is None
@@ -0,0 +1,24 @@
+import os
+
+import pandas as pd
+import pytest
+
+from pit_cache import CACHE_PREFIX, CACHE_VERSION, _remove_stale
+
+pytest.importorskip('pyarrow')
+
+
+def _entry(cache_dir, name, mtime):
+    path = os.path.join(cache_dir, f'{CACHE_PREFIX}{name}.parquet')
+    pd.DataFrame({'Year': [2024]}).to_parquet(path)
+    os.utime(path, (mtime, mtime))
+    return os.path.basename(path)
+
+
+def test_remove_stale_keeps_recent_entries_of_other_workbooks(tmp_path):
+    old_version = _entry(tmp_path, f'v{CACHE_VERSION - 1}_0000000000000000', 10)
+    names = [_entry(tmp_path, f'v{CACHE_VERSION}_{i:016x}', i) for i in range(5)]
+    _remove_stale(tmp_path, max_entries=3)
+    kept = sorted(os.listdir(tmp_path))
+    assert kept == names[2:]
+    assert old_version not in kept
@@ -0,0 +1,19 @@
+import numpy as np
+import pandas as pd
+
+from population import load_population, population_lookup
+from rates import StateYearMatrix
+
+
+def test_year_without_estimate_has_no_population():
+    pop = load_population()
+    assert np.isnan(population_lookup(pop, ['CA'], [2019])[0])
+    assert population_lookup(pop, ['CA'], [2024])[0] > 0
+
+
+def test_year_without_estimate_has_no_rate():
+    df = pd.DataFrame({'State': ['CA', 'CA'], 'Year': [2019, 2024], 'Overall Homeless': [150_000, 187_000]})
+    matrix = StateYearMatrix.from_long(df, load_population(), states=['CA'])
+    rates = matrix.rates()[0]
+    assert np.isnan(rates[matrix.year_index(2019)])
+    assert np.isfinite(rates[matrix.year_index(2024)])
@@ -0,0 +1,65 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pandas as pd
+import pytest
+
+from population import load_population
+from query_service import QueryIndex, make_server
+
+
+@pytest.fixture(scope='module')
+def base_url():
+    df_pit = pd.DataFrame({
+        'State': ['CA', 'NY', 'WA', 'CA', 'NY', 'WA'],
+        'Year': [2023, 2023, 2023, 2024, 2024, 2024],
+        'Overall Homeless': [180_000, 100_000, 28_000, 187_000, 158_000, 31_000],
+        'Sheltered Total Homeless': [60_000, 95_000, 14_000, 64_000, 154_000, 16_000],
+        'Unsheltered Homeless': [120_000, 5_000, 14_000, 123_000, 4_000, 15_000],
+    })
+    server = make_server(QueryIndex(df_pit, load_population()), port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def get(base_url, path):
+    try:
+        with urllib.request.urlopen(base_url + path) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+
+
+def test_value(base_url):
+    status, body = get(base_url, '/value?state=ny&year=2023')
+    assert status == 200
+    assert body == {'state': 'NY', 'year': 2023, 'metric': 'overall', 'value': 100_000}
+
+
+def test_ranking_top_and_bottom(base_url):
+    status, body = get(base_url, '/ranking?metric=overall&year=2024&k=2')
+    assert status == 200
+    assert [(row['rank'], row['state'], row['value']) for row in body['ranking']] == [(1, 'CA', 187_000),
+                                                                                      (2, 'NY', 158_000)]
+    status, body = get(base_url, '/ranking?metric=overall&year=2024&k=2&order=bottom')
+    assert status == 200
+    assert [(row['rank'], row['state']) for row in body['ranking']] == [(3, 'WA'), (2, 'NY')]
+
+
+def test_series(base_url):
+    status, body = get(base_url, '/series?state=WA&metric=unsheltered')
+    assert status == 200
+    assert body['years'] == [2023, 2024]
+    assert body['values'] == [14_000, 15_000]
+
+
+def test_bad_request(base_url):
+    status, body = get(base_url, '/value?state=CA&year=1999')
+    assert status == 400
+    assert 'No data for 1999' in body['error']
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from regions import GroupIndex, rollup
+
+STATES = ['CA', 'NV', 'OR', 'WA']
+
+
+def population(estimates):
+    """Population Series indexed by (State, Year), as load_population returns it."""
+    index = pd.MultiIndex.from_tuples(list(estimates), names=['State', 'Year'])
+    return pd.Series(list(estimates.values()), index=index, name='Population')
+
+
+def counts(rows):
+    return pd.DataFrame(rows, columns=['State', 'Year', 'Overall Homeless', 'Sheltered Total Homeless',
+                                       'Unsheltered Homeless'])
+
+
+def test_overlapping_groups_are_rejected():
+    with pytest.raises(ValueError, match=r"\['NV'\].*'west'"):
+        GroupIndex({'west': {'coast': ('CA', 'NV'), 'inland': ('NV',)}}, states=STATES)
+
+
+def test_unknown_states_are_rejected():
+    with pytest.raises(ValueError, match=r"Unknown states \['XX'\]"):
+        GroupIndex({'west': {'coast': ('CA', 'XX')}}, states=STATES)
+
+
+def test_state_may_be_in_one_group_per_grouping():
+    index = GroupIndex({'a': {'all': STATES}, 'b': {'coast': ('CA', 'OR', 'WA')}}, states=STATES)
+    assert index.labels == [('a', 'all'), ('b', 'coast')]
+    assert index.indicator.tolist() == [[1, 1, 1, 1], [1, 0, 1, 1]]
+
+
+def test_custom_grouping_matches_groupby():
+    df = counts([('CA', 2024, 1000, 400, 600), ('OR', 2024, 200, 80, 120),
+                 ('WA', 2024, 300, 200, 100), ('NV', 2024, 50, 30, 20)])
+    pop = population({('CA', 2024): 1_000_000, ('OR', 2024): 200_000,
+                      ('WA', 2024): 300_000, ('NV', 2024): 100_000})
+    groups = {'coast': ('CA', 'OR', 'WA'), 'inland': ('NV',)}
+    result = rollup(df, pop, {'custom': groups}, states=STATES).set_index('Group')
+
+    expected = df.assign(Group=df['State'].map({s: g for g, members in groups.items() for s in members}))
+    expected = expected.groupby('Group')[['Overall Homeless', 'Sheltered Total Homeless',
+                                          'Unsheltered Homeless']].sum()
+    pd.testing.assert_frame_equal(result[expected.columns], expected.astype('float64'), check_names=False)
+    assert result.loc['coast', 'Population'] == 1_500_000
+    assert result.loc['coast', 'Homeless Per 100K'] == pytest.approx(100.0)
+    assert result.loc['coast', 'Share of National %'] == pytest.approx(1500 / 1550 * 100)
+    assert result.loc['inland', 'Sheltered Share %'] == pytest.approx(60.0)
+
+
+def test_year_without_estimate_has_no_population_or_rate():
+    df = counts([('CA', 2019, 900, 300, 600), ('OR', 2019, 150, 60, 90),
+                 ('CA', 2024, 1000, 400, 600), ('OR', 2024, 200, 80, 120)])
+    pop = population({('CA', 2024): 1_000_000, ('OR', 2024): 200_000})
+    result = rollup(df, pop, {'custom': {'coast': ('CA', 'OR')}}, states=STATES).set_index('Year')
+    assert result.loc[2019, 'Overall Homeless'] == 1050
+    assert np.isnan(result.loc[2019, 'Population'])
+    assert np.isnan(result.loc[2019, 'Homeless Per 100K'])
+    assert result.loc[2024, 'Homeless Per 100K'] == pytest.approx(1200 / 1_200_000 * 100_000)